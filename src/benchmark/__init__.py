@@ -0,0 +1,5 @@
+""" Benchmarks of the timeline hot paths - run with `python -m benchmark` from src """
+from benchmark.generators import generate_items, generate_records
+from benchmark.runner import CASES, run, compare
+
+# EOF
@@ -0,0 +1,8 @@
+""" python -m benchmark --sizes 1e3 1e5 --output results.json --baseline baseline.json """
+import sys
+
+from benchmark.runner import main
+
+sys.exit(main())
+
+# EOF
@@ -0,0 +1,61 @@
+""" Reproducible synthetic timelines for the benchmarks """
+import random
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Union
+
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+FIRST_DAY: date = date(2000, 1, 1)
+DAYS: int = 25 * 365  # starts are spread over 25 years
+
+
+def _tags(rng: random.Random, tag_count: int, tags_per_item: int) -> List[str]:
+    """ draw tags with a skewed distribution: tag0 is common, the last tag rare """
+    count: int = rng.randint(0, 2 * tags_per_item)
+    return [f'tag{int(rng.paretovariate(1.2)) % tag_count}' for _ in range(count)]
+
+
+def _bounds(rng: random.Random, datetime_share: float, none_share: float) -> tuple:
+    """ a start and an end of the same kind (date or datetime), each None with probability none_share """
+    start: Union[date, datetime] = FIRST_DAY + timedelta(days=rng.randrange(DAYS))
+    length: timedelta = timedelta(days=int(rng.expovariate(1 / 30)))
+    if rng.random() < datetime_share:
+        start = datetime.combine(start, datetime.min.time()) + timedelta(seconds=rng.randrange(86400))
+        length += timedelta(seconds=rng.randrange(86400))
+    end: Union[date, datetime] = start + length
+    return None if rng.random() < none_share else start, None if rng.random() < none_share else end
+
+
+def generate_items(count: int, seed: int = 0, datetime_share: float = 0.3, none_share: float = 0.02,
+                   tag_count: int = 50, tags_per_item: int = 2, payload_size: int = 16,
+                   simple_share: float = 0.1) -> List[SimpleTimelineItem]:
+    """ count items in random order, the same for the same arguments
+
+        datetime_share of the items use datetimes (otherwise dates), each bound is None with probability
+        none_share, TimelineItems get 0 to 2 * tags_per_item of tag_count tags and a string payload of
+        payload_size characters, and simple_share of the items are SimpleTimelineItems.
+    """
+    rng: random.Random = random.Random(seed)
+    payload: str = 'x' * payload_size
+    items: List[SimpleTimelineItem] = list()
+    for _ in range(count):
+        start, end = _bounds(rng, datetime_share, none_share)
+        if rng.random() < simple_share:
+            items.append(SimpleTimelineItem(start, end))
+        else:
+            items.append(TimelineItem(start, end, payload, tags=_tags(rng, tag_count, tags_per_item)))
+    return items
+
+
+def generate_records(count: int, seed: int = 0, **kwargs) -> Iterable[dict]:
+    """ the items of generate_items as serialised dicts with iso format strings (as read from JSON) """
+    for item in generate_items(count, seed, **kwargs):
+        record: dict = item.to_dict()
+        record['_start'] = None if item.start is None else item.start.isoformat()
+        record['_end'] = None if item.end is None else item.end.isoformat()
+        if 'tags' in record:
+            record['tags'] = sorted(record['tags'])
+        yield record
+
+
+# EOF
@@ -0,0 +1,228 @@
+""" Timing of the timeline hot paths and comparison of the results against a baseline """
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Union
+
+from benchmark.generators import generate_items
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+FORMAT_VERSION: int = 1
+WINDOW: SimpleTimelineItem = SimpleTimelineItem(date(2010, 1, 1), date(2010, 12, 31))
+
+
+def _timeline(items: List[SimpleTimelineItem], sort: bool = False) -> Timeline:
+    """ a timeline of the items without timing the construction """
+    result: Timeline = Timeline()
+    result._replace(list(items))
+    return result.sort() if sort else result
+
+
+def _construction(items: List[SimpleTimelineItem]) -> Callable:
+    bounds: list = [(None if item.start is None else item.start.isoformat(),
+                     None if item.end is None else item.end.isoformat()) for item in items]
+    return lambda: [TimelineItem(start, end, None, tags=['tag0', 'tag1']) for start, end in bounds]
+
+
+def _parse(items: List[SimpleTimelineItem]) -> Callable:
+    strings: List[str] = [item.start.isoformat() for item in items if item.start is not None]
+    return lambda: [SimpleTimelineItem._type_formatter(s) for s in strings]
+
+
+def _sort(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items)
+    return timeline.sort
+
+
+def _filter(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items, sort=True)
+    return lambda: list(timeline.filter(before=WINDOW.end, after=WINDOW.start))
+
+
+def _filter_unsorted(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items)
+    return lambda: list(timeline.filter(before=WINDOW.end, after=WINDOW.start))
+
+
+def _tag_filter(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items)  # a fresh timeline, so the tag index is built in the timing
+    return lambda: (list(timeline.tag_filter(['tag0', 'tag1'])), list(timeline.tag_filter(['tag2', 'tag3'], True)))
+
+
+def _overlap_scan(items: List[SimpleTimelineItem]) -> Callable:
+    return lambda: [item for item in items if item.overlap(WINDOW)]
+
+
+def _overlapping(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items)
+    return lambda: list(timeline.overlapping(WINDOW))
+
+
+def _overlapping_indexed(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items).index_intervals()
+    list(timeline.overlapping(WINDOW))  # the index is built in the setup, only the query is timed
+    return lambda: list(timeline.overlapping(WINDOW))
+
+
+def _merge(items: List[SimpleTimelineItem]) -> Callable:
+    pairs: list = [(TimelineItem._build(item.start, item.end, item.data, item.tags),
+                    TimelineItem._build(item.start, item.end, [item.data], TimelineItem.intern_tags(['merged'])))
+                   for item in items if isinstance(item, TimelineItem)]
+    return lambda: [first.merge(second) for first, second in pairs]
+
+
+def _merge_sorted(items: List[SimpleTimelineItem]) -> Callable:
+    timelines: List[Timeline] = [_timeline(items[i::16], sort=True) for i in range(16)]
+    return lambda: Timeline.merge_sorted(*timelines)
+
+
+def _to_list(items: List[SimpleTimelineItem]) -> Callable:
+    timeline: Timeline = _timeline(items, sort=True)
+    return timeline.to_list
+
+
+def _from_list(items: List[SimpleTimelineItem]) -> Callable:
+    serialised: list = _timeline(items, sort=True).to_list()
+    return lambda: Timeline.from_list(serialised)
+
+
+def _from_records(items: List[SimpleTimelineItem]) -> Callable:
+    serialised: list = _timeline(items, sort=True).to_list()
+    return lambda: Timeline.from_records(serialised)
+
+
+def _memory(items: List[SimpleTimelineItem]) -> float:
+    """ bytes allocated per item when loading the items (with their dates, keys, data and tags) """
+    serialised: list = _timeline(items).to_list()
+    tracemalloc.start()
+    try:
+        before: int = tracemalloc.get_traced_memory()[0]
+        timeline: Timeline = Timeline.from_records(serialised)
+        allocated: int = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return allocated / max(1, len(timeline))
+
+
+# name -> (unit, factory): a timing factory does the setup and returns the call to time, 'B' cases measure
+CASES: Dict[str, tuple] = {
+    'construction': ('s', _construction),
+    'parse': ('s', _parse),
+    'sort': ('s', _sort),
+    'filter': ('s', _filter),
+    'filter_unsorted': ('s', _filter_unsorted),
+    'tag_filter': ('s', _tag_filter),
+    'overlap_scan': ('s', _overlap_scan),
+    'overlapping': ('s', _overlapping),
+    'overlapping_indexed': ('s', _overlapping_indexed),
+    'merge': ('s', _merge),
+    'merge_sorted': ('s', _merge_sorted),
+    'to_list': ('s', _to_list),
+    'from_list': ('s', _from_list),
+    'from_records': ('s', _from_records),
+    'memory': ('B', _memory),
+}
+
+
+def run(sizes: Iterable[int], cases: Union[Iterable[str], None] = None, repeat: int = 3, seed: int = 0,
+        log: Union[Callable[[str], None], None] = None) -> dict:
+    """ run the cases at every size and return the results as a JSON serialisable dict
+
+        Times are the best of repeat runs in seconds, each run with a fresh setup. The items are generated
+        once per size by `generate_items(size, seed)`, so runs with the same seed measure the same data.
+    """
+    names: List[str] = list(CASES) if cases is None else list(cases)
+    unknown: List[str] = [name for name in names if name not in CASES]
+    if unknown:
+        raise ValueError(f'run: unknown cases {", ".join(unknown)}')
+    results: Dict[str, Dict[str, float]] = {name: dict() for name in names}
+    for size in sizes:
+        items: List[SimpleTimelineItem] = generate_items(size, seed)
+        random.Random(seed).shuffle(items)
+        for name in names:
+            unit, factory = CASES[name]
+            if unit == 'B':
+                value: float = factory(items)
+            else:
+                value = float('inf')
+                for _ in range(repeat):
+                    call: Callable = factory(items)
+                    started: float = time.perf_counter()
+                    call()
+                    value = min(value, time.perf_counter() - started)
+            results[name][str(size)] = value
+            if log is not None:
+                log(f'{name:20} {size:>10} {value:.6g} {unit}')
+    return {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'units': {name: CASES[name][0] for name in names},
+        'results': results,
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float = 0.25, floor: float = 1e-3) -> List[dict]:
+    """ the measurements of result more than tolerance (a fraction) worse than in the baseline
+
+        Times below floor seconds are compared as floor, so the noise of very short runs is not reported.
+        Cases and sizes missing from either side are skipped.
+    """
+    regressions: List[dict] = list()
+    for name, values in result['results'].items():
+        old_values: dict = baseline.get('results', dict()).get(name, dict())
+        unit: str = result['units'][name]
+        for size, value in values.items():
+            if size not in old_values:
+                continue
+            old: float = old_values[size]
+            new: float = value
+            if unit == 's':
+                old, new = max(old, floor), max(new, floor)
+            ratio: float = new / old if old else float('inf')
+            if ratio > 1 + tolerance:
+                regressions.append({'case': name, 'size': int(size), 'baseline': old_values[size],
+                                    'value': value, 'ratio': ratio})
+    return regressions
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    """ command line: run, write the results as JSON and compare against a baseline (exit code 1 on regression) """
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=main.__doc__)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5],
+                        help='numbers of items, e.g. 1e3 1e5 1e7 (default: 1e3 1e4 1e5)')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), help='cases to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, the best is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated items (default: 0)')
+    parser.add_argument('--output', '-o', help='write the results to this file (default: standard output)')
+    parser.add_argument('--baseline', '-b', help='compare against the results in this file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slow down against the baseline as a fraction (default: 0.25)')
+    args = parser.parse_args(argv)
+    result: dict = run([int(size) for size in args.sizes], args.cases, args.repeat, args.seed,
+                       log=lambda line: print(line, file=sys.stderr))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            result['regressions'] = compare(result, json.load(f), args.tolerance)
+    text: str = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for regression in result.get('regressions', ()):
+        print('REGRESSION {case} at {size}: {baseline:.6g} -> {value:.6g} ({ratio:.2f}x)'.format(**regression),
+              file=sys.stderr)
+    return 1 if result.get('regressions') else 0
+
+
+# EOF
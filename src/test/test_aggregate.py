@@ -0,0 +1,67 @@
+import unittest
+from datetime import date, datetime, timedelta
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestAggregate(unittest.TestCase):
+    """ Testing occupancy, transitions and covered duration per bucket """
+
+    def setUp(self) -> None:
+        self.timeline: Timeline = Timeline()
+        self.timeline.append(TimelineItem('2021-01-01', '2021-01-03', 'a', tags=['x']))
+        self.timeline.append(TimelineItem('2021-01-02T12:00:00', '2021-01-02T18:00:00', 'b', tags=['x', 'y']))
+        self.timeline.append(TimelineItem(None, '2021-01-01', 'c', tags=['y']))
+        self.timeline.append(SimpleTimelineItem('2021-01-04', None))
+        self.timeline.append(SimpleTimelineItem('2020-06-01', '2020-06-02'))
+
+    def test_occupancy(self):
+        """ Test active items per day against overlap() with a day, open ends clipped """
+        result = self.timeline.occupancy('2021-01-01', '2021-01-05', 'day')
+        self.assertEqual([bucket for bucket, _ in result], [date(2021, 1, day) for day in range(1, 6)])
+        for bucket, count in result:
+            expected = sum(1 for item in self.timeline
+                           if item.overlap(SimpleTimelineItem(datetime.combine(bucket, datetime.min.time()),
+                                                              datetime.combine(bucket, datetime.max.time()))))
+            self.assertEqual(count, expected, bucket)
+        self.assertEqual([count for _, count in result], [2, 2, 1, 1, 1])
+        by_tag = self.timeline.occupancy('2021-01-01', '2021-01-05', 'day', by_tag=True)
+        self.assertEqual(sorted(by_tag), ['x', 'y'])
+        self.assertEqual([count for _, count in by_tag['y']], [1, 1, 0, 0, 0])
+        hours = self.timeline.occupancy('2021-01-02', '2021-01-02T23:00:00', timedelta(hours=6))
+        self.assertEqual(hours[0][0], datetime(2021, 1, 2))
+        self.assertEqual([count for _, count in hours], [1, 1, 2, 2])
+        self.assertEqual(len(self.timeline.occupancy('2021-01-01', '2021-01-31', 'week')), 5)
+        self.assertRaises(ValueError, self.timeline.occupancy, '2021-01-05', '2021-01-01', 'day')
+        self.assertRaises(ValueError, self.timeline.occupancy, '2021-01-01', '2021-01-05', 'month')
+
+    def test_transitions(self):
+        """ Test the starts and ends per bucket """
+        result = self.timeline.transitions('2021-01-01', '2021-01-04', 'day')
+        self.assertEqual([(started, ended) for _, started, ended in result], [(1, 1), (1, 1), (0, 1), (1, 0)])
+
+    def test_covered_duration(self):
+        """ Test that the covered time per bucket is measured as coverage and agrees with occupancy """
+        result = self.timeline.covered_duration('2021-01-01', '2021-01-04', 'day')
+        self.assertEqual([covered for _, covered in result],
+                         [timedelta(days=2), timedelta(days=1, hours=6), timedelta(days=1), timedelta(days=1)])
+        single: Timeline = Timeline()
+        single.append(SimpleTimelineItem('2020-06-01', '2020-06-09'))
+        total = sum((covered for _, covered in single.covered_duration('2020-05-30', '2020-06-30', 'hour')),
+                    timedelta(0))
+        self.assertEqual(total, single.coverage())
+        events: Timeline = Timeline()
+        events.append(TimelineItem.event('2021-01-02', 'date'))
+        events.append(TimelineItem.event('2021-01-03T10:00:00', 'instant'))
+        events.append(TimelineItem('2021-01-04T22:00:00', '2021-01-05', 'overnight'))
+        occupied = [count > 0 for _, count in events.occupancy('2021-01-01', '2021-01-06', 'day')]
+        covered = events.covered_duration('2021-01-01', '2021-01-06', 'day', instant=timedelta(minutes=1))
+        self.assertEqual([duration > timedelta(0) for _, duration in covered], occupied)
+        self.assertEqual([duration for _, duration in covered][1:5],
+                         [timedelta(days=1), timedelta(minutes=1), timedelta(hours=2), timedelta(days=1)])
+        self.assertEqual(events.covered_duration('2021-01-03', '2021-01-03', 'day')[0][1], timedelta(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
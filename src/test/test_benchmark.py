@@ -0,0 +1,35 @@
+import unittest
+
+from benchmark import CASES, compare, generate_items, generate_records, run
+from timeline.timeline_item import TimelineItem
+
+
+class TestBenchmark(unittest.TestCase):
+    """ Testing the benchmark generators and runner (on tiny sizes) """
+
+    def test_generators(self):
+        """ Test that the items are reproducible and mix kinds, None bounds and tags """
+        items = generate_items(500, seed=3)
+        self.assertEqual([str(item) for item in items], [str(item) for item in generate_items(500, seed=3)])
+        self.assertTrue(any(item.start is None for item in items))
+        self.assertTrue(any(item.end is None for item in items))
+        self.assertEqual({type(item.start).__name__ for item in items}, {'date', 'datetime', 'NoneType'})
+        self.assertTrue(any(isinstance(item, TimelineItem) and item.tags for item in items))
+        record = next(iter(generate_records(1, seed=3)))
+        self.assertTrue(record['_start'] is None or isinstance(record['_start'], str))
+
+    def test_run_and_compare(self):
+        """ Test that every case runs and that compare reports slow downs only """
+        result = run([50], repeat=1)
+        self.assertEqual(set(result['results']), set(CASES))
+        self.assertTrue(all(value['50'] >= 0 for value in result['results'].values()))
+        self.assertEqual(compare(result, result), [])
+        slower = {'units': {'sort': 's'}, 'results': {'sort': {'50': 1.0}}}
+        faster = {'results': {'sort': {'50': 0.5}}}
+        self.assertEqual([regression['case'] for regression in compare(slower, faster)], ['sort'])
+        self.assertEqual(compare(slower, {'results': {'sort': {'50': 0.9}}}), [])
+        self.assertRaises(ValueError, run, [10], ['no such case'])
+
+
+if __name__ == '__main__':
+    unittest.main()
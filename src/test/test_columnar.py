@@ -0,0 +1,163 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+try:
+    import numpy
+    from timeline.columnar import ColumnarTimeline
+except ImportError:
+    numpy = None
+try:
+    import pandas
+except ImportError:
+    pandas = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestColumnarTimeline(unittest.TestCase):
+    """ Testing ColumnarTimeline """
+
+    def setUp(self) -> None:
+        self.items = [
+            TimelineItem('2022-11-11', '2022-12-12', 'Yes', tags=['yes', 'more']),
+            TimelineItem('2020-09-09', '2020-10-10', 'No', tags=['no', 'something']),
+            SimpleTimelineItem(None, '2020-01-01'),
+            TimelineItem('2021-03-03T10:00:00', None, {'x': 1}, tags='yes'),
+            SimpleTimelineItem('2021-01-01T12:00:00', '2021-02-01T00:00:00'),
+        ]
+        self.timeline: Timeline = Timeline()
+        for item in self.items:
+            self.timeline.append(item)
+        self.columns: ColumnarTimeline = ColumnarTimeline.from_timeline(self.timeline)
+
+    def test_round_trip(self):
+        """ Test that items come back with the same dates, data and tags """
+        self.assertEqual(len(self.columns), len(self.items))
+        for original, item in zip(self.items, self.columns):
+            self.assertIs(type(item), type(original))
+            self.assertEqual(item.start, original.start)
+            self.assertEqual(item.end, original.end)
+            if isinstance(original, TimelineItem):
+                self.assertEqual(item.data, original.data)
+                self.assertEqual(item.tags, original.tags)
+        aware: datetime = datetime(2021, 1, 1, 12, tzinfo=timezone(timedelta(hours=1)))
+        item = ColumnarTimeline([SimpleTimelineItem(aware, None)])[0]
+        self.assertEqual(item.start, aware)
+        self.assertEqual(item.start.tzinfo, timezone.utc)
+
+    def test_sort_and_filter(self):
+        """ Test sorting by argsort and filtering against the list based timeline """
+        self.columns.sort()
+        self.assertEqual([item.start for item in self.columns], [item.start for item in self.timeline.sort()])
+        result = list(self.columns.filter(before=date(2021, 6, 1), after=date(2020, 1, 1)))
+        expected = list(self.timeline.filter(before=date(2021, 6, 1), after=date(2020, 1, 1)))
+        self.assertEqual([str(item) for item in result], [str(item) for item in expected])
+        self.columns.sort(reverse=True)
+        self.assertIsNone(self.columns[-1].start)
+
+    def test_masks(self):
+        """ Test the vectorised masks against the item methods """
+        for point in [date(2020, 10, 10), datetime(2020, 10, 10, 8, 0), date(2021, 1, 1)]:
+            self.assertEqual(list(self.columns.before_mask(point)), [item.before(point) for item in self.items])
+            self.assertEqual(list(self.columns.after_mask(point)), [item.after(point) for item in self.items])
+        window = SimpleTimelineItem('2020-10-01', '2021-01-31')
+        self.assertEqual(sum(self.columns.overlap_mask(window)), len(list(self.timeline.overlapping(window))))
+        self.assertEqual(len(list(self.columns.active_at('2020-01-01'))), 1)
+        self.assertEqual(len(list(self.columns.contained_in((None, '2021-01-01')))), 2)
+
+    def test_tag_and_class_filter(self):
+        """ Test tag and class filters on the codes """
+        self.assertEqual([item.data for item in self.columns.tag_filter('yes')], ['Yes', {'x': 1}])
+        self.assertEqual(len(list(self.columns.tag_filter(['no', 'more'], one_of=True))), 2)
+        self.assertEqual(len(list(self.columns.tag_filter(['yes', 'something']))), 0)
+        self.assertEqual(len(list(self.columns.class_filter(TimelineItem))), 3)
+        self.assertEqual(len(list(self.columns.class_filter(SimpleTimelineItem))), 5)
+
+    def test_tag_filter_like_timeline(self):
+        """ Test that the tag filter selects the same items as the tag filter of Timeline """
+        for tags in ([], None, 'yes', ['yes'], ['yes', 'more'], ['no', 'more'], ['missing']):
+            for one_of in (False, True):
+                self.assertEqual([(item.start, item.end) for item in self.columns.tag_filter(tags, one_of=one_of)],
+                                 [(item.start, item.end) for item in self.timeline.tag_filter(tags, one_of=one_of)],
+                                 (tags, one_of))
+        self.assertEqual(len(list(self.columns.tag_filter([]))), 5)
+
+    def test_lengths(self):
+        """ Test vectorised lengths and timedeltas """
+        self.assertEqual(list(self.columns.lengths()), [31, 31, -1, -1, 31])
+        self.assertEqual(self.columns.timedeltas()[0], numpy.timedelta64(31, 'D'))
+        self.assertTrue(numpy.isnat(self.columns.timedeltas()[2]))
+
+    def test_occupancy(self):
+        """ Test the vectorised occupancy against the list based timeline """
+        for by_tag in (False, True):
+            self.assertEqual(self.columns.occupancy('2020-01-01', '2022-12-31', 'week', by_tag=by_tag),
+                             self.timeline.occupancy('2020-01-01', '2022-12-31', 'week', by_tag=by_tag))
+        self.assertEqual(self.columns.occupancy('2021-01-01', '2021-01-02', timedelta(hours=6)),
+                         self.timeline.occupancy('2021-01-01', '2021-01-02', timedelta(hours=6)))
+
+    def test_append(self):
+        """ Test that appended items are seen by the next query """
+        self.columns.append(TimelineItem.event('2024-01-01', 'new', 'yes'))
+        self.assertEqual(len(list(self.columns.tag_filter('yes'))), 3)
+        self.assertEqual(self.columns[-1].data, 'new')
+
+    def assertSameItems(self, found: Timeline):
+        """ the items of the timeline with the dates, data and tags of setUp (SimpleTimelineItems as TimelineItems) """
+        self.assertEqual([(item.start, item.end, getattr(item, 'data', None), getattr(item, 'tags', set()))
+                          for item in found],
+                         [(item.start, item.end, getattr(item, 'data', None), getattr(item, 'tags', set()))
+                          for item in self.items])
+
+    def test_numpy(self):
+        """ Test export to and import from NumPy arrays """
+        columns = self.timeline.to_numpy()
+        self.assertEqual(columns['start'].dtype, numpy.dtype('datetime64[us]'))
+        self.assertTrue(numpy.isnat(columns['start'][2]))
+        self.assertTrue(numpy.isnat(columns['end'][3]))
+        self.assertEqual(columns['start'][0], numpy.datetime64('2022-11-11'))
+        self.assertEqual(columns['tags'][0], {'yes', 'more'})
+        self.assertEqual(columns['data'][3], {'x': 1})
+        self.assertSameItems(Timeline.from_numpy(columns))
+        nested = Timeline.from_numpy({'start': numpy.array(['2020-01-01T10:00'], dtype='datetime64[m]'),
+                                      'end': [None], 'data': [[1, 2]], 'tags': ['one']})
+        self.assertEqual((nested[0].start, nested[0].end), (datetime(2020, 1, 1, 10), None))
+        self.assertEqual((nested[0].data, nested[0].tags), ([1, 2], {'one'}))
+        self.assertIs(type(Timeline.from_numpy({'start': columns['start'], 'end': columns['end']})[0]),
+                      SimpleTimelineItem)
+        self.assertRaises(ValueError, Timeline.from_numpy, {'start': columns['end'], 'end': columns['start']})
+        self.assertRaises(ValueError, Timeline.from_numpy, {'start': columns['start'], 'end': columns['end'][1:]})
+
+    @unittest.skipIf(pandas is None, 'pandas is not installed')
+    def test_pandas(self):
+        """ Test export to and import from a DataFrame with categorical tags """
+        frame = self.timeline.to_pandas()
+        self.assertEqual(list(frame.columns), ['start', 'end', 'kind', 'data', 'tags'])
+        self.assertIsInstance(frame['tags'].dtype, pandas.CategoricalDtype)
+        self.assertTrue(pandas.isna(frame['start'][2]))
+        self.assertSameItems(Timeline.from_pandas(frame))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        """ Test export to and import from an Arrow table, pickling payloads Arrow cannot hold """
+        table = self.timeline.to_arrow()
+        self.assertEqual(table.column('start').null_count, 1)
+        self.assertTrue(pyarrow.types.is_dictionary(table.column('tags').type))
+        self.assertRaises(ValueError, Timeline.from_arrow, table)
+        self.assertSameItems(Timeline.from_arrow(table, allow_pickle=True))
+        plain = Timeline.from_columns(['2020-01-01', '2020-02-01'], ['2020-01-02', None], data=[1, 2])
+        self.assertEqual(plain.to_arrow().column('data').type, pyarrow.int64())
+        self.assertEqual([item.data for item in Timeline.from_arrow(plain.to_arrow())], [1, 2])
+        records = Timeline.from_columns(['2020-01-01', '2020-02-01'], [None, None], data=[{'a': 1}, {'b': 2}])
+        self.assertEqual([item.data for item in Timeline.from_arrow(records.to_arrow())],
+                         [{'a': 1, 'b': None}, {'a': None, 'b': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
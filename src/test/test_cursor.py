@@ -0,0 +1,91 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestCursor(unittest.TestCase):
+    """ Testing the cursor and nearest queries """
+
+    def setUp(self) -> None:
+        self.timeline: Timeline = Timeline()
+        self.timeline.append(TimelineItem('2022-03-01', '2022-03-05', 'day'))
+        self.timeline.append(TimelineItem('2022-01-01', '2022-01-31', 'january'))
+        self.timeline.append(TimelineItem('2022-03-01T08:00:00', '2022-03-01T09:00:00', 'morning'))
+        self.timeline.append(TimelineItem('2022-03-01T18:00:00', '2022-03-01T19:00:00', 'evening'))
+        self.timeline.append(TimelineItem('2022-06-01', None, 'open'))
+        self.timeline.append(TimelineItem(None, '2021-12-01', 'old'))
+
+    def test_paging(self):
+        """ Test next and prev around a point and paging without seeking again """
+        cursor = self.timeline.seek('2022-02-01')
+        self.assertEqual([item.data for item in cursor.next(2)], ['day', 'morning'])
+        self.assertEqual([item.data for item in cursor.next(2)], ['evening', 'open'])
+        self.assertEqual(cursor.next(), [])
+        self.assertEqual([item.data for item in cursor.prev(3)], ['morning', 'evening', 'open'])
+        self.assertEqual([item.data for item in cursor.prev(5)], ['old', 'january', 'day'])
+        self.assertEqual(cursor.position, 0)
+        self.assertEqual(len(list(self.timeline.seek())), len(self.timeline))
+
+    def test_before_semantics(self):
+        """ Test that the cursor splits the items as before() does for a datetime point """
+        point: datetime = datetime(2022, 3, 1, 12)
+        cursor = self.timeline.seek(point)
+        ahead = list(cursor)
+        cursor = self.timeline.seek(point)
+        behind = cursor.prev(len(self.timeline))
+        self.assertEqual([item.data for item in ahead], ['day', 'evening', 'open'])
+        self.assertEqual([item.data for item in behind], ['old', 'january', 'morning'])
+        self.assertTrue(all(item.before(point) for item in behind))
+        self.assertFalse(any(item.before(point) for item in ahead))
+
+    def test_nearest(self):
+        """ Test that nearest returns the active items first and then the closest ends and starts """
+        self.assertEqual([item.data for item in self.timeline.nearest('2022-03-03', 2)], ['day', 'evening'])
+        self.assertEqual([item.data for item in self.timeline.nearest(datetime(2022, 3, 1, 8, 30), 3)],
+                         ['day', 'morning', 'evening'])
+        self.assertEqual([item.data for item in self.timeline.nearest('2021-12-15', 2)], ['old', 'january'])
+        self.assertEqual(len(self.timeline.nearest('2030-01-01', 100)), len(self.timeline))
+        self.timeline.append(SimpleTimelineItem('2029-12-30', '2029-12-31'))
+        self.assertEqual(self.timeline.nearest('2030-01-01', 2)[1].start, date(2029, 12, 30))
+
+    def test_nearest_ties(self):
+        """ Test that the active items taken when more than k are active do not depend on the sizes of the sides """
+        timeline: Timeline = Timeline()
+        for day in range(1, 11):
+            timeline.append(TimelineItem(date(2022, 1, day), date(2022, 2, 28 - day), day))
+        timeline.append(TimelineItem('2022-01-05', '2022-02-23', 'twin'))
+        expected = [1, 2, 3, 4, 5, 'twin']
+        self.assertEqual([item.data for item in timeline.nearest('2022-01-15', 6)], expected)
+        for _ in range(20):  # many items ending before the point: the active items are found by end
+            timeline.append(TimelineItem('2021-01-01', '2021-01-02', 'old'))
+        self.assertEqual([item.data for item in timeline.nearest('2022-01-15', 6)], expected)
+        for _ in range(40):  # active items starting before all the others
+            timeline.append(TimelineItem('2021-06-01', '2023-01-01', 'long'))
+        self.assertEqual([item.data for item in timeline.nearest('2022-01-15', 6)], ['long'] * 6)
+        for _ in range(100):  # many items starting after the point: found by start again
+            timeline.append(TimelineItem('2023-01-01', '2023-01-02', 'later'))
+        self.assertEqual([item.data for item in timeline.nearest('2022-01-15', 6)], ['long'] * 6)
+
+    def test_nearest_matches_scan(self):
+        """ Test nearest against sorting all the items on their distance, with items added between calls """
+        rng: random.Random = random.Random(7)
+        timeline: Timeline = Timeline()
+        for _ in range(300):
+            start: date = date(2020, 1, 1) + timedelta(days=rng.randrange(1000))
+            timeline.append(SimpleTimelineItem(start, start + timedelta(days=rng.randrange(30))))
+        for _ in range(20):
+            point: date = date(2020, 1, 1) + timedelta(days=rng.randrange(1000))
+            start = date(2020, 1, 1) + timedelta(days=rng.randrange(1000))
+            timeline.append(SimpleTimelineItem(start, start + timedelta(days=rng.randrange(30))))  # out of order
+
+            def distance(item: SimpleTimelineItem) -> timedelta:
+                return max(item.start - point, point - item.end, timedelta(0))
+            expected = sorted(distance(item) for item in timeline)[:10]
+            self.assertEqual([distance(item) for item in timeline.nearest(point, 10)], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+async def produce(count: int):
+    """ an async source of records in order of start """
+    for day in range(count):
+        await asyncio.sleep(0)
+        yield {'start': f'2021-01-{day % 28 + 1:02d}', 'end': None, 'data': day, 'tags': ['feed']}
+
+
+class TestIngest(unittest.TestCase):
+    """ Testing the asynchronous ingestion """
+
+    def test_aextend(self):
+        """ Test that an async iterable is committed in batches """
+        timeline: Timeline = Timeline(interval_index=True)
+        timeline.append(TimelineItem('2020-01-01', '2020-01-02', 'first'))
+        self.assertEqual(asyncio.run(timeline.aextend(produce(28), batch_size=10)), 28)
+        self.assertEqual(len(timeline), 29)
+        self.assertTrue(timeline.is_sorted)
+        self.assertEqual(len(list(timeline.tag_filter('feed'))), 28)
+        self.assertEqual(len(list(timeline.active_at('2021-06-01'))), 28)
+        self.assertEqual(timeline[-1].data, 27)
+
+    def test_ingestor(self):
+        """ Test backpressure, batching and that readers only see whole batches """
+        timeline: Timeline = Timeline()
+        commits: set = {0}
+        timeline.instrument(hook=lambda operation, *_: commits.add(len(timeline)) if operation == 'extend' else None)
+        seen: set = set()
+
+        async def reader(ingest):
+            while ingest.committed < 100:
+                seen.add(len(timeline))
+                await asyncio.sleep(0)
+
+        async def main():
+            async with timeline.ingestor(batch_size=8, max_pending=16) as ingest:
+                task = asyncio.ensure_future(reader(ingest))
+                for day in range(100):
+                    await ingest.put(SimpleTimelineItem(f'2021-02-{day % 28 + 1:02d}', None) if day % 2 else
+                                     {'start': f'2021-02-{day % 28 + 1:02d}', 'end': None, 'data': day})
+                    self.assertLessEqual(ingest._queue.qsize(), 16)
+                await ingest.flush()
+                self.assertEqual(len(timeline), 100)
+                await task
+            return ingest
+
+        ingest = asyncio.run(main())
+        self.assertEqual(ingest.committed, 100)
+        self.assertEqual(ingest.batches, len(commits) - 1)
+        self.assertGreaterEqual(ingest.batches, 100 // 8)
+        self.assertTrue(seen.issubset(commits))
+        self.assertEqual(sum(isinstance(item, TimelineItem) for item in timeline), 50)
+
+    def test_ingestor_error(self):
+        """ Test that a bad record is reported to the producer """
+        timeline: Timeline = Timeline()
+
+        async def main():
+            ingest = timeline.ingestor()
+            await ingest.put({'start': '2021-02-02', 'end': '2021-01-01'})
+            with self.assertRaises(ValueError):
+                await ingest.flush()
+            await ingest.put({'start': '2021-01-01', 'end': '2021-02-02'})
+            await ingest.close()
+            with self.assertRaises(RuntimeError):
+                await ingest.put({'start': '2021-01-01', 'end': '2021-02-02'})
+
+        asyncio.run(main())
+        self.assertEqual(len(timeline), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem
+
+
+class TestIntervalIndex(unittest.TestCase):
+    """ Testing IntervalIndex and the interval queries on Timeline """
+
+    def setUp(self) -> None:
+        self.first: SimpleTimelineItem = SimpleTimelineItem('2020-01-01', '2020-12-31')
+        self.second: SimpleTimelineItem = SimpleTimelineItem('2021-01-01', '2021-12-31')
+        self.no_start: SimpleTimelineItem = SimpleTimelineItem(None, '2020-06-01')
+        self.no_end: SimpleTimelineItem = SimpleTimelineItem('2021-06-01', None)
+        self.endless: SimpleTimelineItem = SimpleTimelineItem(None, None)
+        self.moment: SimpleTimelineItem = SimpleTimelineItem('2020-03-03T12:00:00', '2020-03-03T13:00:00')
+        self.items = [self.first, self.second, self.no_start, self.no_end, self.endless, self.moment]
+
+    def test_overlapping(self):
+        """ Test overlap queries including indefinite starts and ends """
+        index: IntervalIndex = IntervalIndex(self.items)
+        result = index.overlapping(('2020-07-01', '2020-08-01'))
+        self.assertEqual(set(map(id, result)), {id(self.first), id(self.endless)})
+        result = index.overlapping(self.second)
+        self.assertEqual(set(map(id, result)), {id(self.second), id(self.no_end), id(self.endless)})
+        result = index.overlapping((None, '2020-01-01'))
+        self.assertEqual(set(map(id, result)), {id(self.first), id(self.no_start), id(self.endless)})
+
+    def test_active_at(self):
+        """ Test stabbing queries with date and datetime points """
+        index: IntervalIndex = IntervalIndex(self.items)
+        result = index.active_at(datetime(2020, 3, 3, 12, 30))
+        self.assertEqual(set(map(id, result)), {id(self.first), id(self.no_start), id(self.endless), id(self.moment)})
+        result = index.active_at(date(2030, 1, 1))
+        self.assertEqual(set(map(id, result)), {id(self.no_end), id(self.endless)})
+        self.assertRaises(ValueError, index.active_at, None)
+
+    def test_contained_in(self):
+        """ Test containment queries """
+        index: IntervalIndex = IntervalIndex(self.items)
+        result = index.contained_in(('2020-01-01', '2020-12-31'))
+        self.assertEqual(set(map(id, result)), {id(self.first), id(self.moment)})
+        result = index.contained_in((None, None))
+        self.assertEqual(len(result), len(self.items))
+
+    def test_ordered_and_pending(self):
+        """ Test results are ordered by start and agree with a linear scan after many appends """
+        rng: random.Random = random.Random(7)
+        timeline: Timeline = Timeline(interval_index=True)
+        plain: Timeline = Timeline()
+        base: date = date(2020, 1, 1)
+        for _ in range(3000):
+            start: date = base + timedelta(days=rng.randint(0, 1000))
+            item = SimpleTimelineItem(start, start + timedelta(days=rng.randint(0, 30)))
+            timeline.append(item)
+            plain.append(item)
+        window = (date(2021, 1, 1), date(2021, 2, 1))
+        result = list(timeline.overlapping(window))
+        self.assertEqual([id(i) for i in result], [id(i) for i in sorted(plain.overlapping(window),
+                                                                         key=lambda i: i.start)])
+        self.assertEqual(sorted(map(id, timeline.contained_in(window))), sorted(map(id, plain.contained_in(window))))
+        self.assertEqual([i.start for i in result], sorted(i.start for i in result))
+
+    def test_interleaved_appends(self):
+        """ Test that interleaved appends and queries never rebuild the large run and keep few runs """
+        base: date = date(2020, 1, 1)
+        index: IntervalIndex = IntervalIndex(SimpleTimelineItem(base + timedelta(days=i % 900), None)
+                                             for i in range(10000))
+        index.PENDING_LIMIT = 8
+        built = index._runs[0]
+        for i in range(1000):
+            index.add(SimpleTimelineItem(base + timedelta(days=i), base + timedelta(days=i)))
+            day: date = base + timedelta(days=i)
+            self.assertEqual(len(index.contained_in((day, day))), 1)  # the others are open ended
+            self.assertLess(len(index._pending), index.PENDING_LIMIT)
+            self.assertLessEqual(len(index._runs), 1 + (i + 1).bit_length())
+        self.assertIs(index._runs[0], built)
+        self.assertEqual(len(index), 11000)
+
+    def test_index_intervals(self):
+        """ Test enabling the index on an existing timeline """
+        timeline: Timeline = Timeline()
+        for item in self.items:
+            timeline.append(item)
+        self.assertEqual(len(list(timeline.active_at('2020-05-05'))), 3)
+        timeline.index_intervals()
+        self.assertEqual(len(list(timeline.active_at('2020-05-05'))), 3)
+        timeline.append(SimpleTimelineItem('2020-05-01', '2020-05-10'))
+        self.assertEqual(len(list(timeline.active_at('2020-05-05'))), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
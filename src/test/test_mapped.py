@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from timeline.mapped import MappedTimeline
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestMappedTimeline(unittest.TestCase):
+    """ Testing MappedTimeline """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path: str = os.path.join(self.directory.name, 'timeline.bin')
+        self.timeline: Timeline = Timeline()
+        self.timeline.append(TimelineItem('2022-11-11', '2022-12-12', {'answer': 'Yes'}, tags=['yes', 'more']))
+        self.timeline.append(SimpleTimelineItem(None, '2020-10-10T10:00:00'))
+        self.timeline.append(TimelineItem('2021-01-01T08:30:00', None, ('tuple', date(2021, 1, 1)), 'yes'))
+        self.timeline.append(TimelineItem('2020-05-05', '2020-06-06', None))
+        MappedTimeline.dump(self.timeline, self.path)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """ Test that the items come back sorted with dates, types, data and tags """
+        with MappedTimeline(self.path, allow_pickle=True) as mapped:
+            self.assertEqual(len(mapped), 4)
+            self.assertTrue(mapped.is_sorted)
+            expected = sorted(self.timeline, key=lambda t: Timeline._start_key(t))
+            for original, item in zip(expected, mapped):
+                self.assertIs(type(item), type(original))
+                self.assertEqual(item.start, original.start)
+                self.assertEqual(item.end, original.end)
+                self.assertEqual(type(item.start), type(original.start))
+                if isinstance(original, TimelineItem):
+                    self.assertEqual(item.data, original.data)
+                    self.assertIs(item.tags, original.tags)
+            self.assertEqual(len(mapped.to_timeline()), 4)
+            self.assertIsNone(mapped[0].start)
+
+    def test_queries(self):
+        """ Test range, interval, tag and class queries on the mapped columns """
+        with MappedTimeline(self.path, allow_pickle=True) as mapped:
+            result = list(mapped.filter(before=date(2021, 6, 1), after=date(2020, 1, 1)))
+            self.assertEqual([str(item) for item in result], ['2020-05-05 - 2020-06-06', '2021-01-01T08:30:00 - None'])
+            self.assertEqual(len(list(mapped.overlapping(('2020-06-01', '2020-12-31')))), 2)
+            self.assertEqual(len(list(mapped.active_at(datetime(2023, 1, 1)))), 1)
+            self.assertEqual(len(list(mapped.contained_in((None, '2021-01-01')))), 2)
+            self.assertEqual(len(list(mapped.tag_filter('yes'))), 2)
+            self.assertEqual(len(list(mapped.tag_filter(['yes', 'more']))), 1)
+            self.assertEqual(len(list(mapped.tag_filter(['more', 'unknown'], one_of=True))), 1)
+            self.assertEqual(len(list(mapped.tag_filter(['more', 'unknown']))), 0)
+            self.assertEqual(len(list(mapped.class_filter(TimelineItem))), 3)
+            self.assertEqual(len(list(mapped.data_filter(lambda t: t.start is None))), 1)
+
+    def test_overlap_blocks(self):
+        """ Test overlap queries skipping blocks of items against Timeline, on sorted and unsorted files """
+        rng: random.Random = random.Random(11)
+        timeline: Timeline = Timeline()
+        for i in range(5000):
+            start: date = date(2000, 1, 1) + timedelta(days=rng.randrange(8000))
+            timeline.append(SimpleTimelineItem(start, None if i == 1234 else start + timedelta(days=rng.randrange(40))))
+        for sort in (True, False):
+            MappedTimeline.dump(timeline, self.path, sort=sort)
+            with MappedTimeline(self.path) as mapped:
+                for window in (('2010-01-01', '2010-02-01'), ('2000-01-01', '2000-01-01'), (None, '2005-05-05'),
+                               ('2030-01-01', None)):
+                    self.assertEqual(sorted(item.start_key for item in mapped.overlapping(window)),
+                                     sorted(item.start_key for item in timeline.overlapping(window)))
+
+    def test_allow_pickle(self):
+        """ Test that the payloads are only unpickled with allow_pickle """
+        with MappedTimeline(self.path) as mapped:
+            self.assertEqual(len(list(mapped.filter(before=date(2020, 1, 1)))), 1)  # a SimpleTimelineItem
+            self.assertRaises(ValueError, list, mapped.tag_filter('yes'))
+            self.assertRaises(ValueError, mapped.to_timeline)
+
+    def test_unknown_class(self):
+        """ Test that a class that is not defined is refused rather than imported """
+        with open(self.path, 'rb') as f:
+            content: bytes = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(content.replace(b'"timeline.timeline_item"', b'"timeline.timeline_itex"'))
+        self.assertRaises(ValueError, MappedTimeline, self.path)
+
+    def test_empty(self):
+        """ Test an empty timeline """
+        MappedTimeline.dump(Timeline(), self.path)
+        with MappedTimeline(self.path) as mapped:
+            self.assertEqual(len(mapped), 0)
+            self.assertEqual(list(mapped.filter(before=date(2020, 1, 1))), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
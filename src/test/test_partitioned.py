@@ -0,0 +1,114 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from timeline.partitioned import PartitionedTimeline
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+def random_items(count: int, seed: int = 7) -> list:
+    """ items over three years with some open ends """
+    rng = random.Random(seed)
+    items = list()
+    for i in range(count):
+        start = date(2019, 1, 1) + timedelta(days=rng.randrange(3 * 365))
+        end = start + timedelta(days=rng.randrange(90))
+        items.append(TimelineItem(None if i % 17 == 0 else start, None if i % 13 == 0 else end, i,
+                                  tags=['even' if i % 2 == 0 else 'odd']))
+    return items
+
+
+def multiple_of_five(item: TimelineItem) -> bool:
+    """ predicate for the data_filter on processes (module level so it can be pickled) """
+    return item.data % 5 == 0
+
+
+class TestPartitionedTimeline(unittest.TestCase):
+    """ Testing PartitionedTimeline against Timeline """
+
+    def setUp(self) -> None:
+        self.items = random_items(400)
+        self.timeline: Timeline = Timeline()
+        for item in self.items:
+            self.timeline.append(item)
+        self.timeline.sort()
+        self.partitioned: PartitionedTimeline = PartitionedTimeline('month', workers=4)
+        self.partitioned.extend(self.items[:200])
+        for item in self.items[200:]:
+            self.partitioned.append(item)
+
+    def assertSameItems(self, result, expected):
+        """ the same items in order of start (the order of items starting at the same time may differ) """
+        result, expected = list(result), list(expected)
+        self.assertEqual([item.start_key for item in result], sorted(item.start_key for item in result))
+        self.assertEqual(sorted((item.start_key, item.data) for item in result),
+                         sorted((item.start_key, item.data) for item in expected))
+
+    def test_partitions(self):
+        """ Test the partition labels and the overflow partition """
+        self.assertEqual(len(self.partitioned), 400)
+        self.assertEqual(self.partitioned.partitions[0], '2019-01')
+        self.assertEqual(self.partitioned.partitions[-1], 'open')
+        self.assertTrue(all(item.start is None or item.end is None
+                            for item in self.partitioned.partition('open').timeline))
+        self.assertEqual(PartitionedTimeline('year').label(SimpleTimelineItem('2020-05-05', '2020-05-06')), '2020')
+        self.assertRaises(ValueError, PartitionedTimeline, 'decade')
+        self.assertEqual([item.start for item in self.partitioned], [item.start for item in self.timeline])
+
+    def test_queries(self):
+        """ Test that the pruned queries and the data_filter on processes give what Timeline gives """
+        after, before = date(2020, 3, 15), date(2020, 6, 1)
+        self.assertSameItems(self.partitioned.filter(before, after), self.timeline.filter(before, after))
+        self.assertSameItems(self.partitioned.filter(after=after), self.timeline.filter(after=after))
+        window = SimpleTimelineItem('2020-03-15', '2020-06-01')
+        self.assertSameItems(self.partitioned.overlapping(window), self.timeline.overlapping(window))
+        self.assertEqual(len(list(self.partitioned.active_at('2021-01-01'))),
+                         len(list(self.timeline.active_at('2021-01-01'))))
+        self.assertSameItems(self.partitioned.tag_filter('even'), self.timeline.tag_filter('even'))
+        self.assertSameItems(self.partitioned.data_filter(multiple_of_five),
+                             self.timeline.data_filter(multiple_of_five))
+        single: PartitionedTimeline = PartitionedTimeline('month')
+        single.extend(self.items)
+        self.assertSameItems(single.data_filter(lambda item: item.data % 5 == 0),
+                             self.timeline.data_filter(multiple_of_five))
+        self.assertSameItems(Timeline.from_list(self.partitioned.to_list()), self.timeline)
+        self.assertEqual(len(self.partitioned._labels(SimpleTimelineItem.point_key(after),
+                                                      SimpleTimelineItem.point_key(before))), 5)
+
+    def test_serialisation(self):
+        """ Test evicting a partition and dumping and loading all partitions """
+        with tempfile.TemporaryDirectory() as directory:
+            self.partitioned.evict('2019-01', os.path.join(directory, 'cold.jsonl.gz'))
+            self.assertFalse(self.partitioned.is_loaded('2019-01'))
+            self.assertSameItems(self.partitioned.filter(date(2019, 6, 1)), self.timeline.filter(date(2019, 6, 1)))
+            self.assertTrue(self.partitioned.is_loaded('2019-01'))
+            self.partitioned.dump(directory)
+            loaded: PartitionedTimeline = PartitionedTimeline.load(directory)
+            self.assertEqual(len(loaded), 400)
+            self.assertFalse(loaded.is_loaded('2020-01'))
+            self.assertSameItems(loaded.filter(date(2021, 2, 1), date(2021, 1, 1)),
+                                 self.timeline.filter(date(2021, 2, 1), date(2021, 1, 1)))
+            self.assertFalse(loaded.is_loaded('2020-01'))
+            loaded.append(TimelineItem('2020-01-05', '2020-01-06', 'new'))
+            self.assertTrue(loaded.is_loaded('2020-01'))
+            self.assertEqual(len(loaded), 401)
+
+    def test_dump_evicted(self):
+        """ Test that dumping copies the files of evicted partitions without loading them """
+        with tempfile.TemporaryDirectory() as directory:
+            self.partitioned.evict('2019-01', os.path.join(directory, 'cold.jsonl.gz'))
+            self.partitioned.evict('2019-02', os.path.join(directory, 'cold.jsonl'))
+            for compress in (False, True):
+                target: str = os.path.join(directory, 'compressed' if compress else 'plain')
+                self.partitioned.dump(target, compress=compress)
+                self.assertFalse(self.partitioned.is_loaded('2019-01'))
+                self.assertFalse(self.partitioned.is_loaded('2019-02'))
+                loaded: PartitionedTimeline = PartitionedTimeline.load(target)
+                self.assertSameItems(loaded, self.timeline)
+
+
+if __name__ == '__main__':
+    unittest.main()
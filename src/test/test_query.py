@@ -0,0 +1,59 @@
+import unittest
+from datetime import date, timedelta
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestQuery(unittest.TestCase):
+    """ Testing the lazy Query on Timeline """
+
+    def setUp(self) -> None:
+        self.timeline: Timeline = Timeline()
+        base: date = date(2020, 1, 1)
+        for i in range(200):
+            start: date = base + timedelta(days=i)
+            if i % 10 == 0:
+                self.timeline.append(SimpleTimelineItem(start, start + timedelta(days=5)))
+            else:
+                self.timeline.append(TimelineItem(start, start + timedelta(days=5), i,
+                                                  ['even' if i % 2 == 0 else 'odd', f'mod{i % 3}']))
+
+    def test_criteria(self):
+        """ Test that the combined criteria give the same as the separate filters """
+        query = self.timeline.query().between(date(2020, 2, 1), date(2020, 4, 1)).tags(['even']) \
+            .of_class(TimelineItem).where(lambda item: item.data % 4 == 0)
+        expected = [item for item in self.timeline.filter(before=date(2020, 4, 1), after=date(2020, 2, 1))
+                    if isinstance(item, TimelineItem) and item.has_tag('even') and item.data % 4 == 0]
+        self.assertEqual(list(query), expected)
+        self.assertEqual(query.count(), len(expected))
+        self.assertIs(query.first(), expected[0])
+        self.assertEqual(list(self.timeline.query().limit(3)), self.timeline.timeline[:3])
+
+    def test_tags(self):
+        """ Test one-of and exclude tag criteria """
+        result = list(self.timeline.query().tags(one_of=['mod0', 'mod1'], exclude='odd'))
+        self.assertTrue(all(item.has_tag('even') and not item.has_tag('mod2') for item in result))
+        self.assertEqual(len(result), len(list(self.timeline.tag_filter(['mod0', 'mod1'], one_of=True,
+                                                                        exclude=['odd']))))
+
+    def test_planner(self):
+        """ Test that the planner takes the most selective index and runs user functions last """
+        plan = self.timeline.query().where(bool).tags('mod0').between(date(2020, 1, 1), date(2020, 1, 10)).explain()
+        self.assertEqual(plan, ['range (10 candidates)', 'tags', 'where'])
+        plan = self.timeline.query().tags('mod0').between(date(2020, 1, 1), date(2020, 6, 10)).explain()
+        self.assertEqual(plan[0], 'tags (60 candidates)')
+        self.assertEqual(self.timeline.query().of_class(SimpleTimelineItem).explain(),
+                         ['scan (200 candidates)', 'class'])
+        self.timeline.index_intervals()
+        query = self.timeline.query().active_at(date(2020, 3, 3)).of_class(TimelineItem)
+        self.assertEqual(query.explain(), ['interval index (6 candidates)', 'class'])
+        self.assertEqual(query.count(), 5)
+        unsorted: Timeline = Timeline()
+        unsorted.extend(self.timeline)
+        unsorted.sort(reverse=True)
+        self.assertEqual(unsorted.query().between(date(2020, 1, 1), date(2020, 1, 10)).count(), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
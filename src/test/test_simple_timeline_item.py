@@ -1,7 +1,7 @@
 import unittest
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
-from timeline.timeline_item import SimpleTimelineItem
+from timeline.timeline_item import SimpleTimelineItem, MIN_KEY, MAX_KEY
 
 
 class TestSimpleTimelineItem(unittest.TestCase):
@@ -75,6 +75,30 @@ class TestSimpleTimelineItem(unittest.TestCase):
         self.assertTrue(self.endless >= self.endless)
         self.assertFalse(self.endless >= self.second)
 
+    def test_keys(self):
+        """ Test the precomputed keys and comparisons across None, date and datetime """
+        self.assertEqual(self.endless.start_key, MIN_KEY)
+        self.assertEqual(self.endless.end_key, MAX_KEY)
+        self.assertEqual(self.first.start_key, SimpleTimelineItem.point_key(date(2020, 1, 1)))
+        mixed: SimpleTimelineItem = SimpleTimelineItem('2020-01-01T12:00:00', '2020-01-02')
+        self.assertTrue(self.first < mixed < self.ending)
+        self.assertRaises(ValueError, SimpleTimelineItem, '2020-01-02T12:00:00', '2020-01-02')
+        items = [self.second, mixed, self.endless, self.first, SimpleTimelineItem(None, '2019-01-01')]
+        self.assertEqual([item.start for item in sorted(items)],
+                         [None, None, date(2020, 1, 1), datetime(2020, 1, 1, 12), date(2021, 1, 1)])
+        self.assertTrue(mixed.overlap(self.first))
+        self.assertTrue(self.first.contains(mixed))
+        self.assertFalse(self.ending.contains(mixed))
+        self.assertTrue(SimpleTimelineItem('2019-12-01', '2020-01-02').contains(mixed))
+
+    def test_shared_keys(self):
+        """ Test that items on the same day share their key objects, also when built from given keys """
+        key: int = SimpleTimelineItem.point_key(date(2020, 1, 1)) + 0  # an int object of its own
+        other: SimpleTimelineItem = SimpleTimelineItem._build(date(2020, 1, 1), None, key)
+        self.assertIs(SimpleTimelineItem('2020-01-01', '2020-01-01').end_key, self.first.start_key)
+        self.assertIs(other.start_key, self.first.start_key)
+        self.assertEqual(other.end_key, MAX_KEY)
+
     def test_is_event(self):
         """ Test whether the start and end are the same """
         self.assertTrue(self.event.is_event)
@@ -111,6 +135,12 @@ class TestSimpleTimelineItem(unittest.TestCase):
         self.assertTrue(self.event.overlap(self.first))
         self.assertFalse(self.first.overlap(self.second))
         self.assertFalse(self.second.overlap(self.first))
+        open_start: SimpleTimelineItem = SimpleTimelineItem(None, '2019-06-30')
+        self.assertFalse(open_start.overlap(self.first))
+        self.assertFalse(self.first.overlap(open_start))
+        self.assertTrue(open_start.overlap(SimpleTimelineItem(None, '2018-01-01')))
+        self.assertTrue(open_start.overlap(SimpleTimelineItem('2019-06-30', None)))
+        self.assertFalse(open_start.overlap(SimpleTimelineItem('2019-07-01', None)))
 
     def test_distinct(self):
         """ Test whether distinct works - items do not overlap with dates
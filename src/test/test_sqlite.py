@@ -0,0 +1,124 @@
+import os
+import pickle
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+
+from timeline.sqlite import SqliteTimeline, LazyTimelineItem
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class Event(TimelineItem):
+    """ a subclass to test that classes are restored """
+    __slots__ = ()
+
+
+class TestSqliteTimeline(unittest.TestCase):
+    """ Testing the timeline stored in SQLite """
+
+    def setUp(self) -> None:
+        self.timeline: Timeline = Timeline()
+        self.timeline.append(TimelineItem('2022-11-11', '2022-12-12', {'size': 'large'}, tags=['yes', 'more']))
+        self.timeline.append(TimelineItem('2020-09-09', '2020-10-10', 'No', tags=['no']))
+        self.timeline.append(SimpleTimelineItem('2021-01-01T10:00:00', None))
+        self.timeline.append(Event(None, '2021-06-01', 'event', tags=['yes']))
+        self.timeline.append(TimelineItem(datetime(2021, 3, 1, 12, tzinfo=timezone.utc), '2021-03-02', [1, 2]))
+
+    def test_round_trip(self):
+        """ Test that the items come back in order of start with their classes, tags and data """
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, 'timeline.db')
+            with SqliteTimeline(path, allow_pickle=True) as stored:
+                stored.extend(self.timeline, batch_size=2)
+                self.assertEqual(len(stored), 5)
+            with SqliteTimeline(path, allow_pickle=True) as stored:
+                self.assertEqual(len(stored), 5)
+                self.assertEqual(stored.to_list(), self.timeline.sort().to_list())
+                self.assertEqual([type(item) for item in stored],
+                                 [Event, LazyTimelineItem, SimpleTimelineItem, LazyTimelineItem, LazyTimelineItem])
+                self.assertEqual(stored[-1].data, {'size': 'large'})
+                stored.append(TimelineItem('2023-01-01', '2023-01-02', 'new', tags=['new']))
+                self.assertEqual([item.data for item in stored.tag_filter('new')], ['new'])
+            with SqliteTimeline(path, allow_pickle=True) as stored:
+                self.assertEqual(len(stored), 6)
+
+    def test_lazy_payloads(self):
+        """ Test that payloads are read on first access and that lazy items behave as TimelineItems """
+        stored: SqliteTimeline = SqliteTimeline(allow_pickle=True)
+        stored.extend(self.timeline)
+        item = stored[-1]
+        self.assertIsInstance(item, TimelineItem)
+        self.assertEqual(item.tags, {'yes', 'more'})
+        self.assertEqual(item.data, {'size': 'large'})
+        self.assertIs(item.data, item.data)
+        self.assertEqual(item.to_dict()['type'], 'TimelineItem')
+        copied = pickle.loads(pickle.dumps(item))
+        self.assertIs(type(copied), TimelineItem)
+        self.assertEqual(copied.data, {'size': 'large'})
+        eager: SqliteTimeline = SqliteTimeline(lazy=False, allow_pickle=True)
+        eager.extend(stored)
+        self.assertTrue(all(type(item) is not LazyTimelineItem for item in eager))
+        self.assertEqual(eager.to_list(), stored.to_list())
+
+    def test_allow_pickle(self):
+        """ Test that the payloads are only unpickled with allow_pickle """
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, 'timeline.db')
+            with SqliteTimeline(path) as stored:
+                stored.extend(self.timeline)
+            with SqliteTimeline(path) as stored:
+                item = next(iter(stored.tag_filter('no')))
+                self.assertEqual(item.tags, {'no'})
+                self.assertRaises(ValueError, getattr, item, 'data')
+                self.assertRaises(ValueError, stored.to_timeline)
+                self.assertEqual(len(list(stored.filter(after=date(2021, 1, 1)))), 3)
+            with SqliteTimeline(path, lazy=False) as stored:
+                self.assertRaises(ValueError, list, stored.tag_filter('no'))
+
+    def test_queries(self):
+        """ Test the indexed queries against Timeline """
+        stored: SqliteTimeline = SqliteTimeline(allow_pickle=True)
+        stored.extend(self.timeline)
+        self.timeline.sort()
+
+        def same(found, expected):
+            self.assertEqual([item.to_dict() for item in found], [item.to_dict() for item in expected])
+        same(stored.filter(after=date(2021, 1, 1)), self.timeline.filter(after=date(2021, 1, 1)))
+        same(stored.filter(before='2021-03-01'), self.timeline.filter(before=date(2021, 3, 1)))
+        for tags, one_of, exclude in ((['yes'], False, None), (['yes', 'more'], False, None),
+                                      (['yes', 'no'], True, None), (None, False, 'yes'), (['yes'], False, 'more'),
+                                      (['missing'], False, None), (['missing', 'no'], True, None), ([], True, None)):
+            same(stored.tag_filter(tags, one_of, exclude), self.timeline.tag_filter(tags, one_of, exclude))
+        same(stored.class_filter(TimelineItem), self.timeline.class_filter(TimelineItem))
+        same(stored.class_filter(Event), self.timeline.class_filter(Event))
+        same(stored.data_filter(lambda item: isinstance(item, TimelineItem) and item.data == 'No'),
+             self.timeline.data_filter(lambda item: isinstance(item, TimelineItem) and item.data == 'No'))
+        window = ('2021-02-01', '2021-05-01')
+        same(stored.overlapping(window), self.timeline.overlapping(window))
+        same(stored.contained_in(window), self.timeline.contained_in(window))
+        same(stored.active_at('2021-03-01'), self.timeline.active_at('2021-03-01'))
+        self.assertEqual(stored.to_timeline().to_list(), self.timeline.to_list())
+
+    def test_rollback(self):
+        """ Test that a failed batch leaves neither rows nor codes behind """
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, 'timeline.db')
+            with SqliteTimeline(path, allow_pickle=True) as stored:
+                stored.append(TimelineItem('2020-01-01', '2020-01-02', 'first', tags=['old']))
+                batch = [Event('2020-02-01', '2020-02-02', 'kept', tags=['fresh']),
+                         TimelineItem('2020-03-01', '2020-03-02', lambda: 'not picklable', tags=['other'])]
+                self.assertRaises(Exception, stored.extend, batch)
+                self.assertEqual(len(stored), 1)
+                self.assertEqual(list(stored.tag_filter('fresh')), [])
+                stored.append(TimelineItem('2020-04-01', '2020-04-02', 'new', tags=['other']))
+                stored.append(Event('2020-05-01', '2020-05-02', 'event', tags=['fresh']))
+            with SqliteTimeline(path, allow_pickle=True) as stored:
+                self.assertEqual([item.data for item in stored.tag_filter('fresh')], ['event'])
+                self.assertEqual([item.data for item in stored.tag_filter('other')], ['new'])
+                self.assertEqual([item.data for item in stored.class_filter(Event)], ['event'])
+                self.assertEqual(len(stored), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestSweep(unittest.TestCase):
+    """ Testing the sweep-line algorithms on Timeline """
+
+    @staticmethod
+    def random_timeline(seed: int, size: int) -> Timeline:
+        """ a timeline with random items, some open ended """
+        rng: random.Random = random.Random(seed)
+        timeline: Timeline = Timeline()
+        base: date = date(2020, 1, 1)
+        for i in range(size):
+            start = base + timedelta(days=rng.randint(0, 200))
+            end = start + timedelta(days=rng.randint(0, 20))
+            if i % 17 == 0:
+                start = None
+            if i % 13 == 0:
+                end = None
+            timeline.append(TimelineItem(start, end, i))
+        return timeline
+
+    @staticmethod
+    def ids(pairs) -> list:
+        return sorted((a.data, b.data) for a, b in pairs)
+
+    def test_overlap_join(self):
+        """ Test the join against a nested loop on the keys """
+        left, right = self.random_timeline(1, 150), self.random_timeline(2, 120)
+        expected = []
+        for a in left:
+            a_start, a_end = IntervalIndex.range_keys(a)
+            for b in right:
+                b_start, b_end = IntervalIndex.range_keys(b)
+                if a_start <= b_end and b_start <= a_end:
+                    expected.append((a.data, b.data))
+        self.assertEqual(self.ids(left.overlap_join(right)), sorted(expected))
+        result = self.ids(left.overlap_join(right, predicate=lambda a, b: a.data < b.data))
+        self.assertEqual(result, sorted(pair for pair in expected if pair[0] < pair[1]))
+
+    def test_contains_join(self):
+        """ Test the containment join against contains() """
+        left, right = self.random_timeline(3, 100), self.random_timeline(4, 100)
+        expected = sorted((a.data, b.data) for a in left for b in right if a.contains(b))
+        self.assertEqual(self.ids(left.contains_join(right)), expected)
+
+    def test_adjacent_join(self):
+        """ Test the adjacency join against adjacent() """
+        left, right = self.random_timeline(5, 100), self.random_timeline(6, 100)
+        right.append(TimelineItem('2020-03-02T10:00:00', None, 1000))
+        left.append(TimelineItem(None, '2020-03-01', 1001))
+        expected = sorted((a.data, b.data) for a in left for b in right if a.adjacent(b))
+        self.assertTrue(expected)
+        self.assertEqual(sorted((a.data, b.data) for a, b in left.adjacent_join(right)), expected)
+
+    def test_endless(self):
+        """ Test that an endless item overlaps everything """
+        left: Timeline = Timeline()
+        left.append(SimpleTimelineItem(None, None))
+        right = self.random_timeline(7, 20)
+        self.assertEqual(len(list(left.overlap_join(right))), 20)
+        self.assertEqual(len(list(left.contains_join(right))), 20)
+        self.assertEqual(len(list(right.overlap_join(left))), 20)
+
+    def test_coalesce_same(self):
+        """ Test folding of items with the same start and end without changing the source """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2020-01-01', '2020-01-31', ['a'], 'x'))
+        timeline.append(TimelineItem('2020-02-01', '2020-02-28', 'b', 'y'))
+        timeline.append(TimelineItem('2020-01-01', '2020-01-31', 'c', 'z'))
+        timeline.append(SimpleTimelineItem('2020-01-01', '2020-01-31'))
+        timeline.append(TimelineItem('2020-01-01T00:00:00', '2020-01-31T00:00:00', 'd'))
+        result: Timeline = timeline.coalesce()
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0].data, ['a', 'c'])
+        self.assertEqual(result[0].tags, {'x', 'z'})
+        self.assertEqual(timeline[0].data, ['a'])
+        self.assertEqual(timeline[0].tags, {'x'})
+        self.assertIs(result[1], timeline[1])
+        self.assertEqual(len(timeline), 5)
+        self.assertIs(timeline.coalesce(inplace=True), timeline)
+        self.assertEqual(len(timeline), 3)
+
+    def test_coalesce_span(self):
+        """ Test collapsing runs of overlapping and adjacent items """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2020-01-10', '2020-01-20', 2, 'b'))
+        timeline.append(TimelineItem('2020-01-01', '2020-01-15', 1, 'a'))
+        timeline.append(SimpleTimelineItem('2020-01-21', '2020-01-25'))
+        timeline.append(TimelineItem('2020-02-01', None, 3))
+        timeline.append(SimpleTimelineItem('2020-03-01', '2020-03-02'))
+        result = [str(t) for t in timeline.coalesce(span='overlap')]
+        self.assertEqual(result, ['2020-01-01 - 2020-01-20', '2020-01-21 - 2020-01-25', '2020-02-01 - None'])
+        result: Timeline = timeline.coalesce(span='adjacent')
+        self.assertEqual([str(t) for t in result], ['2020-01-01 - 2020-01-25', '2020-02-01 - None'])
+        self.assertEqual(result[0].data, [1, 2])
+        self.assertEqual(result[0].tags, {'a', 'b'})
+        self.assertTrue(result.is_sorted)
+        self.assertRaises(ValueError, timeline.coalesce, span='nearby')
+
+    def test_union(self):
+        """ Test the union against the days covered by the items """
+        timeline: Timeline = Timeline()
+        rng: random.Random = random.Random(5)
+        for i in range(60):
+            start = date(2020, 1, 1) + timedelta(days=rng.randint(0, 300))
+            timeline.append(TimelineItem(start, start + timedelta(days=rng.randint(0, 6)), i, tags='on call'))
+        days = {item.start + timedelta(days=d) for item in timeline for d in range(len(item) + 1)}
+        for adjacent in (False, True):
+            union: Timeline = timeline.union(adjacent=adjacent)
+            self.assertTrue(union.is_sorted)
+            self.assertTrue(all(type(item) is SimpleTimelineItem for item in union))
+            self.assertEqual({item.start + timedelta(days=d) for item in union for d in range(len(item) + 1)}, days)
+            self.assertTrue(all(not a.overlap(b) for a, b in zip(union, union[1:])))
+        self.assertTrue(all(not a.adjacent(b) for a, b in zip(timeline.union(True), timeline.union(True)[1:])))
+        gaps: Timeline = timeline.gaps(within=('2019-12-25', '2021-01-10'), adjacent=True)
+        gap_days = {item.start + timedelta(days=d) for item in gaps for d in range(len(item) + 1)}
+        first, last = date(2019, 12, 25), date(2021, 1, 10)
+        window = {first + timedelta(days=d) for d in range((last - first).days + 1)}
+        self.assertEqual(gap_days, window - days)
+        self.assertEqual(gaps[0].start, date(2019, 12, 25))
+        self.assertEqual(gaps[-1].end, date(2021, 1, 10))
+        self.assertEqual(len(timeline.gaps(adjacent=True)), len(gaps) - 2)
+        self.assertEqual(timeline.coverage(), timedelta(days=len(days)))
+        within = ('2019-12-25', '2021-01-10')
+        self.assertEqual(timeline.coverage(within=within) + gaps.coverage(), timedelta(days=len(window)))
+        self.assertEqual(timeline.coverage(by_tag=True), {'on call': timeline.coverage()})
+
+    def test_unbounded_union(self):
+        """ Test None bounds and datetimes in union, gaps and coverage """
+        timeline: Timeline = Timeline()
+        timeline.append(SimpleTimelineItem(None, '2020-01-10'))
+        timeline.append(SimpleTimelineItem('2020-01-05', '2020-01-20'))
+        timeline.append(SimpleTimelineItem('2020-02-01T08:00:00', '2020-02-01T16:00:00'))
+        timeline.append(SimpleTimelineItem('2020-02-01T16:00:00', '2020-02-02T00:00:00'))
+        timeline.append(SimpleTimelineItem('2020-03-01', None))
+        self.assertEqual([(item.start, item.end) for item in timeline.union()],
+                         [(None, date(2020, 1, 20)), (datetime(2020, 2, 1, 8), datetime(2020, 2, 2)),
+                          (date(2020, 3, 1), None)])
+        self.assertEqual([(item.start, item.end) for item in timeline.gaps()],
+                         [(date(2020, 1, 21), datetime(2020, 2, 1, 8)), (datetime(2020, 2, 2), date(2020, 2, 29))])
+        self.assertEqual(len(timeline.gaps(within=(None, None))), 2)
+        self.assertRaises(ValueError, timeline.coverage)
+        within = ('2020-01-15', '2020-03-02')
+        self.assertEqual(timeline.coverage(within=within), timedelta(days=6, hours=16) + timedelta(days=2))
+        self.assertEqual(timeline.coverage(within=within) + timeline.gaps(within=within).coverage(),
+                         timedelta(days=48))
+        within = (datetime(2020, 1, 20, 12), datetime(2020, 2, 1, 12))
+        self.assertEqual(timeline.coverage(within=within) + timeline.gaps(within=within).coverage(),
+                         timedelta(days=12))
+
+    def test_coverage_and_gaps(self):
+        """ Test that the coverage and the gaps within a range add up to the range with dates and datetimes """
+        rng: random.Random = random.Random(9)
+
+        def point():
+            day: date = date(2020, 1, 1) + timedelta(days=rng.randrange(60))
+            return day if rng.random() < 0.5 else datetime.combine(day, datetime.min.time()) + \
+                timedelta(hours=rng.randrange(24))
+
+        def instant(point, days: int) -> datetime:  # a date starts at midnight and ends at the next
+            return datetime.combine(point + timedelta(days=days), datetime.min.time()) if type(point) is date else point
+
+        def item() -> SimpleTimelineItem:
+            return SimpleTimelineItem(*sorted((point(), point()), key=lambda p: SimpleTimelineItem(p, None).start_key))
+        for _ in range(500):
+            timeline: Timeline = Timeline()
+            for _ in range(rng.randrange(6)):
+                timeline.append(item())
+            window: SimpleTimelineItem = item()
+            self.assertEqual(timeline.coverage(within=window) + timeline.gaps(within=window).coverage(),
+                             instant(window.end, 1) - instant(window.start, 0))
+
+    def test_chains(self):
+        """ Test chains of adjacent and overlapping items against the pairwise predicates """
+        timeline: Timeline = Timeline()
+        for day in (1, 2, 3, 5, 6, 10):
+            timeline.append(TimelineItem(date(2020, 1, day), date(2020, 1, day), day, tags=['streak']))
+        timeline.append(TimelineItem(datetime(2020, 1, 4, 9), datetime(2020, 1, 4, 17), 4, tags=['other']))
+        streaks = timeline.find_chains()
+        self.assertEqual([[item.data for item in chain] for chain in streaks], [[1, 2, 3, 4, 5, 6]])
+        self.assertEqual([[item.data for item in chain] for chain in timeline.find_chains(tags='streak')],
+                         [[1, 2, 3], [5, 6]])
+        self.assertEqual(len(timeline.find_chains(min_length=1)), 2)
+        self.assertEqual(timeline.find_chains(predicate='overlap'), [])
+        rng: random.Random = random.Random(3)
+        items = list()
+        for _ in range(200):
+            start: date = date(2020, 1, 1) + timedelta(days=rng.randrange(400))
+            items.append(SimpleTimelineItem(start, start + timedelta(days=rng.randrange(3))))
+        for predicate in ('adjacent', 'overlap'):
+            chained = Timeline._bulk_timeline(items).find_chains(predicate=predicate, min_length=1)
+            self.assertEqual(sum(len(chain) for chain in chained), len(items))
+            chain_of = {id(item): n for n, chain in enumerate(chained) for item in chain}
+            for a in items:
+                for b in items:
+                    if a is not b and getattr(a, predicate)(b):
+                        self.assertEqual(chain_of[id(a)], chain_of[id(b)])
+        self.assertRaises(ValueError, timeline.find_chains, predicate='after')
+
+    def test_sequences(self):
+        """ Test tag A followed by tag B within a number of days """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2020-01-01', '2020-01-02', 'order 1', tags=['order']))
+        timeline.append(TimelineItem('2020-01-20', '2020-01-20', 'refund 1', tags=['refund']))
+        timeline.append(TimelineItem('2020-03-01', '2020-03-01', 'order 2', tags=['order']))
+        timeline.append(TimelineItem('2020-06-01', '2020-06-01', 'refund 2', tags=['refund']))
+        timeline.append(TimelineItem('2020-06-01', '2020-06-02', 'both', tags=['order', 'refund']))
+        matches = timeline.find_sequences(['order', 'refund'], within=timedelta(days=30))
+        self.assertEqual([[item.data for item in match] for match in matches], [['order 1', 'refund 1']])
+        matches = timeline.find_sequences(['order', 'refund'])
+        self.assertEqual([[item.data for item in match] for match in matches],
+                         [['order 1', 'refund 1'], ['order 2', 'refund 2']])
+        self.assertEqual(len(timeline.find_sequences(['order', 'refund', 'order'])), 2)
+        self.assertEqual(len(timeline.find_sequences(['refund'])), 3)
+        self.assertRaises(ValueError, timeline.find_sequences, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
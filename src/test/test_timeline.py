@@ -1,10 +1,20 @@
 import datetime
+import io
+import os
+import pickle
+import tempfile
 import unittest
 
+from timeline.partitioned import PartitionedTimeline
 from timeline.timeline import Timeline
 from timeline.timeline_item import SimpleTimelineItem, TimelineItem
 
 
+def late_start(item: SimpleTimelineItem) -> bool:
+    """ predicate for the parallel data_filter (module level so it can be pickled) """
+    return item.start > datetime.date.fromisoformat('2021-01-01')
+
+
 class TestTimeline(unittest.TestCase):
 
     def test_timeline_len(self):
@@ -41,6 +51,12 @@ class TestTimeline(unittest.TestCase):
         timeline2.append(SimpleTimelineItem('2020-09-09', '2020-10-10'))
         timeline.extend(timeline2)
         self.assertEqual(len(timeline), 4)
+        timeline.index_intervals()
+        self.assertEqual(len(list(timeline.tag_filter([], exclude='x'))), 4)
+        timeline.extend(timeline)
+        self.assertEqual(len(timeline), 8)
+        self.assertEqual(len(list(timeline.tag_filter([], exclude='x'))), 8)
+        self.assertEqual(len(list(timeline.overlapping(('2020-10-01', '2020-10-01')))), 4)
 
     def test_filter(self):
         """ test filter mechanism """
@@ -60,6 +76,18 @@ class TestTimeline(unittest.TestCase):
         result = [t for t in timeline.data_filter(lambda x: x.start == datetime.date.fromisoformat('2021-01-01'))]
         self.assertEqual(len(result), 0)
 
+    def test_parallel_data_filter(self):
+        """ test filtering with a function on a pool keeps the order """
+        timeline: Timeline = Timeline()
+        for i in range(100):
+            timeline.append(TimelineItem(datetime.date(2020, 1, 1) + datetime.timedelta(days=10 * i), None, i))
+        expected = [t.data for t in timeline.data_filter(late_start)]
+        self.assertEqual(len(expected), 63)
+        result = [t.data for t in timeline.data_filter(late_start, workers=2, chunksize=7)]
+        self.assertEqual(result, expected)
+        result = [t.data for t in timeline.data_filter(lambda x: x.data % 2 == 0, workers=3, threads=True)]
+        self.assertEqual(result, list(range(0, 100, 2)))
+
     def test_cls_filter(self):
         """ test filtering by class """
         class TestTimelineItem(SimpleTimelineItem):
@@ -86,10 +114,212 @@ class TestTimeline(unittest.TestCase):
         result = [t for t in timeline.tag_filter(['yes', 'something'], one_of=True)]
         self.assertEqual((len(result)), 2)
 
+    def test_tag_index(self):
+        """ test tag queries with exclusion and an index kept up to date by append, add_tag and sort """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2022-11-11', '2022-12-12', 'Yes', tags=['yes', 'more']))
+        timeline.append(TimelineItem('2020-09-09', '2020-10-10', 'No', tags=['no', 'something']))
+        timeline.append(SimpleTimelineItem('2021-01-01', '2021-01-02'))
+        self.assertEqual([t.data for t in timeline.tag_filter(['yes', 'no'], one_of=True)], ['Yes', 'No'])
+        self.assertEqual(len(list(timeline.tag_filter([], exclude='yes'))), 2)
+        self.assertEqual(len(list(timeline.tag_filter(['more', 'no'], one_of=True, exclude='no'))), 1)
+        timeline.append(TimelineItem('2023-01-01', '2023-01-02', 'Also', tags='yes'))
+        self.assertEqual(len(list(timeline.tag_filter('yes'))), 2)
+        timeline.add_tag(1, 'more')
+        self.assertEqual([t.data for t in timeline.tag_filter('more')], ['Yes', 'No'])
+        timeline.sort()
+        self.assertEqual([t.data for t in timeline.tag_filter('more')], ['No', 'Yes'])
+        self.assertEqual([t.data for t in timeline.tag_filter(['yes', 'more'])], ['Yes'])
+        timeline[0].add_tag('yes')  # directly on the items, not through the timeline
+        timeline[2].merge(TimelineItem('2022-11-11', '2022-12-12', 'Again', tags='new'))
+        self.assertEqual([t.data for t in timeline.tag_filter('yes')], ['No', ['Yes', 'Again'], 'Also'])
+        self.assertEqual([t.data for t in timeline.query().tags('new')], [['Yes', 'Again']])
+        self.assertEqual([t.data for t in timeline.tag_filter(['no', 'yes'])], ['No'])
 
+    def test_tag_index_changes(self):
+        """ test that only changes on the items of a timeline make its tag index stale """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2020-09-09', '2020-10-10', ['No'], tags='no'))
+        other: Timeline = Timeline()
+        other.append(TimelineItem('2020-09-09', '2020-10-10', 'Other', tags='no'))
+        self.assertEqual(len(list(timeline.tag_filter('no'))), 1)
+        self.assertEqual(len(list(other.tag_filter('no'))), 1)
+        TimelineItem('2021-01-01', '2021-01-02', 'Unrelated').add_tag('no')
+        other[0].add_tag('yes')
+        self.assertFalse(timeline._tag_index.stale)
+        timeline[0].merge(TimelineItem('2020-09-09', '2020-10-10', [], tags='no'))  # changes neither tags nor data
+        self.assertFalse(timeline._tag_index.stale)
+        copied: TimelineItem = pickle.loads(pickle.dumps(timeline[0]))
+        copied.add_tag('yes')
+        self.assertFalse(timeline._tag_index.stale)
+        timeline[0].add_tag('yes')
+        self.assertTrue(timeline._tag_index.stale)
+        self.assertTrue(other._tag_index.stale)
+        self.assertEqual(len(list(timeline.tag_filter('yes'))), 1)
 
+    def test_from_list(self):
+        """ test de-serialisation from a list """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2022-11-11', '2022-12-12', 'Yes', tags=['yes', 'more']))
+        timeline.append(SimpleTimelineItem(None, '2020-10-10T10:00:00'))
+        for result in [Timeline.from_list(timeline.to_list()), Timeline.from_records(timeline.to_list())]:
+            self.assertEqual(len(result), 2)
+            self.assertIsNone(result[0].start)
+            self.assertEqual(result[0].end, datetime.datetime(2020, 10, 10, 10, 0))
+            self.assertEqual(result[1].data, 'Yes')
+            self.assertEqual(result[1].tags, {'yes', 'more'})
 
+    def test_bulk_construction(self):
+        """ test the bulk loaders parse, type and validate the items """
+        records = [{'start': '2020-01-01', 'end': '2020-01-31', 'data': 1, 'tags': 'a'},
+                   {'start': '2020-01-01', 'end': None},
+                   {'start': '2020-02-01T12:00:00', 'end': '2020-02-01T13:00:00', 'data': 3}]
+        timeline: Timeline = Timeline.from_records(records)
+        self.assertEqual([type(t) for t in timeline], [TimelineItem, SimpleTimelineItem, TimelineItem])
+        self.assertIs(timeline[0].start, timeline[1].start)  # repeated strings are parsed once
+        self.assertTrue(timeline.is_sorted)
+        self.assertEqual(len(list(timeline.tag_filter('a'))), 1)
+        self.assertRaises(ValueError, Timeline.from_records, [{'start': '2020-02-01', 'end': '2020-01-01'}])
+        timeline = Timeline.from_columns(['2021-01-01', None, '2020-01-01'], ['2021-01-02', '2020-01-01', None])
+        self.assertEqual([type(t) for t in timeline], [SimpleTimelineItem] * 3)
+        self.assertFalse(timeline.is_sorted)
+        timeline = Timeline.from_columns(['2021-01-01'], ['2021-01-02'], tags=[['x', 'y']])
+        self.assertEqual(timeline[0].tags, {'x', 'y'})
+        self.assertIsNone(timeline[0].data)
+        self.assertRaises(ValueError, Timeline.from_columns, ['2021-01-03'], ['2021-01-02'])
+        self.assertRaises(ValueError, Timeline.from_columns, ['2021-01-03'], [])
 
+    def test_jsonl(self):
+        """ test streaming to and from JSON Lines, plain and gzip compressed """
+        timeline: Timeline = Timeline()
+        timeline.append(TimelineItem('2022-11-11', '2022-12-12', {'answer': 'Yes'}, tags=['yes', 'more']))
+        timeline.append(SimpleTimelineItem(None, '2020-10-10T10:00:00'))
+        timeline.append(TimelineItem.event('2021-01-01T00:00:00', [1, 2]))
+        text = io.StringIO()
+        timeline.dump_jsonl(text)
+        self.assertEqual(len(text.getvalue().splitlines()), 3)
+        text.seek(0)
+        items = list(Timeline.iter_jsonl(text))
+        compressed = io.BytesIO()
+        timeline.dump_jsonl(compressed, compress=True)
+        compressed.seek(0)
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, 'timeline.jsonl.gz')
+            timeline.dump_jsonl(path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(2), b'\x1f\x8b')
+            for result in [items, Timeline.load_jsonl(compressed, compress=True), Timeline.load_jsonl(path)]:
+                self.assertEqual([str(t) for t in result], [str(t) for t in timeline])
+                self.assertEqual([type(t) for t in result], [type(t) for t in timeline])
+                self.assertEqual(result[0].data, {'answer': 'Yes'})
+                self.assertEqual(result[0].tags, {'yes', 'more'})
+                self.assertEqual(result[2].start, datetime.datetime(2021, 1, 1))
+
+    def test_sorted_state(self):
+        """ test that the timeline keeps track of being sorted """
+        timeline: Timeline = Timeline()
+        timeline.append(SimpleTimelineItem('2020-09-09', '2020-10-10'))
+        timeline.append(SimpleTimelineItem('2022-11-11', '2022-12-12'))
+        self.assertTrue(timeline.is_sorted)
+        timeline.append(SimpleTimelineItem(None, '2020-10-10'))
+        self.assertFalse(timeline.is_sorted)
+        timeline.sort()
+        self.assertTrue(timeline.is_sorted)
+        self.assertIsNone(timeline[0].start)
+        timeline.sort(reverse=True)
+        self.assertFalse(timeline.is_sorted)
+        self.assertIsNone(timeline.to_list()[0]['_start'])
+        self.assertTrue(timeline.is_sorted)
+        timeline.timeline.append(SimpleTimelineItem('2019-01-01', None))  # bypasses the sorted state
+        self.assertEqual(timeline.sort()[1].start, datetime.date(2019, 1, 1))
+
+    def test_sorted_filter(self):
+        """ test that filtering a sorted timeline gives the same as filtering an unsorted one """
+        unsorted: Timeline = Timeline()
+        for start in ['2022-11-11', '2020-09-09', None, '2021-05-05', '2020-09-09T10:00:00', '2021-01-01']:
+            unsorted.append(SimpleTimelineItem(start, None))
+        ordered: Timeline = Timeline()
+        ordered.extend(unsorted)
+        ordered.sort()
+        for before, after in [(datetime.date(2021, 1, 1), None), (None, datetime.date(2020, 9, 9)),
+                              (datetime.date(2021, 6, 1), datetime.datetime(2020, 9, 9, 10, 0)), (None, None),
+                              (datetime.date(2019, 1, 1), datetime.date(2023, 1, 1))]:
+            expected = sorted(id(t) for t in unsorted.filter(before=before, after=after))
+            result = sorted(id(t) for t in ordered.filter(before=before, after=after))
+            self.assertEqual(result, expected, f"before={before}, after={after}")
+        result = [t for t in ordered.filter(before=datetime.date(2020, 12, 31))]
+        self.assertEqual(len(result), 3)
+
+    def test_merge_sorted(self):
+        """ Test the sorted-aware extend and the k-way merge with folding of duplicates """
+        timelines: list = list()
+        for offset in range(3):
+            timeline: Timeline = Timeline()
+            for month in range(1, 13, 2):
+                timeline.append(TimelineItem(f'2021-{month + offset % 2:02d}-01', '2021-12-31', offset,
+                                             tags=[f'source{offset}']))
+            timelines.append(timeline)
+        timelines[2].sort(reverse=True)
+        merged: Timeline = Timeline.merge_sorted(*timelines)
+        self.assertTrue(merged.is_sorted)
+        self.assertEqual(len(merged), 18)
+        self.assertEqual([item.start for item in merged], sorted(item.start for t in timelines for item in t))
+        folded: Timeline = Timeline.merge_sorted(*timelines, dedupe=True)
+        self.assertEqual(len(folded), 12)
+        self.assertEqual(folded[0].data, [0, 2])
+        self.assertEqual(folded[0].tags, {'source0', 'source2'})
+        self.assertEqual(timelines[0][0].data, 0)
+        self.assertEqual(folded[1].data, 1)
+        target: Timeline = Timeline()
+        target.extend(timelines[0])
+        view = target.create_view('one', tags='source1')
+        self.assertEqual(len(view), 0)
+        target.extend(timelines[1])
+        self.assertTrue(target.is_sorted)
+        self.assertEqual([item.start for item in target], sorted(item.start for item in target))
+        self.assertEqual([item.data for item in target][:3], [0, 1, 0])
+        self.assertEqual(list(view), list(target.tag_filter('source1')))
+        target.extend(timelines[2])
+        self.assertFalse(target.is_sorted)
+        partitioned: PartitionedTimeline = PartitionedTimeline()
+        partitioned.extend(timelines[1])
+        target = Timeline()
+        target.extend(timelines[0])
+        target.extend(partitioned)  # a source without is_sorted is added at the end
+        self.assertFalse(target.is_sorted)
+        self.assertEqual(len(target), 12)
+
+    def test_instrumentation(self):
+        """ Test the opt-in statistics and hook """
+        timeline: Timeline = Timeline()
+        self.assertIsNone(timeline.stats)
+        events: list = list()
+        stats = timeline.instrument(hook=lambda *event: events.append(event))
+        timeline.append(TimelineItem('2022-11-11', '2022-12-12', 'a', tags='x'))
+        timeline.append(TimelineItem('2020-09-09', '2020-10-10', 'b'))
+        timeline.append(TimelineItem('2021-09-09', '2021-10-10', 'c'))
+        self.assertEqual(len(list(timeline.filter(after='2021-01-01'))), 2)
+        self.assertEqual(len(list(timeline.tag_filter('x'))), 1)
+        self.assertEqual(len(list(timeline.tag_filter('x'))), 1)
+        timeline.sort()
+        self.assertEqual(len(list(timeline.data_filter(lambda item: item.data == 'b'))), 1)
+        self.assertEqual(timeline.query().between(after='2021-01-01').count(), 2)
+        timeline.to_list()
+        snapshot: dict = stats.snapshot()
+        self.assertEqual(snapshot['append']['calls'], 3)
+        self.assertEqual((snapshot['filter']['scanned'], snapshot['filter']['yielded']), (3, 2))
+        self.assertEqual((snapshot['tag_filter']['calls'], snapshot['tag_filter']['scanned']), (2, 4))
+        self.assertEqual(snapshot['data_filter']['selectivity'], 1 / 3)
+        self.assertEqual((snapshot['query']['scanned'], snapshot['query']['yielded']), (2, 2))
+        self.assertEqual(set(snapshot), {'append', 'filter', 'tag_filter', 'sort', 'data_filter', 'query', 'to_list'})
+        self.assertEqual(len(events), sum(entry['calls'] for entry in snapshot.values()))
+        self.assertEqual(events[0][:3], ('append', 1, 1))
+        stats.reset()
+        self.assertEqual(stats.snapshot(), {})
+        timeline.uninstrument()
+        list(timeline.filter())
+        self.assertIsNone(timeline.stats)
+        self.assertEqual(stats.snapshot(), {})
 
 
 if __name__ == '__main__':
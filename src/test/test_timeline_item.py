@@ -1,3 +1,4 @@
+import gc
 import unittest
 from datetime import date
 
@@ -26,15 +27,39 @@ class TestTimelineItem(unittest.TestCase):
         self.assertEqual(self.item.start, date.fromisoformat('2020-01-01'))
         self.assertEqual(self.item.end, date.fromisoformat('2020-12-31'))
         self.assertEqual(self.item.data, self.txt)
-        self.assertTrue(type(self.item.tags) is set)
+        self.assertTrue(type(self.item.tags) is frozenset)
 
-        self.assertTrue(type(self.shares.tags) is set)
+        self.assertTrue(type(self.shares.tags) is frozenset)
         self.assertTrue(self.shares.has_tag('tag'))
         self.assertFalse(self.shares.has_tag('no tag'))
 
-        self.assertTrue(type(self.no_share.tags) is set)
+        self.assertTrue(type(self.no_share.tags) is frozenset)
         self.assertTrue(len(self.no_share.tags) == 0)
 
+    def test_shared_tags(self):
+        """ Test that items with the same tags share one tag set and have no __dict__ """
+        other: TimelineItem = TimelineItem('2021-01-01', '2021-12-31', 'other', ['something else', 'tag'])
+        self.assertIs(other.tags, self.shares.tags)
+        self.assertIs(self.no_share.tags, TimelineItem('2021-01-01', None, None).tags)
+        self.assertFalse(hasattr(self.item, '__dict__'))
+        other.add_tag('new')
+        self.assertFalse(self.shares.has_tag('new'))
+        other = TimelineItem('2021-01-01', None, None, ['only used once'])
+        self.assertIn(frozenset(['only used once']), TimelineItem._tag_sets)
+        del other
+        gc.collect()
+        self.assertNotIn(frozenset(['only used once']), TimelineItem._tag_sets)
+
+    def test_dict_methods(self):
+        """ Test serialisation round trip """
+        d: dict = self.shares.to_dict()
+        self.assertEqual(d['type'], 'TimelineItem')
+        self.assertEqual(d['tags'], {'tag', 'something else'})
+        item: TimelineItem = TimelineItem.from_dict(d)
+        self.assertTrue(item.same(self.shares))
+        self.assertEqual(item.data, self.shares.data)
+        self.assertIs(item.tags, self.shares.tags)
+
     def test_add_tag(self):
         """ Test whether tag can be added """
         self.item.add_tag('new')
@@ -44,6 +69,10 @@ class TestTimelineItem(unittest.TestCase):
         """ Test whether tags are set correctly """
         self.assertTrue(self.item.has_tag(self.tag))
         self.assertFalse(self.item.has_tag('some other tag not suppported'))
+        self.assertTrue(self.shares.has_tag(['tag', 'something else']))
+        self.assertFalse(self.shares.has_tag(['tag', 'missing']))
+        self.assertTrue(self.shares.has_tag(['tag', 'missing'], one_of=True))
+        self.assertFalse(self.shares.has_tag(['missing'], one_of=True))
 
     def test_shares_tag(self):
         """ Test whether shared tags are recognised """
@@ -0,0 +1,72 @@
+import unittest
+from datetime import date, timedelta
+
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+
+
+class TestTimelineView(unittest.TestCase):
+    """ Testing the incrementally maintained views """
+
+    def setUp(self) -> None:
+        self.timeline: Timeline = Timeline()
+        self.timeline.append(TimelineItem('2022-11-11', '2022-12-12', 'Yes', tags=['yes', 'more']))
+        self.timeline.append(TimelineItem('2020-09-09', '2020-10-10', 'No', tags=['no']))
+        self.timeline.append(SimpleTimelineItem('2021-01-01', '2021-02-01'))
+
+    def test_views_follow_appends(self):
+        """ Test that views match the filters after appends and extends without being rebuilt """
+        tagged = self.timeline.create_view('tagged', tags='yes')
+        recent = self.timeline.create_view('recent', after='2021-01-01')
+        items = self.timeline.create_view('items', cls=TimelineItem, func=lambda item: item.data != 'No')
+        self.assertEqual(len(tagged), 1)
+        self.assertEqual(len(recent), 2)
+        self.assertEqual([item.data for item in items], ['Yes'])
+        self.timeline.append(TimelineItem('2023-01-01', '2023-01-02', 'Also', tags=['yes']))
+        other: Timeline = Timeline()
+        other.append(TimelineItem('2019-01-01', '2019-01-02', 'Old', tags=['yes']))
+        other.append(SimpleTimelineItem('2024-01-01', None))
+        self.timeline.extend(other)
+        self.assertFalse(tagged.stale)
+        self.assertEqual(list(tagged), list(self.timeline.tag_filter('yes')))
+        self.assertEqual(list(recent), list(self.timeline.filter(after=date(2021, 1, 1))))
+        self.assertEqual([item.data for item in items], ['Yes', 'Also', 'Old'])
+        self.assertIs(self.timeline.view('tagged'), tagged)
+        self.assertEqual(self.timeline.views, ['tagged', 'recent', 'items'])
+        self.timeline.drop_view('items')
+        self.assertRaises(KeyError, self.timeline.view, 'items')
+
+    def test_invalidation(self):
+        """ Test that add_tag and sorting rebuild the views that cannot follow them """
+        tagged = self.timeline.create_view('tagged', tags='no', one_of=True)
+        dated = self.timeline.create_view('dated', before='2021-06-01')
+        self.assertEqual(len(tagged), 1)
+        self.assertEqual(len(dated), 2)
+        self.timeline.add_tag(0, 'no')
+        self.assertTrue(tagged.stale)
+        self.assertFalse(dated.stale)
+        self.assertEqual(len(tagged), 2)
+        self.timeline.sort()
+        self.assertTrue(dated.stale)
+        self.assertEqual([item.start for item in dated], [date(2020, 9, 9), date(2021, 1, 1)])
+        other = self.timeline.create_view('other', tags='other')
+        self.assertEqual(len(other), 0)
+        TimelineItem('2020-01-01', '2020-01-02', 'Unrelated').add_tag('other')  # not in the timeline
+        self.assertFalse(other.stale)
+        self.timeline[0].add_tag('other')  # directly on an item
+        self.assertTrue(other.stale)
+        self.assertFalse(dated.stale)
+        self.assertEqual(len(other), 1)
+
+    def test_rolling_window(self):
+        """ Test a view on the items starting within 400 days of the latest start """
+        window = self.timeline.create_view('window', within=timedelta(days=400))
+        self.assertEqual([item.start for item in window], [date(2022, 11, 11)])
+        self.timeline.append(SimpleTimelineItem('2022-01-01', '2022-01-02'))
+        self.assertEqual(len(window), 2)
+        self.timeline.append(SimpleTimelineItem('2023-12-01', '2023-12-02'))
+        self.assertEqual([item.start for item in window], [date(2022, 11, 11), date(2023, 12, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
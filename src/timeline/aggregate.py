@@ -0,0 +1,153 @@
+""" Aggregation of timeline items into time buckets with difference arrays """
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Tuple, Union
+
+from timeline.sweep import _stop
+from timeline.timeline_item import SimpleTimelineItem, _TICKS_PER_DAY
+
+FREQUENCIES: Dict[str, timedelta] = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+
+class Buckets:
+    """ consecutive buckets of freq from start, the last one holding end
+
+        The bucket i covers the keys [origin + i * step, origin + (i + 1) * step). The bucket starts are dates
+        when start is a date and freq is whole days, otherwise datetimes.
+    """
+
+    def __init__(self, start: Union[date, datetime, str], end: Union[date, datetime, str],
+                 freq: Union[str, timedelta]):
+        start = SimpleTimelineItem._type_formatter(start)
+        end = SimpleTimelineItem._type_formatter(end)
+        if start is None or end is None:
+            raise ValueError('buckets: start and end must be given')
+        if isinstance(freq, str):
+            if freq not in FREQUENCIES:
+                raise ValueError(f'buckets: freq must be a timedelta or one of {", ".join(FREQUENCIES)}')
+            freq = FREQUENCIES[freq]
+        self.step: int = freq // timedelta(microseconds=1)
+        if self.step <= 0:
+            raise ValueError('buckets: freq must be positive')
+        if not isinstance(start, datetime) and self.step % _TICKS_PER_DAY:
+            start = datetime.combine(start, time())
+        self.origin: int = SimpleTimelineItem.point_key(start)
+        last: int = SimpleTimelineItem.point_key(end)
+        if last < self.origin:
+            raise ValueError('buckets: end is before start')
+        self.count: int = (last - self.origin) // self.step + 1
+        self.limit: int = self.origin + self.count * self.step  # the end of the last bucket (exclusive)
+        self.starts: List[Union[date, datetime]] = [start + i * freq for i in range(self.count)]
+
+    def span(self, start_key: int, end_key: int) -> Union[Tuple[int, int], None]:
+        """ the first and last bucket a closed range of keys touches (as `overlap()`), clipped, or None """
+        if end_key < self.origin or start_key >= self.limit:
+            return None
+        return max(0, (start_key - self.origin) // self.step), min(self.count - 1, (end_key - self.origin) // self.step)
+
+    def index(self, key: int) -> Union[int, None]:
+        """ the bucket holding a key or None """
+        return (key - self.origin) // self.step if self.origin <= key < self.limit else None
+
+    @staticmethod
+    def accumulate(diff: List[int]) -> List[int]:
+        """ the prefix sums of a difference array (without its extra last entry) """
+        result: List[int] = list()
+        total: int = 0
+        for value in diff[:-1]:
+            total += value
+            result.append(total)
+        return result
+
+    # :class Buckets
+
+
+def occupancy(items: Iterable[SimpleTimelineItem], start, end, freq, by_tag: bool = False) \
+        -> Union[List[tuple], Dict[str, List[tuple]]]:
+    """ (bucket start, number of items active in the bucket) for every bucket, or per tag if by_tag
+
+        An item is active in the buckets it overlaps as `overlap()` sees it (so a date end counts the last day)
+        and open ends are clipped to the range. Each item adds +1/-1 to a difference array, so it runs in
+        O(n + buckets) instead of checking every item against every bucket.
+    """
+    buckets: Buckets = Buckets(start, end, freq)
+    diffs: Dict[str, List[int]] = dict()
+    diff: List[int] = [0] * (buckets.count + 1)
+    for item in items:
+        span = buckets.span(item._start_key, item._end_key)
+        if span is None:
+            continue
+        first, last = span
+        if by_tag:
+            for tag in getattr(item, 'tags', ()):
+                diff = diffs.get(tag)
+                if diff is None:
+                    diff = diffs[tag] = [0] * (buckets.count + 1)
+                diff[first] += 1
+                diff[last + 1] -= 1
+        else:
+            diff[first] += 1
+            diff[last + 1] -= 1
+    if by_tag:
+        return {tag: list(zip(buckets.starts, Buckets.accumulate(diffs[tag]))) for tag in sorted(diffs)}
+    return list(zip(buckets.starts, Buckets.accumulate(diff)))
+
+
+def transitions(items: Iterable[SimpleTimelineItem], start, end, freq) -> List[Tuple[object, int, int]]:
+    """ (bucket start, items starting, items ending) for every bucket; indefinite bounds are not counted """
+    buckets: Buckets = Buckets(start, end, freq)
+    started: List[int] = [0] * buckets.count
+    ended: List[int] = [0] * buckets.count
+    for item in items:
+        if item._start is not None:
+            position: Union[int, None] = buckets.index(item._start_key)
+            if position is not None:
+                started[position] += 1
+        if item._end is not None:
+            position = buckets.index(item._end_key)
+            if position is not None:
+                ended[position] += 1
+    return list(zip(buckets.starts, started, ended))
+
+
+def covered_duration(items: Iterable[SimpleTimelineItem], start, end, freq, instant: timedelta = timedelta(0)) \
+        -> List[Tuple[object, timedelta]]:
+    """ (bucket start, total time the items cover in the bucket) for every bucket
+
+        An item covers the time from its start to its end measured as in `Timeline.coverage`: a date covers its
+        whole day, so a date event covers its day like `occupancy` counts it there. An instant (a datetime event)
+        has no duration and covers `instant` from its point, e.g. the resolution of the data to count it where
+        `occupancy` does. The time is clipped to the range and the items are added up, so two overlapping items
+        count twice. O(n + buckets): whole buckets are counted in a difference array, the partial first and last
+        bucket of an item directly.
+    """
+    buckets: Buckets = Buckets(start, end, freq)
+    step, origin = buckets.step, buckets.origin
+    extra: int = instant // timedelta(microseconds=1)
+    whole: List[int] = [0] * (buckets.count + 1)
+    partial: List[int] = [0] * buckets.count
+    for item in items:
+        stop: int = _stop(item._end, item._end_key)
+        if stop == item._start_key:
+            stop += extra
+        start_key: int = max(item._start_key, origin)
+        end_key: int = min(stop, buckets.limit)
+        if end_key <= start_key:
+            continue
+        first: int = (start_key - origin) // step
+        last: int = (end_key - 1 - origin) // step
+        if first == last:
+            partial[first] += end_key - start_key
+            continue
+        partial[first] += origin + (first + 1) * step - start_key
+        partial[last] += end_key - (origin + last * step)
+        whole[first + 1] += 1
+        whole[last] -= 1
+    return [(bucket, timedelta(microseconds=count * step + extra))
+            for bucket, count, extra in zip(buckets.starts, Buckets.accumulate(whole), partial)]
+
+
+# EOF
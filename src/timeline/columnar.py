@@ -0,0 +1,525 @@
+""" The ColumnarTimeline class - a timeline stored as NumPy columns """
+import importlib
+import pickle
+from datetime import date, datetime, timedelta
+from typing import Union, Callable, Iterable, Dict, List
+
+from timeline.aggregate import Buckets
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, MIN_KEY, MAX_KEY, DATETIME_KIND
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional: only needed for the columnar storage
+    np = None
+
+_TICKS_PER_DAY: int = 86400 * 1000000
+_EPOCH_KEY: int = date(1970, 1, 1).toordinal() * _TICKS_PER_DAY  # the key of the datetime64 epoch
+_PICKLED: bytes = b'timeline.data'  # Arrow schema metadata: the data column holds pickled payloads
+
+
+def _optional(module: str, caller: str):
+    """ import an optional dependency, telling which method needs it when it is missing """
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f'{caller}: {module} is required') from None
+
+
+def _objects(values, count: int):  # -> np.ndarray
+    """ a 1-d object array of the values (never broadcasting values that are sequences themselves) """
+    result = np.empty(count, dtype=object)
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        result[:] = values
+    else:
+        for position, value in enumerate(values):
+            result[position] = value
+    return result
+
+
+class ColumnarTimeline:
+    """ Timeline storing the items as columns for vectorised queries
+
+        Starts and ends are int64 keys (see `SimpleTimelineItem.point_key`) with MIN_KEY/MAX_KEY for None,
+        a kind column remembers date/datetime, classes and tag sets are integer codes into small tables, and
+        the payloads sit in an object array. Filtering, masks, sorting and lengths are NumPy operations while
+        items are re-created as `SimpleTimelineItem`/`TimelineItem` objects on demand.
+
+        Only start, end, data and tags are stored: other attributes of subclasses are not kept.
+        Appended items are buffered and turned into columns by the next query.
+    """
+
+    def __init__(self, items: Iterable[SimpleTimelineItem] = ()):
+        if np is None:
+            raise ImportError('ColumnarTimeline: numpy is required for the columnar storage')
+        self._starts = np.empty(0, dtype=np.int64)
+        self._ends = np.empty(0, dtype=np.int64)
+        self._kinds = np.empty(0, dtype=np.uint8)  # point_kind of start | point_kind of end << 4
+        self._classes = np.empty(0, dtype=np.int32)
+        self._tag_sets = np.empty(0, dtype=np.int32)
+        self._data = np.empty(0, dtype=object)
+        self._class_table: List[type] = list()
+        self._class_codes: Dict[type, int] = dict()
+        self._tag_set_table: List[frozenset] = [frozenset()]
+        self._tag_set_codes: Dict[frozenset, int] = {frozenset(): 0}
+        self._pending: List[SimpleTimelineItem] = list()
+        self._sorted: bool = True
+        self.extend(items)
+
+    @staticmethod
+    def from_timeline(timeline: Timeline):  # -> ColumnarTimeline
+        """ create columns from the items of a timeline """
+        return ColumnarTimeline(timeline.timeline)
+
+    def to_timeline(self) -> Timeline:
+        """ create a timeline with all the items """
+        return Timeline._bulk_timeline(list(self))
+
+    def _points(self, keys, none_key: int):  # -> np.ndarray
+        """ datetime64[us] of keys (NaT for none_key): one vectorised pass """
+        result = (keys - _EPOCH_KEY).view('datetime64[us]')
+        result[keys == none_key] = np.datetime64('NaT')
+        return result
+
+    def _tag_set_objects(self):  # -> np.ndarray
+        """ the tag set table as an object array of frozensets """
+        return _objects(self._tag_set_table, len(self._tag_set_table))
+
+    def to_numpy(self) -> Dict[str, object]:
+        """ the columns as arrays: 'start' and 'end' (datetime64[us], NaT for None, aware datetimes in UTC),
+            'kind' (uint8 `point_kind` of start | of end << 4, to restore dates), 'data' (object) and 'tags'
+            (object array of frozensets)
+        """
+        self._consolidate()
+        return {'start': self._points(self._starts, MIN_KEY), 'end': self._points(self._ends, MAX_KEY),
+                'kind': self._kinds.copy(), 'data': self._data.copy(), 'tags': self._tag_set_objects()[self._tag_sets]}
+
+    def _load(self, caller: str, starts, ends, kinds=None, data=None, tags=None, tag_codes=None, tag_sets=None):
+        """ set the columns from arrays of points, leaving out the item objects
+
+            The items are TimelineItems when data or tags are given, otherwise SimpleTimelineItems. Tags are
+            either one iterable (or str) per item, or codes (-1 for none) into tag_sets.
+        """
+        starts = np.asarray(starts, dtype='datetime64[us]')
+        ends = np.asarray(ends, dtype='datetime64[us]')
+        count: int = len(starts)
+        if len(ends) != count or any(column is not None and len(column) != count
+                                     for column in (kinds, data, tags, tag_codes)):
+            raise ValueError(f'{caller}: columns must have the same length')
+        start_keys = starts.view(np.int64) + _EPOCH_KEY
+        start_keys[np.isnat(starts)] = MIN_KEY
+        end_keys = ends.view(np.int64) + _EPOCH_KEY
+        end_keys[np.isnat(ends)] = MAX_KEY
+        wrong = np.flatnonzero(start_keys > end_keys)
+        if len(wrong):
+            raise ValueError(f'{caller}: item {wrong[0]} ends before it starts')
+        if kinds is None:  # datetimes wherever there is a point
+            kinds = (start_keys != MIN_KEY) * DATETIME_KIND | (end_keys != MAX_KEY) * (DATETIME_KIND << 4)
+        is_item: bool = data is not None or tags is not None or tag_codes is not None
+        if tag_codes is not None:
+            table = np.array([self._tag_set_code(tag_set or ()) for tag_set in tag_sets] + [0], dtype=np.int32)
+            self._tag_sets = table[np.asarray(tag_codes, dtype=np.int64)]  # code -1 picks the empty set
+        elif tags is not None:
+            self._tag_sets = np.fromiter((self._tag_set_code((tag,) if type(tag) is str else tag or ())
+                                          for tag in tags), dtype=np.int32, count=count)
+        else:
+            self._tag_sets = np.zeros(count, dtype=np.int32)
+        self._starts = start_keys
+        self._ends = end_keys
+        self._kinds = np.asarray(kinds, dtype=np.uint8)
+        self._classes = np.full(count, self._class_code(TimelineItem if is_item else SimpleTimelineItem),
+                                dtype=np.int32)
+        self._data = np.empty(count, dtype=object) if data is None else _objects(data, count)
+        self._sorted = count < 2 or bool(np.all(start_keys[1:] >= start_keys[:-1]))
+
+    @staticmethod
+    def from_numpy(columns: Dict[str, object]):  # -> ColumnarTimeline
+        """ create from arrays as written by `to_numpy`: 'start' and 'end' (datetime64, NaT for None) and
+            optionally 'kind', 'data' and 'tags' (without 'kind' every point is a datetime)
+        """
+        result: ColumnarTimeline = ColumnarTimeline()
+        result._load('from_numpy', columns['start'], columns['end'], columns.get('kind'), columns.get('data'),
+                     columns.get('tags'))
+        return result
+
+    def to_pandas(self):  # -> pandas.DataFrame
+        """ a DataFrame with the columns of `to_numpy`, the tags as a categorical of frozensets (needs pandas) """
+        pd = _optional('pandas', 'to_pandas')
+        columns: Dict[str, object] = self.to_numpy()
+        columns['tags'] = pd.Categorical.from_codes(self._tag_sets,
+                                                    categories=pd.Index(self._tag_set_objects(), dtype=object))
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def from_pandas(frame):  # -> ColumnarTimeline
+        """ create from a DataFrame with the columns of `to_pandas` (aware start and end are taken in UTC) """
+        pd = _optional('pandas', 'from_pandas')
+
+        def points(column):
+            if getattr(column.dtype, 'tz', None) is not None:
+                column = column.dt.tz_convert('UTC').dt.tz_localize(None)
+            return column.to_numpy(dtype='datetime64[us]')
+        result: ColumnarTimeline = ColumnarTimeline()
+        kinds = frame['kind'].to_numpy() if 'kind' in frame else None
+        data = frame['data'].to_numpy(dtype=object) if 'data' in frame else None
+        tags = frame['tags'] if 'tags' in frame else None
+        if tags is not None and isinstance(tags.dtype, pd.CategoricalDtype):
+            result._load('from_pandas', points(frame['start']), points(frame['end']), kinds, data,
+                         tag_codes=tags.cat.codes.to_numpy(), tag_sets=list(tags.cat.categories))
+        else:
+            result._load('from_pandas', points(frame['start']), points(frame['end']), kinds, data,
+                         None if tags is None else tags.to_numpy(dtype=object))
+        return result
+
+    def to_arrow(self):  # -> pyarrow.Table
+        """ an Arrow table with the columns of `to_numpy` (needs pyarrow)
+
+            The tags become a dictionary column of string lists. The data column gets the Arrow type pyarrow
+            infers for the payloads; payloads that have none are pickled into a binary column (read back with
+            `from_arrow(table, allow_pickle=True)`). Dict payloads become a struct column with a field for every
+            key of any of them, so a dict comes back with the keys it did not have set to None.
+        """
+        pa = _optional('pyarrow', 'to_arrow')
+        self._consolidate()
+        tags = pa.DictionaryArray.from_arrays(pa.array(self._tag_sets, type=pa.int32()),
+                                              pa.array([sorted(tag_set) for tag_set in self._tag_set_table],
+                                                       type=pa.list_(pa.string())))
+        metadata: Union[dict, None] = None
+        try:
+            data = pa.array(self._data, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            data = pa.array([pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL) for payload in self._data],
+                            type=pa.binary())
+            metadata = {_PICKLED: b'pickle'}
+        return pa.table({
+            'start': pa.array(self._starts - _EPOCH_KEY, type=pa.int64(), mask=self._starts == MIN_KEY)
+                       .cast(pa.timestamp('us')),
+            'end': pa.array(self._ends - _EPOCH_KEY, type=pa.int64(), mask=self._ends == MAX_KEY)
+                     .cast(pa.timestamp('us')),
+            'kind': pa.array(self._kinds, type=pa.uint8()),
+            'data': data,
+            'tags': tags,
+        }, metadata=metadata)
+
+    @staticmethod
+    def from_arrow(table, allow_pickle: bool = False):  # -> ColumnarTimeline
+        """ create from an Arrow table with the columns of `to_arrow`
+
+            A data column of pickled payloads is only read with allow_pickle, as unpickling runs code named in
+            the table: only allow it for trusted tables. Otherwise such a table raises ValueError.
+        """
+        pa = _optional('pyarrow', 'from_arrow')
+        names = table.column_names
+
+        def points(name: str):
+            column = table.column(name)
+            if pa.types.is_timestamp(column.type) and column.type.tz is not None:
+                column = column.cast(pa.timestamp(column.type.unit))  # the UTC wall time
+            return column.to_numpy()
+        result: ColumnarTimeline = ColumnarTimeline()
+        kinds = table.column('kind').to_numpy() if 'kind' in names else None
+        data = None
+        if 'data' in names:
+            data = table.column('data').to_pylist()
+            if (table.schema.metadata or {}).get(_PICKLED) == b'pickle':
+                if not allow_pickle:
+                    raise ValueError('from_arrow: the data are pickled, pass allow_pickle=True for a trusted table')
+                data = [None if payload is None else pickle.loads(payload) for payload in data]
+        if 'tags' in names and pa.types.is_dictionary(table.column('tags').type):
+            tag_sets: list = list()
+            codes: list = list()
+            for chunk in table.column('tags').chunks:  # every chunk may have its own dictionary
+                codes.append(chunk.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64) +
+                             np.where(chunk.indices.is_null().to_numpy(zero_copy_only=False), 0, len(tag_sets)))
+                tag_sets.extend(chunk.dictionary.to_pylist())
+            result._load('from_arrow', points('start'), points('end'), kinds, data,
+                         tag_codes=np.concatenate(codes) if codes else np.empty(0, dtype=np.int64),
+                         tag_sets=tag_sets)
+        else:
+            result._load('from_arrow', points('start'), points('end'), kinds, data,
+                         table.column('tags').to_pylist() if 'tags' in names else None)
+        return result
+
+    def __len__(self) -> int:
+        """ get the length of the timeline """
+        return len(self._starts) + len(self._pending)
+
+    def __getitem__(self, index: int) -> SimpleTimelineItem:
+        """ get an item from index """
+        self._consolidate()
+        return self._item(range(len(self._starts))[index])
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ iterate over the items """
+        self._consolidate()
+        return self._items(range(len(self._starts)))
+
+    @property
+    def timeline(self) -> [SimpleTimelineItem]:
+        """ all the items as a list of objects """
+        return list(self)
+
+    @property
+    def starts(self):  # -> np.ndarray
+        """ int64 start keys (MIN_KEY for None) """
+        self._consolidate()
+        return self._starts
+
+    @property
+    def ends(self):  # -> np.ndarray
+        """ int64 end keys (MAX_KEY for None) """
+        self._consolidate()
+        return self._ends
+
+    def append(self, stl: SimpleTimelineItem):
+        """ Append timeline item """
+        self._pending.append(stl)
+
+    def extend(self, ti):  # ti: Timeline, ColumnarTimeline or iterable of items
+        """ extend the timeline with timeline ti """
+        if isinstance(ti, ColumnarTimeline):
+            ti = iter(ti)
+        elif isinstance(ti, Timeline):
+            ti = ti.timeline
+        self._pending.extend(ti)
+
+    def _class_code(self, cls: type) -> int:
+        code: Union[int, None] = self._class_codes.get(cls)
+        if code is None:
+            code = self._class_codes[cls] = len(self._class_table)
+            self._class_table.append(cls)
+        return code
+
+    def _tag_set_code(self, tags) -> int:
+        tags = frozenset(tags)
+        code: Union[int, None] = self._tag_set_codes.get(tags)
+        if code is None:
+            code = self._tag_set_codes[tags] = len(self._tag_set_table)
+            self._tag_set_table.append(tags)
+        return code
+
+    def _consolidate(self):
+        """ turn the buffered items into columns """
+        if not self._pending:
+            return
+        pending: List[SimpleTimelineItem] = self._pending
+        self._pending = list()
+        count: int = len(pending)
+        starts = np.fromiter((item._start_key for item in pending),
+                             dtype=np.int64, count=count)
+        ends = np.fromiter((item._end_key for item in pending),
+                           dtype=np.int64, count=count)
+        kinds = np.fromiter((SimpleTimelineItem.point_kind(item.start) | SimpleTimelineItem.point_kind(item.end) << 4
+                             for item in pending), dtype=np.uint8, count=count)
+        classes = np.fromiter((self._class_code(type(item)) for item in pending), dtype=np.int32, count=count)
+        tag_sets = np.fromiter((self._tag_set_code(getattr(item, 'tags', ())) for item in pending),
+                               dtype=np.int32, count=count)
+        data = np.empty(count, dtype=object)
+        data[:] = [getattr(item, 'data', None) for item in pending]
+        if self._sorted and count:
+            self._sorted = bool(np.all(starts[1:] >= starts[:-1])) and \
+                           (len(self._starts) == 0 or starts[0] >= self._starts[-1])
+        self._starts = np.concatenate((self._starts, starts))
+        self._ends = np.concatenate((self._ends, ends))
+        self._kinds = np.concatenate((self._kinds, kinds))
+        self._classes = np.concatenate((self._classes, classes))
+        self._tag_sets = np.concatenate((self._tag_sets, tag_sets))
+        self._data = np.concatenate((self._data, data))
+
+    def _item(self, position: int) -> SimpleTimelineItem:
+        """ re-create the item at a position """
+        cls: type = self._class_table[self._classes[position]]
+        kind: int = int(self._kinds[position])
+        start: int = int(self._starts[position])
+        end: int = int(self._ends[position])
+        start_point = None if start == MIN_KEY else SimpleTimelineItem.key_point(start, kind & 0x0f)
+        end_point = None if end == MAX_KEY else SimpleTimelineItem.key_point(end, kind >> 4)
+        if not issubclass(cls, TimelineItem):
+            return cls._build(start_point, end_point, start, end)
+        return cls._build(start_point, end_point, self._data[position],
+                          TimelineItem.intern_tags(self._tag_set_table[self._tag_sets[position]]), start, end)
+
+    def _items(self, positions) -> Iterable[SimpleTimelineItem]:
+        for position in positions:
+            yield self._item(int(position))
+
+    def to_list(self) -> list:
+        """ convert the timeline to a list """
+        self.sort()
+        return [item.to_dict() for item in self]
+
+    def sort(self, reverse: bool = False):  # -> ColumnarTimeline
+        """ sort the timeline on start by a stable argsort """
+        self._consolidate()
+        if self._sorted and not reverse:
+            return self
+        order = np.argsort(self._starts, kind='stable')
+        if reverse:  # stable descending order: keep equal starts in their original order
+            order = order[np.argsort(-self._starts[order], kind='stable')]
+        self.take(order)
+        self._sorted = not reverse or len(order) < 2
+        return self
+
+    def take(self, positions):  # -> ColumnarTimeline
+        """ keep (and reorder to) the given positions """
+        self._consolidate()
+        self._starts = self._starts[positions]
+        self._ends = self._ends[positions]
+        self._kinds = self._kinds[positions]
+        self._classes = self._classes[positions]
+        self._tag_sets = self._tag_sets[positions]
+        self._data = self._data[positions]
+        self._sorted = len(self._starts) < 2 or bool(np.all(self._starts[1:] >= self._starts[:-1]))
+        return self
+
+    def select(self, mask) -> Iterable[SimpleTimelineItem]:
+        """ items for a boolean mask (or array of positions) returning data as an iterable """
+        self._consolidate()
+        positions = np.flatnonzero(mask) if getattr(mask, 'dtype', None) == np.bool_ else mask
+        return self._items(positions)
+
+    @staticmethod
+    def _key(point: Union[date, datetime, str]) -> int:
+        return SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(point))
+
+    def filter_mask(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None):
+        """ mask of the items starting at or before `before` and at or after `after` (as `Timeline.filter`) """
+        self._consolidate()
+        mask = np.ones(len(self._starts), dtype=bool)
+        if before is not None:
+            mask &= self._starts <= ColumnarTimeline._key(before)
+        if after is not None:
+            mask &= self._starts >= ColumnarTimeline._key(after)
+        return mask
+
+    def filter(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None) \
+            -> Iterable[TimelineItem]:
+        """ Filter timeline based on date/datetime returning data as an iterable """
+        self._consolidate()
+        if not self._sorted:
+            return self.select(self.filter_mask(before=before, after=after))
+        lo: int = 0 if after is None else int(np.searchsorted(self._starts, ColumnarTimeline._key(after), 'left'))
+        hi: int = len(self._starts) if before is None else \
+            int(np.searchsorted(self._starts, ColumnarTimeline._key(before), 'right'))
+        return self._items(range(lo, max(lo, hi)))
+
+    def _comparator(self, point: Union[date, datetime], kinds):
+        """ key of point per item the way `before`/`after` compare a date with a datetime """
+        if type(point) is datetime:
+            return np.where(kinds & DATETIME_KIND, SimpleTimelineItem.point_key(point),
+                            SimpleTimelineItem.point_key(point.date()))
+        if type(point) is date:
+            return SimpleTimelineItem.point_key(point)
+        raise ValueError('argument must be date or datetime')
+
+    def before_mask(self, point: Union[date, datetime]):
+        """ mask of `item.before(point)` for all items """
+        self._consolidate()
+        return self._starts < self._comparator(point, self._kinds & 0x0f)
+
+    def after_mask(self, point: Union[date, datetime]):
+        """ mask of `item.after(point)` for all items """
+        self._consolidate()
+        return self._ends > self._comparator(point, self._kinds >> 4)
+
+    def overlap_mask(self, item_or_range):
+        """ mask of the items overlapping an item or a (start, end) range """
+        self._consolidate()
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return (self._starts <= end) & (self._ends >= start)
+
+    def contained_mask(self, item_or_range):
+        """ mask of the items contained in an item or a (start, end) range """
+        self._consolidate()
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return (self._starts >= start) & (self._ends <= end)
+
+    def overlapping(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range returning data as an iterable """
+        return self.select(self.overlap_mask(item_or_range))
+
+    def active_at(self, point: Union[date, datetime, str]) -> Iterable[SimpleTimelineItem]:
+        """ items active at a point in time returning data as an iterable """
+        start, end = IntervalIndex.point_keys(point)
+        return self.select((self.starts <= end) & (self._ends >= start))
+
+    def contained_in(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items contained in an item or a (start, end) range returning data as an iterable """
+        return self.select(self.contained_mask(item_or_range))
+
+    def tag_mask(self, tags: Union[str, list, None], one_of: bool = False):
+        """ mask of the items having (all or one of) the tags, all of no tags is every item as in `Timeline` """
+        self._consolidate()
+        if isinstance(tags, str):
+            tags = [tags]
+        tags = tags or []
+        if one_of:
+            table = [not tag_set.isdisjoint(tags) for tag_set in self._tag_set_table]
+        else:
+            table = [tag_set.issuperset(tags) for tag_set in self._tag_set_table]
+        return np.array(table, dtype=bool)[self._tag_sets]
+
+    def tag_filter(self, tags: Union[str, list, None], one_of: bool = False) -> Iterable[TimelineItem]:
+        """ filter on the presence of tags returning data as an iterable """
+        return self.select(self.tag_mask(tags, one_of=one_of))
+
+    def class_mask(self, cls):
+        """ mask of the items being instances of cls """
+        self._consolidate()
+        codes = [code for code, table_cls in enumerate(self._class_table) if issubclass(table_cls, cls)]
+        return np.isin(self._classes, codes)
+
+    def class_filter(self, cls) -> Iterable[TimelineItem]:
+        """ filter the timeline on the basis of the class returning data as an iterable """
+        return self.select(self.class_mask(cls))
+
+    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]]) -> Iterable[TimelineItem]:
+        """ Filter on data by means of function returning data as an iterable (runs per item) """
+        for item in self:
+            if func(item):
+                yield item
+
+    def lengths(self):  # -> np.ndarray
+        """ `len()` of all items as int64 days (-1 where start or end is None) """
+        self._consolidate()
+        determinate = (self._starts != MIN_KEY) & (self._ends != MAX_KEY)
+        return np.where(determinate, self._ends // _TICKS_PER_DAY - self._starts // _TICKS_PER_DAY, -1)
+
+    def timedeltas(self):  # -> np.ndarray
+        """ `timedelta()` of all items as timedelta64[D] (NaT where start or end is None) """
+        lengths = self.lengths()
+        result = lengths.astype('timedelta64[D]')
+        result[lengths < 0] = np.timedelta64('NaT')
+        return result
+
+    def _occupancy_counts(self, buckets: Buckets, mask=None):  # -> np.ndarray
+        """ active items per bucket from a difference array built with bincount """
+        starts, ends = self._starts, self._ends
+        touching = (ends >= buckets.origin) & (starts < buckets.limit)
+        if mask is not None:
+            touching &= mask
+        first = (np.maximum(starts[touching], buckets.origin) - buckets.origin) // buckets.step
+        last = (np.minimum(ends[touching], buckets.limit - 1) - buckets.origin) // buckets.step
+        diff = np.bincount(first, minlength=buckets.count + 1) - np.bincount(last + 1, minlength=buckets.count + 1)
+        return np.cumsum(diff[:buckets.count])
+
+    def occupancy(self, start: Union[date, datetime, str], end: Union[date, datetime, str],
+                  freq: Union[str, timedelta], by_tag: bool = False) -> Union[list, dict]:
+        """ (bucket start, number of active items) per bucket as `Timeline.occupancy`, vectorised """
+        self._consolidate()
+        buckets: Buckets = Buckets(start, end, freq)
+        if not by_tag:
+            return list(zip(buckets.starts, self._occupancy_counts(buckets).tolist()))
+        tags: set = set().union(*self._tag_set_table)
+        result: dict = dict()
+        for tag in sorted(tags):
+            counts = self._occupancy_counts(buckets, self.tag_mask(tag))
+            if counts.any():
+                result[tag] = list(zip(buckets.starts, counts.tolist()))
+        return result
+
+    # :class ColumnarTimeline
+
+
+# EOF
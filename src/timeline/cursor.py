@@ -0,0 +1,145 @@
+""" The Cursor class - paging through a timeline from a point in time """
+from datetime import date, datetime
+from heapq import nsmallest
+from operator import attrgetter
+from typing import Union, Iterable, List, Tuple
+
+from timeline.timeline_item import SimpleTimelineItem
+
+
+def bisect_key(items: List[SimpleTimelineItem], key: int, attribute: str = '_start_key', right: bool = False) -> int:
+    """ position of a key in items sorted on a key attribute (as bisect_left, or bisect_right if right) """
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid: int = (lo + hi) // 2
+        mid_key: int = getattr(items[mid], attribute)
+        if mid_key < key or (right and mid_key == key):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def point_keys(point: Union[date, datetime, str]) -> Tuple[int, int]:
+    """ the keys a point compares with a date and with a datetime in `before()`/`after()` """
+    point = SimpleTimelineItem._type_formatter(point)
+    if point is None:
+        raise ValueError('cursor: point in time cannot be None')
+    if isinstance(point, datetime):
+        return SimpleTimelineItem.point_key(point.date()), SimpleTimelineItem.point_key(point)
+    key: int = SimpleTimelineItem.point_key(point)
+    return key, key
+
+
+class Cursor:
+    """ A position in a timeline in order of start for paging forwards (`next`) and backwards (`prev`)
+
+        `Timeline.seek(t)` places the cursor between the items that start before t (`before(t)` is True) and
+        the items that do not, with the comparison of `before()`: an item starting on the date of a datetime t
+        is not before t. Each page costs O(k) after the O(log n) seek. The cursor reads the list of items of
+        the timeline, not a copy: items appended in order of start show up in later pages, but reordering the
+        timeline (a `sort`, or adding items out of order and then paging or seeking again) moves the items under
+        the cursor, so seek again after such changes.
+    """
+
+    def __init__(self, items: List[SimpleTimelineItem], point: Union[date, datetime, str, None] = None):
+        self._items: List[SimpleTimelineItem] = items
+        self._lo: int = 0
+        self._region: List[SimpleTimelineItem] = list()
+        self._position: int = 0
+        if point is None:
+            return
+        day, exact = point_keys(point)
+        self._lo = bisect_key(items, day)
+        hi: int = bisect_key(items, exact)
+        # on the day of a datetime t: the items starting on a datetime before t come before the cursor,
+        # the items starting on the date itself after it
+        region: List[SimpleTimelineItem] = items[self._lo:hi]
+        before: List[SimpleTimelineItem] = [item for item in region if isinstance(item.start, datetime)]
+        self._region = before + [item for item in region if not isinstance(item.start, datetime)]
+        self._position = self._lo + len(before)
+
+    def _slice(self, first: int, last: int) -> List[SimpleTimelineItem]:
+        """ the items at the positions first to last (exclusive) of the cursor order """
+        lo: int = self._lo
+        hi: int = lo + len(self._region)
+        if last <= lo or first >= hi:
+            return self._items[first:last]
+        return self._items[first:lo] + self._region[max(first, lo) - lo:min(last, hi) - lo] + self._items[hi:last]
+
+    @property
+    def position(self) -> int:
+        """ the number of items before the cursor """
+        return self._position
+
+    def next(self, n: int = 1) -> List[SimpleTimelineItem]:
+        """ the next n items (fewer at the end) in order of start, moving the cursor past them """
+        found: List[SimpleTimelineItem] = self._slice(self._position, min(len(self._items), self._position + n))
+        self._position += len(found)
+        return found
+
+    def prev(self, n: int = 1) -> List[SimpleTimelineItem]:
+        """ the n items before the cursor (fewer at the start) in order of start, moving the cursor before them """
+        first: int = max(0, self._position - n)
+        found: List[SimpleTimelineItem] = self._slice(first, self._position)
+        self._position = first
+        return found
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ page forwards one item at a time """
+        while self._position < len(self._items):
+            yield from self.next()
+
+    # :class Cursor
+
+
+def nearest(by_start: List[SimpleTimelineItem], by_end: List[SimpleTimelineItem],
+            point: Union[date, datetime, str], k: int) -> List[SimpleTimelineItem]:
+    """ the k items closest to a point: first the items active at it, then by distance to their start or end
+
+        by_start and by_end hold the same items sorted on start and on end key. Dates compare as in `before()`
+        and `after()`: a date bound on the day of a datetime point counts as at the point. When more than k
+        items are active at the point, the k with the earliest start are taken, then the earliest end, then the
+        first added (both lists are sorted stably). The items starting after the point and those ending before
+        it are walked from the point outwards, so apart from finding the items active at the point (among the
+        smaller of the two sides) it costs O(log n + k).
+    """
+    if k <= 0:
+        return list()
+    day, exact = point_keys(point)
+    after: int = bisect_key(by_start, exact, right=True)  # by_start[after:] start after the point
+    ended: int = bisect_key(by_end, day, '_end_key')  # by_end[:ended] end before the day of the point
+    ending: List[SimpleTimelineItem] = list()  # on the day, before the point: only datetime ends have ended
+    for item in by_end[ended:bisect_key(by_end, exact, '_end_key')]:
+        if isinstance(item.end, datetime):
+            ending.append(item)
+
+    def is_active(item: SimpleTimelineItem) -> bool:
+        return item._start_key <= exact and item._end_key >= day and \
+            (item._end_key >= exact or not isinstance(item.end, datetime))
+
+    # the items active at the point from whichever side has fewer candidates, the same k from either side
+    candidates: List[SimpleTimelineItem] = by_start[:after] if after <= len(by_end) - ended else by_end[ended:]
+    found: List[SimpleTimelineItem] = nsmallest(k, filter(is_active, candidates),
+                                                key=attrgetter('_start_key', '_end_key'))
+    # the items after the point ascending and those before descending, merged on their distance
+    i: int = after
+    before: List[SimpleTimelineItem] = ending[::-1]
+    j: int = 0
+    back: int = ended - 1
+    while len(found) < k:
+        if j >= len(before) and back >= 0:
+            before.append(by_end[back])
+            back -= 1
+        if i < len(by_start) and (j >= len(before) or by_start[i]._start_key - exact <= exact - before[j]._end_key):
+            found.append(by_start[i])
+            i += 1
+        elif j < len(before):
+            found.append(before[j])
+            j += 1
+        else:
+            break
+    return found
+
+
+# EOF
@@ -0,0 +1,96 @@
+""" Asynchronous ingestion of items into a Timeline in batches """
+import asyncio
+from typing import Union, Iterable
+
+from timeline.timeline_item import SimpleTimelineItem
+
+_CLOSE = object()  # queued by close to stop the worker
+
+
+class AsyncIngestor:
+    """ Handle for feeding a timeline from coroutines through a bounded buffer
+
+        `await put(value)` queues an item or a dict as written by `to_dict`, waiting while max_pending values are
+        queued (backpressure). A worker task takes whatever is queued, up to batch_size values, and commits it
+        with one `Timeline.extend`, so the sorted state and the indices are updated once per batch. A commit
+        runs without awaiting, so other coroutines see the timeline either before or after a whole batch.
+
+        `await flush()` waits until everything queued is committed, `await close()` (or leaving `async with`)
+        also stops the worker. A batch that fails to parse is not committed and the error is raised by the next
+        put, flush or close.
+    """
+
+    def __init__(self, timeline, batch_size: int = 1000, max_pending: int = 10000):
+        if batch_size < 1:
+            raise ValueError('AsyncIngestor: batch_size must be positive')
+        self._timeline = timeline  # Timeline
+        self._batch_size: int = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._error: Union[BaseException, None] = None
+        self._closed: bool = False
+        self._worker: asyncio.Task = asyncio.ensure_future(self._run())
+        self.committed: int = 0  # number of values committed
+        self.batches: int = 0  # number of commits
+
+    async def _run(self):
+        queue: asyncio.Queue = self._queue
+        while True:
+            values: list = [await queue.get()]
+            while len(values) < self._batch_size and not queue.empty():
+                values.append(queue.get_nowait())
+            stop: bool = values[-1] is _CLOSE
+            batch: list = values[:-1] if stop else values
+            try:
+                if batch:
+                    self._timeline._commit(batch)
+                    self.committed += len(batch)
+                    self.batches += 1
+            except Exception as error:  # the batch is dropped, the first error is kept for the producer
+                if self._error is None:  # without the frame of the worker, which must not be cleared
+                    self._error = error.with_traceback(error.__traceback__.tb_next)
+            finally:
+                for _ in values:
+                    queue.task_done()
+            if stop:
+                return
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def put(self, value: Union[SimpleTimelineItem, dict]):
+        """ queue an item or a record, waiting while the buffer is full """
+        self._check()
+        if self._closed:
+            raise RuntimeError('AsyncIngestor: put after close')
+        await self._queue.put(value)
+
+    async def put_many(self, values: Iterable[Union[SimpleTimelineItem, dict]]):
+        """ queue items or records one by one """
+        for value in values:
+            await self.put(value)
+
+    async def flush(self):
+        """ wait until everything queued so far is committed """
+        await self._queue.join()
+        self._check()
+
+    async def close(self):
+        """ commit what is queued and stop the worker """
+        if not self._closed:
+            self._closed = True
+            await self._queue.put(_CLOSE)
+            await self._worker
+        self._check()
+
+    async def __aenter__(self):  # -> AsyncIngestor
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    # :class AsyncIngestor
+
+
+# EOF
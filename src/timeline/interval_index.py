@@ -0,0 +1,184 @@
+""" The IntervalIndex class """
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from heapq import merge
+from operator import attrgetter
+from typing import Union, Iterable, List, Tuple
+
+from timeline.timeline_item import SimpleTimelineItem, MIN_KEY, MAX_KEY
+
+
+class _Run:
+    """ items sorted on the start key with two implicit segment trees over the end keys (the maximum and the
+        minimum of every node), so a query only descends into the parts that can match
+    """
+
+    __slots__ = ('items', 'starts', 'size', 'max_end', 'min_end')
+
+    def __init__(self, items: List[SimpleTimelineItem]):
+        """ build the trees over items sorted on start """
+        self.items: List[SimpleTimelineItem] = items
+        self.starts: List[int] = [item._start_key for item in items]
+        size: int = 1
+        while size < len(items):
+            size <<= 1
+        max_end: List[int] = [MIN_KEY - 1] * (2 * size)
+        min_end: List[int] = [MAX_KEY + 1] * (2 * size)
+        ends: List[int] = [item._end_key for item in items]
+        max_end[size:size + len(items)] = ends
+        min_end[size:size + len(items)] = ends
+        for node in range(size - 1, 0, -1):
+            left, right = max_end[2 * node], max_end[2 * node + 1]
+            max_end[node] = left if left > right else right
+            left, right = min_end[2 * node], min_end[2 * node + 1]
+            min_end[node] = left if left < right else right
+        self.size, self.max_end, self.min_end = size, max_end, min_end
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _collect(self, lo: int, hi: int, bound: int, above: bool) -> List[int]:
+        """ positions in [lo, hi) with end key >= bound (above) or <= bound (not above) in ascending order """
+        result: List[int] = list()
+        if lo >= hi:
+            return result
+        max_end, min_end = self.max_end, self.min_end
+        stack: list = [(1, 0, self.size)]
+        while stack:
+            node, node_lo, node_hi = stack.pop()
+            if node_hi <= lo or node_lo >= hi:
+                continue
+            if above:
+                if max_end[node] < bound:
+                    continue
+                accept: bool = min_end[node] >= bound
+            else:
+                if min_end[node] > bound:
+                    continue
+                accept = max_end[node] <= bound
+            if accept and lo <= node_lo and node_hi <= hi:  # the whole node matches
+                result.extend(range(node_lo, node_hi))
+                continue
+            mid: int = (node_lo + node_hi) >> 1
+            stack.append((2 * node + 1, mid, node_hi))
+            stack.append((2 * node, node_lo, mid))
+        return result
+
+    def query(self, start: int, end: int, contained: bool) -> List[SimpleTimelineItem]:
+        """ the items overlapping (or contained in) a range of keys, ordered by start """
+        if contained:
+            positions = self._collect(bisect_left(self.starts, start), bisect_right(self.starts, end), end, False)
+        else:
+            positions = self._collect(0, bisect_right(self.starts, end), start, True)
+        items: List[SimpleTimelineItem] = self.items
+        return [items[i] for i in positions]
+
+    # :class _Run
+
+
+class IntervalIndex:
+    """ Index answering overlap, "active at" and containment queries
+
+        The items are kept in runs sorted on the start key, each with two implicit segment trees over the end
+        keys (see `_Run`), so a query costs O(log n + k) per run.
+
+        None starts and ends are indefinite ("before time" and "no end yet") just as in
+        `SimpleTimelineItem.overlap()` and `SimpleTimelineItem.contains()`.
+
+        Added items wait in a buffer of fewer than `PENDING_LIMIT` items that queries scan. A full buffer
+        becomes a new run, and runs are merged while the last one is not larger than the one after it (as the
+        digits of a binary counter), so there are at most log2(n / PENDING_LIMIT) + 1 runs and a query costs
+        O(log n + k) on an index built in one go and O(log² n + k) at worst. Every item takes part in O(log n)
+        merges, so appends cost O(log n) amortised, also when they interleave with queries. Items starting
+        at the same time come in the order they were added.
+    """
+
+    PENDING_LIMIT: int = 64  # the number of added items that becomes a new run
+
+    @staticmethod
+    def range_keys(item_or_range) -> Tuple[int, int]:
+        """ get start and end key of an item or a (start, end) tuple of date/datetime/str/None """
+        if isinstance(item_or_range, SimpleTimelineItem):
+            return item_or_range.start_key, item_or_range.end_key
+        start, end = item_or_range
+        start = SimpleTimelineItem._type_formatter(start)
+        end = SimpleTimelineItem._type_formatter(end)
+        return SimpleTimelineItem.point_key(start, MIN_KEY), SimpleTimelineItem.point_key(end, MAX_KEY)
+
+    @staticmethod
+    def point_keys(point: Union[date, datetime, str]) -> Tuple[int, int]:
+        """ get the keys of a single point in time as a (start, end) range """
+        point = SimpleTimelineItem._type_formatter(point)
+        if point is None:
+            raise ValueError('point_keys: point in time cannot be None')
+        key: int = SimpleTimelineItem.point_key(point)
+        return key, key
+
+    def __init__(self, items: Iterable[SimpleTimelineItem] = ()):
+        self._runs: List[_Run] = list()  # from the largest (the oldest) to the smallest
+        self._pending: List[SimpleTimelineItem] = list()
+        self.extend(items)
+        self._fold()
+
+    def __len__(self) -> int:
+        """ number of items in the index """
+        return sum(len(run) for run in self._runs) + len(self._pending)
+
+    def add(self, item: SimpleTimelineItem):
+        """ add an item to the index """
+        self._pending.append(item)
+        if len(self._pending) >= self.PENDING_LIMIT:
+            self._fold()
+
+    def extend(self, items: Iterable[SimpleTimelineItem]):
+        """ add several items to the index """
+        self._pending.extend(items)
+        if len(self._pending) >= self.PENDING_LIMIT:
+            self._fold()
+
+    def _fold(self):
+        """ turn the pending items into a run and merge it with the runs that are not larger """
+        if not self._pending:
+            return
+        items: List[SimpleTimelineItem] = self._pending
+        self._pending = list()
+        items.sort(key=attrgetter('_start_key'))
+        runs: List[_Run] = self._runs
+        while runs and len(runs[-1]) <= len(items):
+            items = runs.pop().items + items
+            items.sort(key=attrgetter('_start_key'))  # two sorted runs: timsort merges them in linear time
+        runs.append(_Run(items))
+
+    def _query(self, start: int, end: int, contained: bool) -> List[SimpleTimelineItem]:
+        """ run an overlap (or containment) query on start and end keys """
+        found: List[List[SimpleTimelineItem]] = [run.query(start, end, contained) for run in self._runs]
+        if contained:
+            extra = [item for item in self._pending if start <= item._start_key and item._end_key <= end]
+        else:
+            extra = [item for item in self._pending if item._start_key <= end and item._end_key >= start]
+        if extra:
+            found.append(sorted(extra, key=attrgetter('_start_key')))
+        found = [items for items in found if items]
+        if len(found) < 2:
+            return found[0] if found else list()
+        return list(merge(*found, key=attrgetter('_start_key')))
+
+    def overlapping(self, item_or_range) -> List[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range, ordered by start """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._query(start, end, False)
+
+    def active_at(self, point: Union[date, datetime, str]) -> List[SimpleTimelineItem]:
+        """ items active at a point in time, ordered by start """
+        start, end = IntervalIndex.point_keys(point)
+        return self._query(start, end, False)
+
+    def contained_in(self, item_or_range) -> List[SimpleTimelineItem]:
+        """ items contained in an item or a (start, end) range, ordered by start """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._query(start, end, True)
+
+    # :class IntervalIndex
+
+
+# EOF
@@ -0,0 +1,306 @@
+""" The MappedTimeline class - a read-only timeline in a memory-mapped binary file """
+import itertools
+import json
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Union, Callable, Iterable, Dict, List, Tuple
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, MIN_KEY, MAX_KEY
+
+_MAGIC: bytes = b'TIMELINE'
+_VERSION: int = 1
+_SORTED: int = 1  # header flag: the items are sorted on start
+# magic, version, flags, count and the offsets of the sections: starts, ends, kinds, classes, tag offsets,
+# tag codes, payloads, payload offsets and tables (a JSON object running to the end of the file)
+_HEADER: struct.Struct = struct.Struct('<8sIIQ9Q')
+_BLOCK: int = 1024  # items per block of the summary of the end keys used by overlap queries
+
+
+class MappedTimeline:
+    """ Read-only timeline backed by a memory-mapped columnar file
+
+        The file holds fixed-width columns of start and end keys (int64, see `SimpleTimelineItem.point_key`),
+        date/datetime kinds and class codes, a tag dictionary with per item tag codes and an offset-indexed
+        section of pickled payloads. Opening a file maps it without reading it, so a large timeline opens in
+        milliseconds, several processes can share the pages of one file, and a range query on a sorted file
+        only touches the pages it needs. Items are re-created on access.
+
+        The classes of the items must be defined (their modules imported) before a file is opened; modules
+        named in a file are never imported. The payloads are pickled, and unpickling runs code named in the
+        file: they are only read with allow_pickle (only for trusted files), otherwise reading a `TimelineItem`
+        raises ValueError.
+    """
+
+    @staticmethod
+    def dump(timeline: Union[Timeline, Iterable[SimpleTimelineItem]], path, sort: bool = True):
+        """ write the items of a timeline to a file (sorted on start unless sort is False) """
+        items: List[SimpleTimelineItem] = list(timeline.timeline if isinstance(timeline, Timeline) else timeline)
+        starts: array = array('q', (item._start_key for item in items))
+        if sort:
+            order: List[int] = sorted(range(len(items)), key=starts.__getitem__)
+            items = [items[i] for i in order]
+            starts = array('q', (starts[i] for i in order))
+        is_sorted: bool = all(starts[i - 1] <= starts[i] for i in range(1, len(starts)))
+        ends: array = array('q', (item._end_key for item in items))
+        kinds: array = array('B', (SimpleTimelineItem.point_kind(item.start) |
+                                   SimpleTimelineItem.point_kind(item.end) << 4 for item in items))
+        class_codes: Dict[type, int] = dict()
+        classes: array = array('B', (class_codes.setdefault(type(item), len(class_codes)) for item in items))
+        if len(class_codes) > 255:
+            raise ValueError('dump: too many item classes')
+        tag_codes: Dict[str, int] = dict()
+        tag_offsets: array = array('Q', [0])
+        codes: array = array('I')
+        for item in items:
+            codes.extend(tag_codes.setdefault(tag, len(tag_codes)) for tag in getattr(item, 'tags', ()))
+            tag_offsets.append(len(codes))
+        tables: bytes = json.dumps({
+            'classes': [[cls.__module__, cls.__qualname__] for cls in class_codes],
+            'tags': list(tag_codes),
+        }).encode('utf-8')
+        offsets: List[int] = list()
+        with open(path, 'wb') as f:
+            f.write(b'\0' * _HEADER.size)
+
+            def section(data: Union[array, bytes, None] = None) -> int:
+                f.write(b'\0' * (-f.tell() % 8))  # align every section to 8 bytes
+                offsets.append(f.tell())
+                if data is not None:
+                    if isinstance(data, array) and sys.byteorder != 'little':
+                        data = array(data.typecode, data)
+                        data.byteswap()
+                    f.write(data)
+                return offsets[-1]
+
+            for column in (starts, ends, kinds, classes, tag_offsets, codes):
+                section(column)
+            payload_start: int = section()
+            payload_offsets: array = array('Q', [0])
+            for item in items:
+                if isinstance(item, TimelineItem):
+                    f.write(pickle.dumps(item.data, protocol=pickle.HIGHEST_PROTOCOL))
+                payload_offsets.append(f.tell() - payload_start)
+            section(payload_offsets)
+            section(tables)
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, _SORTED if is_sorted else 0, len(items), *offsets))
+
+    def __init__(self, path, allow_pickle: bool = False):
+        """ open (map) a file written by dump """
+        self._allow_pickle: bool = allow_pickle
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, *offsets = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError('MappedTimeline: not a timeline file')
+        self._count: int = count
+        self._sorted: bool = bool(flags & _SORTED)
+        self._views: list = list()
+        self._block_ends: Union[array, None] = None  # see _end_summary
+        self._block_reach: Union[array, None] = None
+        starts, ends, kinds, classes, tag_offsets, codes, payloads, payload_offsets, tables = offsets
+        self._starts = self._column(starts, 'q', count)
+        self._ends = self._column(ends, 'q', count)
+        self._kinds = self._column(kinds, 'B', count)
+        self._classes = self._column(classes, 'B', count)
+        self._tag_offsets = self._column(tag_offsets, 'Q', count + 1)
+        self._tag_codes = self._column(codes, 'I', self._tag_offsets[count] if count else 0)
+        self._payloads: int = payloads
+        self._payload_offsets = self._column(payload_offsets, 'Q', count + 1)
+        table: dict = json.loads(self._map[tables:].decode('utf-8'))
+        try:
+            self._class_table: List[type] = [SimpleTimelineItem._loaded_class(module, name)
+                                             for module, name in table['classes']]
+        except ValueError:
+            self.close()
+            raise
+        self._tag_table: List[str] = [sys.intern(tag) for tag in table['tags']]
+
+    def _column(self, offset: int, typecode: str, count: int):
+        """ a zero-copy view of a column (a copy on big-endian machines) """
+        view = memoryview(self._map)[offset:offset + count * array(typecode).itemsize].cast(typecode)
+        if sys.byteorder == 'little':
+            self._views.append(view)
+            return view
+        column: array = array(typecode, view)
+        view.release()
+        column.byteswap()
+        return column
+
+    def close(self):
+        """ release the views and unmap the file """
+        for view in getattr(self, '_views', ()):
+            view.release()
+        self._views = list()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):  # -> MappedTimeline
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        """ get the length of the timeline """
+        return self._count
+
+    def __getitem__(self, index: int) -> SimpleTimelineItem:
+        """ get an item from index """
+        return self._item(range(self._count)[index])
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ iterate over the items """
+        return self._items(range(self._count))
+
+    @property
+    def is_sorted(self) -> bool:
+        """ are the items sorted on start? """
+        return self._sorted
+
+    @property
+    def timeline(self) -> [SimpleTimelineItem]:
+        """ all the items as a list of objects """
+        return list(self)
+
+    @property
+    def starts(self):  # -> memoryview
+        """ the start keys (MIN_KEY for None) """
+        return self._starts
+
+    @property
+    def ends(self):  # -> memoryview
+        """ the end keys (MAX_KEY for None) """
+        return self._ends
+
+    def _point(self, key: int, kind: int, none_key: int) -> Union[date, datetime, None]:
+        return None if key == none_key else SimpleTimelineItem.key_point(key, kind)
+
+    def _item(self, position: int) -> SimpleTimelineItem:
+        """ re-create the item at a position """
+        cls: type = self._class_table[self._classes[position]]
+        kind: int = self._kinds[position]
+        start_key: int = self._starts[position]
+        end_key: int = self._ends[position]
+        start = self._point(start_key, kind & 0x0f, MIN_KEY)
+        end = self._point(end_key, kind >> 4, MAX_KEY)
+        if not issubclass(cls, TimelineItem):
+            return cls._build(start, end, start_key, end_key)
+        first, last = self._tag_offsets[position], self._tag_offsets[position + 1]
+        tags: frozenset = TimelineItem.intern_tags(self._tag_table[code] for code in self._tag_codes[first:last])
+        return cls._build(start, end, self._payload(position), tags, start_key, end_key)
+
+    def _payload(self, position: int):
+        """ the unpickled payload of the item at a position (with allow_pickle) """
+        if not self._allow_pickle:
+            raise ValueError('MappedTimeline: the payloads are pickled, pass allow_pickle=True for a trusted file')
+        payload_from: int = self._payloads + self._payload_offsets[position]
+        payload_to: int = self._payloads + self._payload_offsets[position + 1]
+        return pickle.loads(self._map[payload_from:payload_to])
+
+    def _items(self, positions: Iterable[int]) -> Iterable[SimpleTimelineItem]:
+        for position in positions:
+            yield self._item(position)
+
+    def to_timeline(self) -> Timeline:
+        """ load all the items into a timeline """
+        return Timeline._bulk_timeline(self.timeline)
+
+    def filter(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None) \
+            -> Iterable[TimelineItem]:
+        """ Filter timeline based on date/datetime returning data as an iterable (as `Timeline.filter`) """
+        before_key: int = MAX_KEY if before is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before))
+        after_key: int = MIN_KEY if after is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after))
+        if self._sorted:
+            lo: int = bisect_left(self._starts, after_key)
+            return self._items(range(lo, max(lo, bisect_right(self._starts, before_key))))
+        starts = self._starts
+        return self._items(i for i in range(self._count) if after_key <= starts[i] <= before_key)
+
+    def _end_summary(self) -> Tuple[array, array]:
+        """ the greatest end key of every block of _BLOCK items and the running maximum of those
+
+            Built by the first overlap query in one pass over the end keys.
+        """
+        if self._block_ends is None:
+            ends = self._ends
+            self._block_ends = array('q', (max(ends[i:i + _BLOCK]) for i in range(0, self._count, _BLOCK)))
+            self._block_reach = array('q', itertools.accumulate(self._block_ends, max))
+        return self._block_ends, self._block_reach
+
+    def _positions(self, start: int, end: int, contained: bool) -> Iterable[int]:
+        """ positions of the items overlapping (or contained in) the range of keys """
+        starts, ends = self._starts, self._ends
+        hi: int = bisect_right(starts, end) if self._sorted else self._count  # the later items start after end
+        if contained:
+            for i in range(bisect_left(starts, start) if self._sorted else 0, hi):
+                if start <= starts[i] and ends[i] <= end:
+                    yield i
+            return
+        block_ends, block_reach = self._end_summary()
+        # the blocks before the first one reaching start, and any block ending before it, cannot overlap
+        for block in range(bisect_left(block_reach, start), (hi + _BLOCK - 1) // _BLOCK):
+            if block_ends[block] < start:
+                continue
+            for i in range(block * _BLOCK, min(hi, (block + 1) * _BLOCK)):
+                if starts[i] <= end and ends[i] >= start:
+                    yield i
+
+    def overlapping(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range returning data as an iterable """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._items(self._positions(start, end, False))
+
+    def active_at(self, point: Union[date, datetime, str]) -> Iterable[SimpleTimelineItem]:
+        """ items active at a point in time returning data as an iterable """
+        start, end = IntervalIndex.point_keys(point)
+        return self._items(self._positions(start, end, False))
+
+    def contained_in(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items contained in an item or a (start, end) range returning data as an iterable """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._items(self._positions(start, end, True))
+
+    def tag_filter(self, tags: Union[str, list], one_of: bool = False) -> Iterable[TimelineItem]:
+        """ filter on the presence of tags returning data as an iterable """
+        if isinstance(tags, str):
+            tags = [tags]
+        lookup: Dict[str, int] = {tag: code for code, tag in enumerate(self._tag_table)}
+        wanted: set = {lookup[tag] for tag in tags if tag in lookup}
+        if not one_of and len(wanted) < len(set(tags)):  # a tag that no item has
+            return iter(())
+        is_item: List[bool] = [issubclass(cls, TimelineItem) for cls in self._class_table]
+        offsets, codes, classes = self._tag_offsets, self._tag_codes, self._classes
+
+        def positions() -> Iterable[int]:
+            for i in range(self._count):
+                if is_item[classes[i]]:
+                    item_codes = codes[offsets[i]:offsets[i + 1]]
+                    if (not wanted.isdisjoint(item_codes)) if one_of else wanted.issubset(item_codes):
+                        yield i
+        return self._items(positions())
+
+    def class_filter(self, cls) -> Iterable[TimelineItem]:
+        """ filter the timeline on the basis of the class returning data as an iterable """
+        wanted: List[bool] = [issubclass(table_cls, cls) for table_cls in self._class_table]
+        classes = self._classes
+        return self._items(i for i in range(self._count) if wanted[classes[i]])
+
+    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]]) -> Iterable[TimelineItem]:
+        """ Filter on data by means of function returning data as an iterable """
+        return (item for item in self if func(item))
+
+    # :class MappedTimeline
+
+
+# EOF
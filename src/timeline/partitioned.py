@@ -0,0 +1,263 @@
+""" The PartitionedTimeline class - a timeline split into partitions by period of start """
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from heapq import merge
+from itertools import chain
+from operator import attrgetter
+from typing import Union, Callable, Iterable, Dict, List
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, MIN_KEY, MAX_KEY, _TICKS_PER_DAY
+
+OPEN: str = 'open'  # label of the overflow partition holding the items with a None start or end
+PERIODS: tuple = ('month', 'year')
+_INDEX: str = 'partitions.json'  # the table of partitions written by dump
+
+
+class PartitionedTimeline:
+    """ Timeline keeping its items in one `Timeline` per month or year of their start
+
+        The partitions are labelled 'YYYY-MM' or 'YYYY'; items with an indefinite start or end go to the
+        overflow partition 'open'. Range queries only look at the partitions whose period meets the window
+        (for overlaps, whose latest end reaches it) and the overflow partition. Results come in order of start.
+        With workers > 1 the partitions of a query are read (if evicted) and searched on a pool of threads: the
+        reading overlaps, as file I/O and gzip release the GIL, while the searches are Python code and take turns.
+        `data_filter` evaluates its function on a pool of processes instead (see `Timeline.data_filter`).
+
+        Every partition can be written to JSON Lines and dropped from memory (`evict`); it is read back when
+        a query or an append needs it. `dump(directory)` and `PartitionedTimeline.load(directory)` store all.
+        The data go through JSON there, so they come back as JSON gives them (tuples as lists, dates and sets
+        in the data as strings and lists) and data that JSON cannot encode cannot be evicted.
+    """
+
+    def __init__(self, period: str = 'month', workers: Union[int, None] = None):
+        if period not in PERIODS:
+            raise ValueError(f'PartitionedTimeline: period must be one of {", ".join(PERIODS)}')
+        self._period: str = period
+        self._workers: Union[int, None] = workers
+        self._partitions: Dict[str, Timeline] = dict()
+        self._cold: Dict[str, str] = dict()  # label -> path of an evicted partition
+        self._counts: Dict[str, int] = dict()
+        self._max_ends: Dict[str, int] = dict()  # label -> latest end key in the partition
+
+    @property
+    def period(self) -> str:
+        """ 'month' or 'year' """
+        return self._period
+
+    def label(self, item: SimpleTimelineItem) -> str:
+        """ the partition of an item """
+        if item._start is None or item._end is None:
+            return OPEN
+        day: date = date.fromordinal(item._start_key // _TICKS_PER_DAY)
+        return f'{day.year:04d}' if self._period == 'year' else f'{day.year:04d}-{day.month:02d}'
+
+    @staticmethod
+    def _bounds(label: str) -> tuple:
+        """ the range of start keys of a partition: [first, limit) """
+        if label == OPEN:
+            return MIN_KEY, MAX_KEY
+        year: int = int(label[:4])
+        if len(label) == 4:
+            first, limit = date(year, 1, 1), date(year + 1, 1, 1) if year < 9999 else None
+        else:
+            month: int = int(label[5:])
+            first = date(year, month, 1)
+            limit = date(year + month // 12, month % 12 + 1, 1) if (year, month) != (9999, 12) else None
+        return SimpleTimelineItem.point_key(first), SimpleTimelineItem.point_key(limit, MAX_KEY)
+
+    @property
+    def partitions(self) -> List[str]:
+        """ the labels of the partitions in chronological order (the overflow partition last) """
+        return sorted(self._counts, key=lambda label: (label == OPEN, label))
+
+    def partition(self, label: str) -> Timeline:
+        """ the timeline of a partition, read from disk if it was evicted """
+        timeline: Union[Timeline, None] = self._partitions.get(label)
+        if timeline is None:
+            if label not in self._cold:
+                raise KeyError(label)
+            timeline = Timeline.load_jsonl(self._cold.pop(label))
+            self._partitions[label] = timeline
+        return timeline
+
+    def is_loaded(self, label: str) -> bool:
+        """ is a partition in memory? """
+        return label in self._partitions
+
+    def __len__(self) -> int:
+        """ get the length of the timeline """
+        return sum(self._counts.values())
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ all the items in order of start """
+        return self._merged({label: self._sorted(label).timeline for label in self.partitions})
+
+    @property
+    def timeline(self) -> [SimpleTimelineItem]:
+        """ all the items in order of start as a list """
+        return list(self)
+
+    def _add(self, label: str, items: List[SimpleTimelineItem]):
+        """ add items to a partition, creating it if needed """
+        if label not in self._counts:
+            self._partitions[label] = Timeline()
+            self._counts[label] = 0
+            self._max_ends[label] = MIN_KEY
+        batch: Timeline = Timeline._bulk_timeline(items)
+        self.partition(label).extend(batch)
+        self._counts[label] += len(items)
+        self._max_ends[label] = max(self._max_ends[label], max(item._end_key for item in items))
+
+    def append(self, stl: SimpleTimelineItem):
+        """ Append timeline item """
+        self._add(self.label(stl), [stl])
+
+    def extend(self, ti):  # ti: Timeline, PartitionedTimeline or iterable of items
+        """ extend the timeline with the items of ti, one extend per partition """
+        groups: Dict[str, List[SimpleTimelineItem]] = dict()
+        for item in (ti.timeline if isinstance(ti, (Timeline, PartitionedTimeline)) else ti):
+            groups.setdefault(self.label(item), []).append(item)
+        for label, items in groups.items():
+            self._add(label, items)
+
+    def _sorted(self, label: str) -> Timeline:
+        return self.partition(label)._ascending()
+
+    def _merged(self, results: Dict[str, Iterable[SimpleTimelineItem]]) -> Iterable[SimpleTimelineItem]:
+        """ the results of the partitions in order of start: the dated ones follow each other """
+        dated: Iterable[SimpleTimelineItem] = chain.from_iterable(
+            results[label] for label in sorted(results) if label != OPEN)
+        if OPEN not in results:
+            return dated
+        return merge(results[OPEN], dated, key=attrgetter('_start_key'))
+
+    def _search(self, labels: List[str], func: Callable[[Timeline], Iterable[SimpleTimelineItem]]) \
+            -> Iterable[SimpleTimelineItem]:
+        """ run a query on the partitions (on a pool of threads if workers > 1) and merge the results """
+        if self._workers and self._workers > 1 and len(labels) > 1:
+            with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                found: List[list] = list(pool.map(lambda label: list(func(self._sorted(label))), labels))
+            return self._merged(dict(zip(labels, found)))
+        return self._merged({label: list(func(self._sorted(label))) for label in labels})
+
+    def _labels(self, start: int = MIN_KEY, end: int = MAX_KEY, overlap: bool = False) -> List[str]:
+        """ the partitions that can hold items starting in [start, end] (or overlapping it if overlap) """
+        result: List[str] = list()
+        for label in self._counts:
+            first, limit = PartitionedTimeline._bounds(label)
+            if label == OPEN or first <= end and (self._max_ends[label] >= start if overlap else limit > start):
+                result.append(label)
+        return result
+
+    def filter(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None) \
+            -> Iterable[TimelineItem]:
+        """ Filter timeline based on date/datetime returning data as an iterable (as `Timeline.filter`)
+
+            Only the partitions of the periods between after and before, and the overflow partition, are read.
+        """
+        before_key: int = MAX_KEY if before is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before))
+        after_key: int = MIN_KEY if after is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after))
+        return self._search(self._labels(after_key, before_key), lambda timeline: timeline.filter(before, after))
+
+    def overlapping(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range, skipping partitions that end before it """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._search(self._labels(start, end, overlap=True),
+                            lambda timeline: timeline.overlapping(item_or_range))
+
+    def active_at(self, point: Union[date, datetime, str]) -> Iterable[SimpleTimelineItem]:
+        """ items active at a point in time """
+        start, end = IntervalIndex.point_keys(point)
+        return self._search(self._labels(start, end, overlap=True), lambda timeline: timeline.active_at(point))
+
+    def tag_filter(self, tags: Union[str, list, None], one_of: bool = False,
+                   exclude: Union[str, list, None] = None) -> Iterable[TimelineItem]:
+        """ filter on the presence (and absence) of tags in every partition (as `Timeline.tag_filter`) """
+        return self._search(list(self._counts), lambda timeline: timeline.tag_filter(tags, one_of, exclude))
+
+    def class_filter(self, cls) -> Iterable[TimelineItem]:
+        """ filter the timeline on the basis of the class returning data as an iterable """
+        return self._search(list(self._counts), lambda timeline: timeline.class_filter(cls))
+
+    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]]) -> Iterable[TimelineItem]:
+        """ Filter on data by means of function returning data as an iterable
+
+            With workers > 1 func runs on a pool of processes, so func and the items must be picklable.
+        """
+        if self._workers and self._workers > 1:
+            return Timeline._bulk_timeline(self.timeline).data_filter(func, workers=self._workers)
+        return self._search(list(self._counts), lambda timeline: timeline.data_filter(func))
+
+    def to_list(self) -> list:
+        """ convert the timeline to a list (in order of start) """
+        return [item.to_dict() for item in self]
+
+    def to_timeline(self) -> Timeline:
+        """ all the items in one timeline """
+        return Timeline._bulk_timeline(self.timeline)
+
+    def evict(self, label: str, path):
+        """ write a partition to a JSON Lines file (gzip if the path ends with .gz) and drop it from memory
+
+            The data are read back as JSON gives them (see the class), so only evict JSON compatible data.
+        """
+        self.partition(label).dump_jsonl(path)
+        del self._partitions[label]
+        self._cold[label] = os.fspath(path)
+
+    def _copy(self, label: str, path: str, compress: bool):
+        """ copy the file of an evicted partition (compressing or decompressing it) without loading it """
+        source: str = self._cold[label]
+        if os.path.exists(path) and os.path.samefile(source, path):
+            return
+        with open(source, 'rb') as f:
+            compressed: bool = f.read(2) == b'\x1f\x8b'
+        if compressed == compress:
+            shutil.copyfile(source, path)
+            return
+        with Timeline._open_jsonl(source, 'r', compressed) as f, Timeline._open_jsonl(path, 'w', compress) as out:
+            shutil.copyfileobj(f, out)
+
+    def dump(self, directory, compress: bool = False):
+        """ write every partition to <label>.jsonl (.jsonl.gz if compress) in a directory with a table
+
+            Evicted partitions are copied from their files and stay evicted.
+        """
+        os.makedirs(directory, exist_ok=True)
+        table: dict = {'period': self._period, 'partitions': dict()}
+        for label in self.partitions:
+            name: str = label + ('.jsonl.gz' if compress else '.jsonl')
+            if label in self._cold:
+                self._copy(label, os.path.join(directory, name), compress)
+            else:
+                self._partitions[label].dump_jsonl(os.path.join(directory, name))
+            table['partitions'][label] = {'file': name, 'count': self._counts[label],
+                                          'max_end': self._max_ends[label]}
+        with open(os.path.join(directory, _INDEX), 'w', encoding='utf-8') as f:
+            json.dump(table, f)
+
+    @staticmethod
+    def load(directory, workers: Union[int, None] = None, lazy: bool = True):  # -> PartitionedTimeline
+        """ open a directory written by dump; with lazy the partitions are only read when needed """
+        with open(os.path.join(directory, _INDEX), encoding='utf-8') as f:
+            table: dict = json.load(f)
+        result: PartitionedTimeline = PartitionedTimeline(table['period'], workers=workers)
+        for label, entry in table['partitions'].items():
+            result._cold[label] = os.path.join(directory, entry['file'])
+            result._counts[label] = entry['count']
+            result._max_ends[label] = entry['max_end']
+            if not lazy:
+                result.partition(label)
+        return result
+
+    # :class PartitionedTimeline
+
+
+# EOF
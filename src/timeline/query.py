@@ -0,0 +1,152 @@
+""" The Query class - lazy composable queries on a Timeline """
+from datetime import date, datetime
+from itertools import islice
+from typing import Union, Callable, Iterable, List, Tuple
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline_item import SimpleTimelineItem, MIN_KEY, MAX_KEY
+
+
+class Query:
+    """ A lazy query on a timeline built by chaining criteria
+
+        Nothing is evaluated until the query is iterated or counted. The planner then takes the candidates from
+        the most selective index available - a binary searched slice of a sorted timeline for `between`, the tag
+        index for `tags` or the interval index for `overlapping`/`active_at` - or from a full scan, and checks
+        the remaining criteria from cheap to expensive: start keys, overlaps, classes, tags and at last the user
+        functions of `where` in the order they were given.
+
+        Items come in timeline order, or in order of start when the candidates are taken from the interval index.
+    """
+
+    def __init__(self, timeline):  # timeline: Timeline
+        self._timeline = timeline
+        self._after: int = MIN_KEY
+        self._before: int = MAX_KEY
+        self._windows: List[Tuple[int, int]] = list()
+        self._all_of: List[str] = list()
+        self._one_of: List[List[str]] = list()
+        self._exclude: List[str] = list()
+        self._classes: list = list()
+        self._funcs: List[Callable[[SimpleTimelineItem], bool]] = list()
+        self._limit: Union[int, None] = None
+
+    def between(self, after: Union[None, date, datetime, str] = None,
+                before: Union[None, date, datetime, str] = None):  # -> Query
+        """ items starting at or after `after` and at or before `before` (as `Timeline.filter`) """
+        if after is not None:
+            self._after = max(self._after, SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after)))
+        if before is not None:
+            self._before = min(self._before,
+                               SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before)))
+        return self
+
+    def overlapping(self, item_or_range):  # -> Query
+        """ items overlapping an item or a (start, end) range """
+        self._windows.append(IntervalIndex.range_keys(item_or_range))
+        return self
+
+    def active_at(self, point: Union[date, datetime, str]):  # -> Query
+        """ items active at a point in time """
+        self._windows.append(IntervalIndex.point_keys(point))
+        return self
+
+    def tags(self, all_of: Union[str, list, None] = None, one_of: Union[str, list, None] = None,
+             exclude: Union[str, list, None] = None):  # -> Query
+        """ items with all the tags of all_of, at least one of one_of and none of exclude """
+        if all_of:
+            self._all_of.extend([all_of] if isinstance(all_of, str) else all_of)
+        if one_of is not None:
+            self._one_of.append([one_of] if isinstance(one_of, str) else list(one_of))
+        if exclude:
+            self._exclude.extend([exclude] if isinstance(exclude, str) else exclude)
+        return self
+
+    def of_class(self, cls):  # -> Query
+        """ items being instances of cls """
+        self._classes.append(cls)
+        return self
+
+    def where(self, func: Callable[[SimpleTimelineItem], bool]):  # -> Query
+        """ items func accepts (evaluated last) """
+        self._funcs.append(func)
+        return self
+
+    def limit(self, count: int):  # -> Query
+        """ at most count items """
+        self._limit = count if self._limit is None else min(self._limit, count)
+        return self
+
+    def _plan(self) -> Tuple[str, int, Callable[[], Iterable[SimpleTimelineItem]], List[Tuple[str, Callable]]]:
+        """ choose the source of candidates and order the remaining checks: (source, estimate, items, checks) """
+        timeline = self._timeline
+        items: [SimpleTimelineItem] = timeline.timeline
+        sources: list = [(len(items), 'scan', lambda: iter(items))]
+        has_range: bool = self._after != MIN_KEY or self._before != MAX_KEY
+        if has_range and timeline.is_sorted:
+            lo: int = timeline._bisect(self._after)
+            hi: int = max(lo, timeline._bisect(self._before, right=True))
+            sources.append((hi - lo, 'range', lambda: iter(items[lo:hi])))
+        has_tags: bool = bool(self._all_of or self._one_of or self._exclude)
+        if has_tags:
+            positions: Union[set, None] = timeline._tag_positions(self._all_of, exclude=self._exclude)
+            for group in self._one_of:
+                found: set = timeline._tag_positions(group, one_of=True)
+                positions = found if positions is None else positions & found
+            if positions is not None:
+                sources.append((len(positions), 'tags', lambda: (items[p] for p in sorted(positions))))
+        if self._windows and timeline._interval_index is not None:
+            start, end = self._windows[0]
+            found: list = timeline._interval_index._query(start, end, False)
+            sources.append((len(found), 'interval index', lambda: iter(found)))
+        estimate, source, candidates = min(sources, key=lambda entry: entry[0])
+        checks: List[Tuple[str, Callable]] = list()
+        if has_range and source != 'range':
+            after, before = self._after, self._before
+            checks.append(('range', lambda item: after <= item._start_key <= before))
+        for position, (start, end) in enumerate(self._windows):
+            if position or source != 'interval index':
+                checks.append(('overlap', lambda item, start=start, end=end:
+                               item._start_key <= end and item._end_key >= start))
+        for cls in self._classes:
+            checks.append(('class', lambda item, cls=cls: isinstance(item, cls)))
+        if has_tags and source != 'tags':
+            checks.append(('tags', self._has_tags))
+        for func in self._funcs:
+            checks.append(('where', func))
+        return source, estimate, candidates, checks
+
+    def _has_tags(self, item: SimpleTimelineItem) -> bool:
+        """ check the tag criteria on an item """
+        tags: frozenset = getattr(item, 'tags', frozenset())
+        return tags.issuperset(self._all_of) and tags.isdisjoint(self._exclude) and \
+            all(not tags.isdisjoint(group) for group in self._one_of)
+
+    def explain(self) -> List[str]:
+        """ the steps the planner would take, e.g. ['tags (12 candidates)', 'range', 'where'] """
+        source, estimate, _, checks = self._plan()
+        return [f'{source} ({estimate} candidates)'] + [name for name, _ in checks]
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ evaluate the query """
+        _, estimate, candidates, checks = self._plan()
+        tests: List[Callable] = [check for _, check in checks]
+        result: Iterable[SimpleTimelineItem] = (item for item in candidates()
+                                                if all(test(item) for test in tests)) if tests else candidates()
+        if self._limit is not None:
+            result = islice(result, self._limit)
+        stats = self._timeline.stats
+        return iter(result) if stats is None else stats.track('query', result, estimate)
+
+    def count(self) -> int:
+        """ the number of matching items (without keeping them) """
+        return sum(1 for _ in self)
+
+    def first(self) -> Union[SimpleTimelineItem, None]:
+        """ the first matching item or None """
+        return next(iter(self), None)
+
+    # :class Query
+
+
+# EOF
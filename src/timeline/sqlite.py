@@ -0,0 +1,309 @@
+""" The SqliteTimeline class - a timeline stored in a SQLite database """
+import json
+import pickle
+import sqlite3
+import sys
+from datetime import date, datetime
+from itertools import islice
+from typing import Union, Callable, Iterable, Dict, List, Any
+
+from timeline.interval_index import IntervalIndex
+from timeline.timeline import Timeline
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, MIN_KEY, MAX_KEY
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, module TEXT NOT NULL, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tags (id INTEGER PRIMARY KEY, tag TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY, start_key INTEGER NOT NULL, end_key INTEGER NOT NULL, kinds INTEGER NOT NULL,
+    class INTEGER NOT NULL, tags TEXT, payload BLOB);
+CREATE INDEX IF NOT EXISTS items_start ON items (start_key);
+CREATE INDEX IF NOT EXISTS items_end ON items (end_key);
+CREATE TABLE IF NOT EXISTS item_tags (tag INTEGER NOT NULL, item INTEGER NOT NULL, PRIMARY KEY (tag, item))
+    WITHOUT ROWID;
+"""
+_COLUMNS: str = 'id, start_key, end_key, kinds, class, tags'
+_DATA = TimelineItem.data  # the slot of TimelineItem.data, behind the property of LazyTimelineItem
+
+
+class LazyTimelineItem(TimelineItem):
+    """ TimelineItem read from a SqliteTimeline that reads its payload from the database on first access
+
+        It is a TimelineItem in every other respect; it serialises (to_dict, pickle) as a plain TimelineItem.
+    """
+
+    __slots__ = ('_source', '_rowid')
+
+    @property
+    def data(self) -> Any:
+        try:
+            return _DATA.__get__(self, TimelineItem)
+        except AttributeError:
+            value: Any = self._source._payload(self._rowid)
+            _DATA.__set__(self, value)
+            return value
+
+    @data.setter
+    def data(self, value: Any):
+        _DATA.__set__(self, value)
+
+    def to_dict(self) -> dict:
+        """ convert data to dictionary (serialise) """
+        result: dict = super().to_dict()
+        result['type'] = TimelineItem.__name__
+        return result
+
+    def __reduce__(self):
+        return TimelineItem._build, (self._start, self._end, self.data, self.tags, self._start_key, self._end_key)
+
+    # :class LazyTimelineItem
+
+
+class SqliteTimeline:
+    """ Timeline stored in a SQLite database file, so it can be much larger than memory
+
+        Start and end keys (see `SimpleTimelineItem.point_key`) are indexed columns and the tags are kept in an
+        indexed table, so filter, tag_filter, class_filter and the interval queries run as indexed SQL queries
+        and only create the items they return. Items come back in order of start (ties in order of insertion).
+        With lazy (the default) the payload of a TimelineItem is only read when its `data` is first used.
+        `extend` writes in batches of batch_size items, one transaction each.
+
+        The classes of the items must be defined (their modules imported) before a database is opened; modules
+        named in it are never imported. The payloads are pickled, and unpickling runs code named in the database:
+        they are only read with allow_pickle (only for trusted files), otherwise reading the data of a
+        `TimelineItem` raises ValueError.
+    """
+
+    def __init__(self, path=':memory:', lazy: bool = True, allow_pickle: bool = False):
+        """ open (or create) the database at path """
+        self._connection: sqlite3.Connection = sqlite3.connect(path)
+        self._lazy: bool = lazy
+        self._allow_pickle: bool = allow_pickle
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+        self._class_table: Dict[int, type] = dict()  # code -> class
+        self._class_codes: Dict[type, int] = dict()
+        for code, module, name in self._connection.execute('SELECT id, module, name FROM classes ORDER BY id'):
+            cls: type = SimpleTimelineItem._loaded_class(module, name)
+            self._class_table[code] = cls
+            self._class_codes[cls] = code
+        self._tag_codes: Dict[str, int] = {sys.intern(tag): code for code, tag
+                                           in self._connection.execute('SELECT id, tag FROM tags ORDER BY id')}
+        self._count: int
+        self._next_id: int
+        self._count, self._next_id = self._connection.execute(
+            'SELECT COUNT(*), COALESCE(MAX(id), 0) + 1 FROM items').fetchone()
+
+    def close(self):
+        """ close the database """
+        self._connection.close()
+
+    def __enter__(self):  # -> SqliteTimeline
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        """ get the length of the timeline """
+        return self._count
+
+    def __getitem__(self, index: int) -> SimpleTimelineItem:
+        """ get an item from index (in order of start) """
+        position: int = range(self._count)[index]
+        return next(iter(self._select('1 ORDER BY start_key, id LIMIT 1 OFFSET ?', (position,), self._lazy)))
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        """ iterate over the items in order of start """
+        return self._query('1', ())
+
+    @property
+    def is_sorted(self) -> bool:
+        """ the items always come in order of start """
+        return True
+
+    @property
+    def timeline(self) -> [SimpleTimelineItem]:
+        """ all the items in order of start as a list """
+        return list(self)
+
+    def _class_code(self, cls: type) -> int:
+        """ the code of a class, recording it in the classes table (which allocates the code) the first time """
+        if cls is LazyTimelineItem:
+            cls = TimelineItem
+        code: Union[int, None] = self._class_codes.get(cls)
+        if code is None:
+            code = self._connection.execute('INSERT INTO classes (module, name) VALUES (?, ?)',
+                                            (cls.__module__, cls.__qualname__)).lastrowid
+            self._class_table[code] = cls
+            self._class_codes[cls] = code
+        return code
+
+    def _tag_code(self, tag: str) -> int:
+        """ the code of a tag, recording it in the tags table (which allocates the code) the first time """
+        code: Union[int, None] = self._tag_codes.get(tag)
+        if code is None:
+            code = self._connection.execute('INSERT INTO tags (tag) VALUES (?)', (tag,)).lastrowid
+            self._tag_codes[tag] = code
+        return code
+
+    def _forget(self, classes: int, tags: int):
+        """ drop the codes recorded after the first classes and tags, when their transaction was rolled back """
+        for code in list(self._class_table)[classes:]:
+            del self._class_codes[self._class_table.pop(code)]
+        for tag in list(self._tag_codes)[tags:]:
+            del self._tag_codes[tag]
+
+    def _write(self, items: List[SimpleTimelineItem]):
+        """ insert a batch of items in one transaction (the codes it records are dropped if it fails) """
+        classes, tags = len(self._class_table), len(self._tag_codes)
+        try:
+            self._insert(items)
+        except BaseException:
+            self._forget(classes, tags)
+            raise
+
+    def _insert(self, items: List[SimpleTimelineItem]):
+        rows: List[tuple] = list()
+        tag_rows: List[tuple] = list()
+        with self._connection:
+            for item in items:
+                rowid: int = self._next_id + len(rows)
+                kinds: int = SimpleTimelineItem.point_kind(item.start) | SimpleTimelineItem.point_kind(item.end) << 4
+                tags: Union[str, None] = None
+                payload: Union[bytes, None] = None
+                if isinstance(item, TimelineItem):
+                    tags = json.dumps(sorted(item.tags))
+                    payload = pickle.dumps(item.data, protocol=pickle.HIGHEST_PROTOCOL)
+                    tag_rows.extend((self._tag_code(tag), rowid) for tag in item.tags)
+                rows.append((rowid, item._start_key, item._end_key, kinds, self._class_code(type(item)), tags,
+                             payload))
+            self._connection.executemany('INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._connection.executemany('INSERT INTO item_tags (tag, item) VALUES (?, ?)', tag_rows)
+        self._next_id += len(rows)
+        self._count += len(rows)
+
+    def append(self, stl: SimpleTimelineItem):
+        """ Append timeline item """
+        self._write([stl])
+
+    def extend(self, ti, batch_size: int = 10000):  # ti: Timeline, SqliteTimeline or iterable of items
+        """ extend the timeline with the items of ti, batch_size items per transaction """
+        items: Iterable[SimpleTimelineItem] = iter(ti.timeline if isinstance(ti, (Timeline, SqliteTimeline))
+                                                   else ti)
+        while True:
+            batch: List[SimpleTimelineItem] = list(islice(items, batch_size))
+            if not batch:
+                return
+            self._write(batch)
+
+    def _payload(self, rowid: int) -> Any:
+        """ the unpickled payload of a row """
+        row: Union[tuple, None] = self._connection.execute('SELECT payload FROM items WHERE id = ?',
+                                                           (rowid,)).fetchone()
+        if row is None:
+            raise KeyError(rowid)
+        return self._unpickle(row[0])
+
+    def _unpickle(self, payload: Union[bytes, None]) -> Any:
+        """ a stored payload (with allow_pickle) """
+        if payload is None:
+            return None
+        if not self._allow_pickle:
+            raise ValueError('SqliteTimeline: the payloads are pickled, pass allow_pickle=True for a trusted database')
+        return pickle.loads(payload)
+
+    def _select(self, where: str, params: tuple, lazy: bool) -> Iterable[SimpleTimelineItem]:
+        """ the items of the rows matching a WHERE clause (which may end in ORDER BY and LIMIT) """
+        columns: str = _COLUMNS if lazy else _COLUMNS + ', payload'
+        key_point: Callable = SimpleTimelineItem.key_point
+        intern_tags: Callable = TimelineItem.intern_tags
+        for row in self._connection.execute(f'SELECT {columns} FROM items WHERE {where}', params):
+            rowid, start_key, end_key, kinds, code, tags = row[:6]
+            cls: type = self._class_table[code]
+            start = None if start_key == MIN_KEY else key_point(start_key, kinds & 0x0f)
+            end = None if end_key == MAX_KEY else key_point(end_key, kinds >> 4)
+            if not issubclass(cls, TimelineItem):
+                yield cls._build(start, end, start_key, end_key)
+            elif lazy and cls is TimelineItem:
+                item: LazyTimelineItem = SimpleTimelineItem._build.__func__(LazyTimelineItem, start, end,
+                                                                           start_key, end_key)
+                item.tags = intern_tags(json.loads(tags))
+                item._source = self
+                item._rowid = rowid
+                yield item
+            else:
+                data: Any = self._payload(rowid) if lazy else self._unpickle(row[6])
+                yield cls._build(start, end, data, intern_tags(json.loads(tags)), start_key, end_key)
+
+    def _query(self, where: str, params: tuple) -> Iterable[SimpleTimelineItem]:
+        return self._select(where + ' ORDER BY start_key, id', params, self._lazy)
+
+    def to_timeline(self) -> Timeline:
+        """ load all the items (with their payloads) into a timeline """
+        return Timeline._bulk_timeline(list(self._select('1 ORDER BY start_key, id', (), False)))
+
+    def to_list(self) -> list:
+        """ convert the timeline to a list (in order of start) """
+        return [item.to_dict() for item in self._select('1 ORDER BY start_key, id', (), False)]
+
+    def filter(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None) \
+            -> Iterable[TimelineItem]:
+        """ Filter timeline based on date/datetime returning data as an iterable (as `Timeline.filter`) """
+        before_key: int = MAX_KEY if before is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before))
+        after_key: int = MIN_KEY if after is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after))
+        return self._query('start_key BETWEEN ? AND ?', (after_key, before_key))
+
+    def overlapping(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range returning data as an iterable """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._query('start_key <= ? AND end_key >= ?', (end, start))
+
+    def active_at(self, point: Union[date, datetime, str]) -> Iterable[SimpleTimelineItem]:
+        """ items active at a point in time returning data as an iterable """
+        start, end = IntervalIndex.point_keys(point)
+        return self._query('start_key <= ? AND end_key >= ?', (end, start))
+
+    def contained_in(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items contained in an item or a (start, end) range returning data as an iterable """
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._query('start_key >= ? AND end_key <= ?', (start, end))
+
+    def tag_filter(self, tags: Union[str, list, None], one_of: bool = False,
+                   exclude: Union[str, list, None] = None) -> Iterable[TimelineItem]:
+        """ filter on the presence (and absence) of tags returning data as an iterable (as `Timeline.tag_filter`) """
+        if isinstance(tags, str):
+            tags = [tags]
+        if isinstance(exclude, str):
+            exclude = [exclude]
+        wanted: List[int] = sorted({self._tag_codes[tag] for tag in tags or () if tag in self._tag_codes})
+        clauses: List[str] = list()
+        params: list = list()
+        if tags and not one_of and len(wanted) < len(set(tags)) or one_of and not wanted:
+            return iter(())  # a tag that no item has, or one of no tags
+        if tags:
+            marks: str = ', '.join('?' * len(wanted))
+            having: str = '' if one_of else ' GROUP BY item HAVING COUNT(*) = ?'
+            clauses.append(f'id IN (SELECT item FROM item_tags WHERE tag IN ({marks}){having})')
+            params.extend(wanted if one_of else wanted + [len(wanted)])
+        excluded: List[int] = [self._tag_codes[tag] for tag in exclude or () if tag in self._tag_codes]
+        if excluded:
+            clauses.append(f'id NOT IN (SELECT item FROM item_tags WHERE tag IN ({", ".join("?" * len(excluded))}))')
+            params.extend(excluded)
+        return self._query(' AND '.join(clauses) or '1', tuple(params))
+
+    def class_filter(self, cls) -> Iterable[TimelineItem]:
+        """ filter the timeline on the basis of the class returning data as an iterable """
+        codes: List[int] = [code for code, table_cls in self._class_table.items() if issubclass(table_cls, cls)]
+        return self._query(f'class IN ({", ".join("?" * len(codes))})', tuple(codes))
+
+    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]]) -> Iterable[TimelineItem]:
+        """ Filter on data by means of function returning data as an iterable """
+        return (item for item in self._select('1 ORDER BY start_key, id', (), False) if func(item))
+
+    # :class SqliteTimeline
+
+
+# EOF
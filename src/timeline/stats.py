@@ -0,0 +1,69 @@
+""" The TimelineStats class - opt-in instrumentation of timeline operations """
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Union
+
+from timeline.timeline_item import SimpleTimelineItem
+
+
+class TimelineStats:
+    """ Call counts, items scanned and yielded and cumulative wall time per operation of a timeline
+
+        Enabled with `Timeline.instrument()`. Eager operations (append, sort, to_list, ...) are recorded when they
+        return, lazy ones (filter, tag_filter, data_filter, queries) when their iterable is exhausted or closed;
+        the time is the time spent producing the items, not the time the caller spends between them. An
+        iterable that is never iterated is not recorded.
+
+        The hook, if any, is called as hook(operation, scanned, yielded, seconds) after every recording, e.g.
+        to export the numbers to a metrics system.
+    """
+
+    def __init__(self, hook: Union[Callable[[str, int, int, float], None], None] = None):
+        self.hook: Union[Callable[[str, int, int, float], None], None] = hook
+        self._operations: Dict[str, list] = dict()  # operation -> [calls, scanned, yielded, seconds]
+
+    def record(self, operation: str, scanned: int, yielded: int, seconds: float):
+        """ add a call of an operation """
+        entry: Union[list, None] = self._operations.get(operation)
+        if entry is None:
+            entry = self._operations[operation] = [0, 0, 0, 0.0]
+        entry[0] += 1
+        entry[1] += scanned
+        entry[2] += yielded
+        entry[3] += seconds
+        if self.hook is not None:
+            self.hook(operation, scanned, yielded, seconds)
+
+    def track(self, operation: str, items: Iterable[SimpleTimelineItem], scanned: Union[int, None] = None) \
+            -> Iterable[SimpleTimelineItem]:
+        """ pass on the items of a lazy operation counting and timing them (scanned is the yielded if None) """
+        iterator = iter(items)
+        yielded: int = 0
+        seconds: float = 0.0
+        try:
+            while True:
+                started: float = perf_counter()
+                try:
+                    item: SimpleTimelineItem = next(iterator)
+                except StopIteration:
+                    seconds += perf_counter() - started
+                    return
+                seconds += perf_counter() - started
+                yielded += 1
+                yield item
+        finally:
+            self.record(operation, yielded if scanned is None else scanned, yielded, seconds)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """ the numbers so far: operation -> calls, scanned, yielded, seconds and selectivity (yielded/scanned) """
+        return {operation: {'calls': calls, 'scanned': scanned, 'yielded': yielded, 'seconds': seconds,
+                            'selectivity': yielded / scanned if scanned else None}
+                for operation, (calls, scanned, yielded, seconds) in self._operations.items()}
+
+    def reset(self):
+        """ forget the numbers so far """
+        self._operations = dict()
+
+    # :class TimelineStats
+
+
+# EOF
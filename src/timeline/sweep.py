@@ -0,0 +1,369 @@
+""" Sweep-line algorithms over timeline items """
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from heapq import heappush, heappop
+from typing import Callable, Iterable, List, Tuple, Union
+
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, MIN_KEY, MAX_KEY, _TICKS_PER_DAY
+
+
+def keyed(items: Iterable[SimpleTimelineItem]) -> List[Tuple[int, int, SimpleTimelineItem]]:
+    """ (start key, end key, item) for the items sorted on the start key """
+    result: List[Tuple[int, int, SimpleTimelineItem]] = [(item._start_key, item._end_key, item) for item in items]
+    result.sort(key=lambda entry: entry[0])
+    return result
+
+
+def _sweep(lefts: list, rights: list) -> Iterable[tuple]:
+    """ every pair of keyed left and right entries that overlap
+
+        Both sides are swept in order of start. The entries that have started and not yet ended are kept in a
+        heap on their end, so an entry starting pairs only with the active entries of the other side.
+    """
+    active: Tuple[list, list] = ([], [])  # heaps of (end key, sequence, entry) for left and right
+    i = j = 0
+    while i < len(lefts) or j < len(rights):
+        if j >= len(rights) or (i < len(lefts) and lefts[i][0] <= rights[j][0]):
+            side, entry, sequence = 0, lefts[i], i
+            i += 1
+        else:
+            side, entry, sequence = 1, rights[j], j
+            j += 1
+        others: list = active[1 - side]
+        while others and others[0][0] < entry[0]:  # ended before this starts
+            heappop(others)
+        for _, _, other in others:
+            yield (entry, other) if side == 0 else (other, entry)
+        heappush(active[side], (entry[1], sequence, entry))
+
+
+def overlap_join(left: Iterable[SimpleTimelineItem], right: Iterable[SimpleTimelineItem],
+                 predicate: Union[Callable[[SimpleTimelineItem, SimpleTimelineItem], bool], None] = None) \
+        -> Iterable[Tuple[SimpleTimelineItem, SimpleTimelineItem]]:
+    """ every pair (a, b) of a left and a right item that overlap in O((n+m) log(n+m) + k)
+
+        None is indefinite as in `SimpleTimelineItem.overlap()`. The predicate further filters the pairs.
+    """
+    for (_, _, a), (_, _, b) in _sweep(keyed(left), keyed(right)):
+        if predicate is None or predicate(a, b):
+            yield a, b
+
+
+def contains_join(left: Iterable[SimpleTimelineItem], right: Iterable[SimpleTimelineItem]) \
+        -> Iterable[Tuple[SimpleTimelineItem, SimpleTimelineItem]]:
+    """ every pair (a, b) where the left item a contains the right item b (see `SimpleTimelineItem.contains()`)
+
+        Containment implies overlap, so these are the overlapping pairs checked on their keys.
+    """
+    for (a_start, a_end, a), (b_start, b_end, b) in _sweep(keyed(left), keyed(right)):
+        if a_start <= b_start and b_end <= a_end:
+            yield a, b
+
+
+def adjacent_join(left: Iterable[SimpleTimelineItem], right: Iterable[SimpleTimelineItem]) \
+        -> Iterable[Tuple[SimpleTimelineItem, SimpleTimelineItem]]:
+    """ every pair (a, b) where the right item b starts the day after the left item a ends (`adjacent()`)
+
+        A hash join on the day of the start, so it runs in O(n + m + k).
+    """
+    starting: dict = dict()  # day ordinal -> right items starting that day
+    for item in right:
+        if item.start is not None:
+            starting.setdefault(item.start.toordinal(), []).append(item)
+    for item in left:
+        if item.end is not None:
+            for other in starting.get(item.end.toordinal() + 1, ()):
+                yield item, other
+
+
+def _fold(items: List[SimpleTimelineItem], start, end) -> SimpleTimelineItem:
+    """ a new item from start to end holding the data and tags of the items folded as `TimelineItem.merge()` """
+    payloads: List[TimelineItem] = [item for item in items if isinstance(item, TimelineItem)]
+    if not payloads:
+        return type(items[0])._build(start, end)
+    first: TimelineItem = payloads[0]
+    data = list(first.data) if type(first.data) is list else first.data  # never change the data of the source
+    tags: frozenset = first.tags
+    for item in payloads[1:]:
+        tags = tags.union(item.tags)
+        if type(data) is list:
+            if type(item.data) is list:
+                data.extend(item.data)
+            else:
+                data.append(item.data)
+        else:
+            data = [data, item.data]
+    return type(first)._build(start, end, data, TimelineItem.intern_tags(tags))
+
+
+def dedupe_sorted(items: Iterable[SimpleTimelineItem]) -> Iterable[SimpleTimelineItem]:
+    """ fold the items with the same start and end (`same()`) of items sorted on start, streaming
+
+        Only the items with the current start key are held. Folded items are new as in `coalesce`.
+    """
+    group: dict = dict()  # (start, end) -> items of the current start key
+    group_key: Union[int, None] = None
+    for item in items:
+        if item._start_key != group_key:
+            for (start, end), same in group.items():
+                yield same[0] if len(same) == 1 else _fold(same, start, end)
+            group = dict()
+            group_key = item._start_key
+        group.setdefault((item.start, item.end), []).append(item)
+    for (start, end), same in group.items():
+        yield same[0] if len(same) == 1 else _fold(same, start, end)
+
+
+def coalesce(items: Iterable[SimpleTimelineItem], span: Union[str, None] = None) -> List[SimpleTimelineItem]:
+    """ fold items with the same start and end (`same()`), optionally collapsing runs into spanning items
+
+        Items with the same start and end are grouped by hashing and folded into one new item with tags united
+        and data collected in a list as `TimelineItem.merge()` does. With span='overlap' runs of overlapping
+        items, and with span='adjacent' runs of overlapping or `adjacent()` items, become one item from the
+        first start to the last end. Items that are not folded are kept as they are; the source items are
+        never changed. Runs in O(n log n).
+    """
+    if span not in (None, 'overlap', 'adjacent'):
+        raise ValueError("coalesce: span must be None, 'overlap' or 'adjacent'")
+    groups: dict = dict()  # (start, end) -> items, equal keys exactly when same() is True
+    for item in items:
+        groups.setdefault((item.start, item.end), []).append(item)
+    result: List[SimpleTimelineItem] = [group[0] if len(group) == 1 else _fold(group, start, end)
+                                        for (start, end), group in groups.items()]
+    if span is None:
+        return result
+    spans: List[SimpleTimelineItem] = list()
+    run: List[SimpleTimelineItem] = list()
+    run_end_key: int = MIN_KEY
+    run_end = None
+    for start_key, end_key, item in keyed(result):
+        joins: bool = bool(run) and start_key <= run_end_key
+        if run and not joins and span == 'adjacent' and item.start is not None:
+            joins = run_end.toordinal() + 1 == item.start.toordinal()
+        if not joins and run:
+            spans.append(run[0] if len(run) == 1 else _fold(run, run[0].start, run_end))
+            run = list()
+        if not run or end_key > run_end_key:
+            run_end_key, run_end = end_key, item.end
+        run.append(item)
+    if run:
+        spans.append(run[0] if len(run) == 1 else _fold(run, run[0].start, run_end))
+    return spans
+
+
+def _day_adjacent(end, start) -> bool:
+    """ does start fall on the day after end (as `adjacent()`)? """
+    return end is not None and start is not None and end.toordinal() + 1 == start.toordinal()
+
+
+def runs(items: Iterable[SimpleTimelineItem], adjacent: bool = False) -> List[list]:
+    """ the union of the items as [start key, end key, start, end] runs in order, in one sorted sweep
+
+        Overlapping items (as `overlap()`, None is unbounded) form one run; with adjacent also items starting
+        the day after the run ends (as `adjacent()`).
+    """
+    result: List[list] = list()
+    for start_key, end_key, item in keyed(items):
+        if result and (start_key <= result[-1][1] or adjacent and _day_adjacent(result[-1][3], item.start)):
+            run: list = result[-1]
+            if end_key > run[1]:
+                run[1], run[3] = end_key, item.end
+        else:
+            result.append([start_key, end_key, item.start, item.end])
+    return result
+
+
+def union(items: Iterable[SimpleTimelineItem], adjacent: bool = False) -> List[SimpleTimelineItem]:
+    """ SimpleTimelineItems covering the union of the items in O(n log n) (see `runs`) """
+    return [SimpleTimelineItem._build(start, end, start_key, end_key) for start_key, end_key, start, end
+            in runs(items, adjacent)]
+
+
+def _bound(point, key: int, covered: bool, step: int) -> tuple:
+    """ (point, key, is the point itself covered) of a gap bound next to a run end (step 1) or start (step -1)
+
+        A date is a whole day, so the gap starts the day after a run ends and ends the day before one starts.
+    """
+    if covered and type(point) is date:
+        return point + timedelta(days=step), key + step * _TICKS_PER_DAY, False
+    return point, key, covered
+
+
+def _stop(point, key: int) -> int:
+    """ the key where the time covered up to an end stops: the end of the day for a date """
+    return key + _TICKS_PER_DAY if type(point) is date else key
+
+
+def _spans(items: Iterable[SimpleTimelineItem], adjacent: bool = False) -> List[list]:
+    """ the runs of `runs` as [start key, end key, start, end, stop key], joined where a date end covers the
+        start of the next run (e.g. an item starting at noon on the last day of the run before)
+    """
+    result: List[list] = list()
+    for start_key, end_key, start, end in runs(items, adjacent):
+        stop: int = _stop(end, end_key)
+        if result and start_key <= result[-1][4]:
+            if stop > result[-1][4]:
+                result[-1][1:] = [end_key, result[-1][2], end, stop]
+        else:
+            result.append([start_key, end_key, start, end, stop])
+    return result
+
+
+def gaps(items: Iterable[SimpleTimelineItem], within=None, adjacent: bool = False) -> List[SimpleTimelineItem]:
+    """ SimpleTimelineItems for the time not covered by any item, between the runs of `runs`
+
+        The runs are measured as in `coverage`: a run ending on a date covers its whole day, and so the gaps
+        and the coverage within a range add up to the range.
+
+        Without within only the gaps between runs are found; within (an item or a (start, end) range, None
+        unbounded) also gives the gaps from its start to the first run and from the last run to its end, and
+        clips the rest. Gaps next to a date are whole days, next to a datetime they run from end to start; a
+        gap ending where a day ends after it started at a datetime ends at the next midnight.
+    """
+    found: List[SimpleTimelineItem] = list()
+    lo, hi = MIN_KEY, MAX_KEY  # the start key and the stop key (see _stop) of within
+    previous: Union[tuple, None] = None  # (point, key, covered) where the next gap may start
+    if within is not None:
+        window: SimpleTimelineItem = within if isinstance(within, SimpleTimelineItem) else \
+            SimpleTimelineItem(*within)
+        lo, hi = window.start_key, _stop(window.end, window.end_key)
+        previous = (window.start, lo, False)
+
+    def add_gap(first: tuple, last: tuple):
+        start, start_key, start_covered = _bound(*first, 1)
+        end, end_key, end_covered = _bound(*last, -1)
+        stop: int = _stop(end, end_key)
+        if start_key < stop or start_key == stop and not start_covered and not end_covered:
+            if end_key < start_key:  # a datetime start on the day of a date end
+                end, end_key = datetime.combine(end + timedelta(days=1), time()), stop
+            found.append(SimpleTimelineItem._build(start, end, start_key, end_key))
+
+    for start_key, end_key, start, end, stop in _spans(items, adjacent):
+        if stop < lo or start_key > hi:
+            continue
+        if previous is not None and start_key > lo:
+            add_gap(previous, (start, start_key, True))
+        previous = (end, end_key, True)
+        if stop >= hi:
+            return found
+    if within is not None and previous is not None:
+        add_gap(previous, (window.end, window.end_key, False))
+    return found
+
+
+def coverage(items: Iterable[SimpleTimelineItem], within=None, adjacent: bool = False) -> timedelta:
+    """ total time covered by the union of the items (clipped to within), measured like the `gaps`
+
+        A date covers its whole day, so a run ending on a date covers through the end of that day, and the
+        coverage and the gaps within a range add up to the range. Raises ValueError when the covered time is
+        unbounded.
+    """
+    lo, hi = MIN_KEY, MAX_KEY
+    if within is not None:
+        window: SimpleTimelineItem = within if isinstance(within, SimpleTimelineItem) else \
+            SimpleTimelineItem(*within)
+        lo, hi = window.start_key, _stop(window.end, window.end_key)
+    total: int = 0
+    for start_key, _, _, _, stop in _spans(items, adjacent):
+        start_key, stop = max(start_key, lo), min(stop, hi)
+        if start_key >= stop:
+            continue
+        if start_key == MIN_KEY or stop == MAX_KEY:
+            raise ValueError('coverage: the covered time is unbounded, give a bounded within')
+        total += stop - start_key
+    return timedelta(microseconds=total)
+
+
+def chains(items: Iterable[SimpleTimelineItem], predicate: str = 'adjacent', min_length: int = 2) \
+        -> List[List[SimpleTimelineItem]]:
+    """ groups of at least min_length items linked one to the next by `adjacent()` or `overlap()`, in O(n log n)
+
+        With predicate='adjacent' an item links to the items starting the day after it ends (found by hashing
+        the day of the start), with 'overlap' to the items it overlaps (found in a sweep in order of start).
+        Linked items are joined into one chain by union-find, so a chain may branch where several items start
+        on the same day. Each chain is a list of the items in order of start; the chains come in order of their
+        first start.
+    """
+    if predicate not in ('adjacent', 'overlap'):
+        raise ValueError("chains: predicate must be 'adjacent' or 'overlap'")
+    ordered: List[SimpleTimelineItem] = [item for _, _, item in keyed(items)]
+    parent: List[int] = list(range(len(ordered)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def link(i: int, j: int):
+        parent[find(j)] = find(i)
+
+    if predicate == 'adjacent':
+        starting: dict = dict()  # day ordinal -> positions of the items starting that day
+        for j, item in enumerate(ordered):
+            if item.start is not None:
+                starting.setdefault(item.start.toordinal(), []).append(j)
+        joined: set = set()  # days whose starting items are already in one chain
+        for i, item in enumerate(ordered):
+            if item.end is None:
+                continue
+            day: int = item.end.toordinal() + 1
+            following: List[int] = starting.get(day, ())
+            if following:
+                link(i, following[0])
+                if day not in joined:
+                    joined.add(day)
+                    for j in following[1:]:
+                        link(i, j)
+    else:
+        head, reach = 0, MIN_KEY  # the first item and the latest end of the current run of overlapping items
+        for i, item in enumerate(ordered):
+            if i and item._start_key <= reach:
+                link(head, i)
+            else:
+                head, reach = i, MIN_KEY
+            reach = max(reach, item._end_key)
+    groups: dict = dict()  # root -> chain, in order of the first item of each chain
+    for i, item in enumerate(ordered):
+        groups.setdefault(find(i), []).append(item)
+    return [chain for chain in groups.values() if len(chain) >= min_length]
+
+
+def sequences(items: Iterable[SimpleTimelineItem], tags: List[str], within: Union[timedelta, None] = None) \
+        -> List[List[SimpleTimelineItem]]:
+    """ the matches of items tagged tags[0], then tags[1] and so on, each starting at most within after the last
+
+        Every item with the first tag starts a match; each next step is the first item with the next tag that
+        starts at or after the end of the previous one (gap-tolerant: any gap up to within, or any gap if None).
+        Matches that cannot be completed are left out. The items of every tag are kept sorted on start and
+        looked up by binary search, so it runs in O(n log n) for a fixed number of tags.
+    """
+    if not tags:
+        raise ValueError('sequences: give at least one tag')
+    limit: int = MAX_KEY if within is None else within // timedelta(microseconds=1)
+    starts: dict = {tag: ([], []) for tag in tags}  # tag -> (start keys, items) in order of start
+    for start_key, _, item in keyed(items):
+        for tag in getattr(item, 'tags', ()):
+            if tag in starts:
+                starts[tag][0].append(start_key)
+                starts[tag][1].append(item)
+    result: List[List[SimpleTimelineItem]] = list()
+    for first in starts[tags[0]][1]:
+        match: List[SimpleTimelineItem] = [first]
+        for tag in tags[1:]:
+            keys, candidates = starts[tag]
+            previous: SimpleTimelineItem = match[-1]
+            if previous._end_key == MAX_KEY:
+                break
+            position: int = bisect_left(keys, previous._end_key)
+            while position < len(keys) and any(candidates[position] is item for item in match):
+                position += 1
+            if position == len(keys) or keys[position] - previous._end_key > limit:
+                break
+            match.append(candidates[position])
+        if len(match) == len(tags):
+            result.append(match)
+    return result
+
+
+# EOF
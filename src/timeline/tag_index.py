@@ -0,0 +1,96 @@
+""" The TagIndex class """
+from typing import Union, Iterable, Dict, Set
+
+from timeline.timeline_item import SimpleTimelineItem, ItemChanges
+
+
+class TagIndex:
+    """ Inverted index from tag to the positions of the items carrying it
+
+        Tag queries become set algebra on the posting sets: all-of is an intersection, one-of is a union
+        and excluded tags are a difference. Positions refer to the order of the timeline when the index was
+        built, so the owner must drop the index when the items are reordered. Given the `ItemChanges` its items
+        report to, changes made on them after they were indexed (by `TimelineItem.add_tag` or `merge`) make the
+        index `stale`; the owner rebuilds it.
+    """
+
+    _EMPTY: Set[int] = frozenset()
+
+    def __init__(self, items: Iterable[SimpleTimelineItem] = (), changes: Union[ItemChanges, None] = None):
+        self._postings: Dict[str, Set[int]] = dict()
+        self._size: int = 0
+        self._changes: Union[ItemChanges, None] = changes
+        self._seen: int = 0 if changes is None else changes.count  # the changes included in the index
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        """ number of items indexed """
+        return self._size
+
+    @property
+    def tags(self) -> Set[str]:
+        """ the distinct tags in the index """
+        return set(self._postings)
+
+    @property
+    def stale(self) -> bool:
+        """ have the items been changed since the index was built or marked current? """
+        return self._changes is not None and self._seen != self._changes.count
+
+    def mark_current(self):
+        """ record that the index includes the changes made so far """
+        if self._changes is not None:
+            self._seen = self._changes.count
+
+    def add(self, item: SimpleTimelineItem):
+        """ index the next item (at position len(self)); items without tags only take up the position """
+        position: int = self._size
+        self._size += 1
+        for tag in getattr(item, 'tags', ()):
+            self.add_tag(position, tag)
+
+    def add_tag(self, position: int, tag: str):
+        """ record that the item at position has got a tag """
+        postings: Union[Set[int], None] = self._postings.get(tag)
+        if postings is None:
+            self._postings[tag] = {position}
+        else:
+            postings.add(position)
+
+    def positions(self, tag: str) -> Set[int]:
+        """ positions of the items with a tag (do not modify the result) """
+        return self._postings.get(tag, TagIndex._EMPTY)
+
+    def query(self, tags: Union[str, list, None], one_of: bool = False,
+              exclude: Union[str, list, None] = None) -> Union[Set[int], None]:
+        """ positions of the items matching the tags, or None if every position matches
+
+            all-of (default) intersects the posting sets starting from the smallest, one-of takes their union
+            and the postings of the excluded tags are subtracted. No tags means every item.
+        """
+        if isinstance(tags, str):
+            tags = [tags]
+        if isinstance(exclude, str):
+            exclude = [exclude]
+        result: Union[Set[int], None] = None
+        if tags and one_of:
+            result = set().union(*(self.positions(tag) for tag in tags))
+        elif tags:
+            postings: list = sorted((self.positions(tag) for tag in tags), key=len)
+            result = set(postings[0])
+            result.intersection_update(*postings[1:])
+        elif one_of:
+            result = set()  # one of no tags matches nothing
+        if exclude:
+            excluded: Set[int] = set().union(*(self.positions(tag) for tag in exclude))
+            if result is None:
+                result = set(range(self._size)).difference(excluded)
+            else:
+                result.difference_update(excluded)
+        return result
+
+    # :class TagIndex
+
+
+# EOF
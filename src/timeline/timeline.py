@@ -1,14 +1,36 @@
 """ The timeline class """
-from datetime import date, datetime
-from typing import Union, Callable, Iterable
+import gzip
+import heapq
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+from time import perf_counter
+from typing import Union, Callable, Iterable, Sequence, Any, Dict
 
-from timeline import timeline_item
-from timeline.timeline_item import SimpleTimelineItem, TimelineItem
+from timeline import aggregate, sweep, timeline_item
+from timeline.cursor import Cursor, nearest
+from timeline.ingest import AsyncIngestor
+from timeline.interval_index import IntervalIndex
+from timeline.query import Query
+from timeline.stats import TimelineStats
+from timeline.tag_index import TagIndex
+from timeline.timeline_item import SimpleTimelineItem, TimelineItem, ItemChanges, MIN_KEY, MAX_KEY
+from timeline.view import TimelineView
+
+
+def _filter_chunk(func: Callable[[SimpleTimelineItem], bool], items: list) -> list:
+    """ positions in a chunk of the items func accepts (module level so a process pool can pickle it) """
+    return [position for position, item in enumerate(items) if func(item)]
 
 
 class Timeline:
     """ Timeline class """
 
+    PARSE_CACHE_LIMIT: int = 1 << 16  # distinct date strings remembered by the bulk parser
+
     @staticmethod
     def from_list(serialised: list):  # -> Timeline
         """ de-serialise from a list of TimelineItems """
@@ -17,9 +39,188 @@ class Timeline:
             if 'type' in item:  # this code uses the right class from the name stored in serialisation
                 tli: SimpleTimelineItem = getattr(timeline_item, item['type'])
                 result.append(tli.from_dict(item))
+        return result
+
+    @staticmethod
+    def _bulk_parser() -> Callable:
+        """ a parser for bulk loading: repeated strings are parsed once and the key comes along for validation """
+        cache: dict = dict()
+
+        def parse(d: Union[date, datetime, str, None]) -> tuple:
+            if d is None:
+                return None, None
+            parsed: Union[tuple, None] = cache.get(d) if type(d) is str else None
+            if parsed is None:
+                value = SimpleTimelineItem._type_formatter(d)
+                parsed = (value, SimpleTimelineItem.point_key(value) if value else None)
+                if type(d) is str:
+                    if len(cache) >= Timeline.PARSE_CACHE_LIMIT:  # keep memory bounded when streaming
+                        cache.clear()
+                    cache[d] = parsed
+            return parsed
+        return parse
+
+    @staticmethod
+    def _bulk_timeline(items: list):  # -> Timeline
+        """ wrap a list of items in a timeline in one pass """
+        result: Timeline = Timeline()
+        result._replace(items)
+        return result
+
+    @staticmethod
+    def from_records(records: Iterable[dict]):  # -> Timeline
+        """ bulk de-serialise dicts as written by to_dict / to_list
+
+            Start and end may be named start/end or _start/_end. Without a type a record with data or tags is
+            a TimelineItem. Each distinct date string is parsed once and start <= end is checked on keys.
+        """
+        return Timeline._bulk_timeline(list(Timeline._iter_records(records)))
+
+    @staticmethod
+    def _iter_records(records: Iterable[dict]) -> Iterable[SimpleTimelineItem]:
+        """ create the items of from_records one by one """
+        parse: Callable = Timeline._bulk_parser()
+        classes: dict = dict()  # type name -> (class, is it a TimelineItem)
+        intern_tags: Callable = TimelineItem.intern_tags
+        for position, record in enumerate(records):
+            name: str = record.get('type') or \
+                (TimelineItem.__name__ if 'data' in record or 'tags' in record else SimpleTimelineItem.__name__)
+            if name not in classes:
+                cls = getattr(timeline_item, name)
+                classes[name] = (cls, issubclass(cls, TimelineItem))
+            cls, is_item = classes[name]
+            start, start_key = parse(record['start'] if 'start' in record else record['_start'])
+            end, end_key = parse(record['end'] if 'end' in record else record['_end'])
+            if start_key is not None and end_key is not None and start_key > end_key:
+                raise ValueError(f'from_records: record {position} ends before it starts')
+            if is_item:
+                tags = record.get('tags')
+                yield cls._build(start, end, record.get('data'),
+                                 intern_tags((tags,) if type(tags) is str else tags or ()), start_key, end_key)
+            else:
+                yield cls._build(start, end, start_key, end_key)
+
+    @staticmethod
+    def _json_default(o: Any):
+        """ JSON encoding of the values in to_dict that json does not know """
+        if isinstance(o, (date, datetime)):
+            return o.isoformat()
+        if isinstance(o, (set, frozenset)):
+            return list(o)
+        raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
+
+    @staticmethod
+    def _open_jsonl(fp, mode: str, compress: Union[bool, None]):
+        """ open a path (gzip if it ends with .gz or starts with the gzip magic) or wrap a file object """
+        if isinstance(fp, (str, bytes, os.PathLike)):
+            if compress is None and mode == 'r':
+                with open(fp, 'rb') as f:
+                    compress = f.read(2) == b'\x1f\x8b'
+            elif compress is None:
+                path = os.fspath(fp)
+                compress = path.endswith('.gz' if isinstance(path, str) else b'.gz')
+            return gzip.open(fp, mode + 't', encoding='utf-8') if compress else open(fp, mode, encoding='utf-8')
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=fp, mode=mode + 'b'), encoding='utf-8')
+        return None
+
+    def dump_jsonl(self, fp, compress: Union[bool, None] = None):
+        """ stream the items as JSON Lines (one to_dict per line) to a path or a text/binary file object
+
+            Dates are written in iso format and tags as lists. Paths ending with .gz are gzip compressed
+            unless compress says otherwise; for a file object compress must be given to get gzip.
+            Items are written in the order of the timeline. The data must be JSON serialisable.
+        """
+        started: float = perf_counter() if self._stats is not None else 0.0
+        f = Timeline._open_jsonl(fp, 'w', compress)
+        out = f if f is not None else fp
+        binary: bool = f is None and not isinstance(fp, io.TextIOBase)
+        try:
+            for item in self._timeline:
+                line: str = json.dumps(item.to_dict(), default=Timeline._json_default) + '\n'
+                out.write(line.encode('utf-8') if binary else line)
+        finally:
+            if f is not None:
+                f.close()
+        if self._stats is not None:
+            self._stats.record('dump_jsonl', len(self._timeline), len(self._timeline), perf_counter() - started)
+
+    @staticmethod
+    def iter_jsonl(fp, compress: Union[bool, None] = None) -> Iterable[SimpleTimelineItem]:
+        """ stream the items from JSON Lines written by dump_jsonl (a path or a file object)
+
+            A gzip compressed path is recognised by itself; for a file object compress must be given.
+        """
+        f = Timeline._open_jsonl(fp, 'r', compress)
+        try:
+            lines = f if f is not None else fp
+            yield from Timeline._iter_records(json.loads(line) for line in lines if line.strip())
+        finally:
+            if f is not None:
+                f.close()
+
+    @staticmethod
+    def load_jsonl(fp, compress: Union[bool, None] = None):  # -> Timeline
+        """ load a timeline from JSON Lines written by dump_jsonl """
+        return Timeline._bulk_timeline(list(Timeline.iter_jsonl(fp, compress=compress)))
+
+    @staticmethod
+    def from_columns(starts: Sequence, ends: Sequence, data: Union[Sequence, None] = None,
+                     tags: Union[Sequence, None] = None):  # -> Timeline
+        """ bulk create a timeline from columns of starts, ends and optionally data and tags
+
+            The items are TimelineItems when data or tags are given, otherwise SimpleTimelineItems.
+        """
+        if len(starts) != len(ends) or (data is not None and len(data) != len(starts)) or \
+                (tags is not None and len(tags) != len(starts)):
+            raise ValueError('from_columns: columns must have the same length')
+        parse: Callable = Timeline._bulk_parser()
+        starts = [parse(start) for start in starts]
+        ends = [parse(end) for end in ends]
+        for position, ((_, start_key), (_, end_key)) in enumerate(zip(starts, ends)):
+            if start_key is not None and end_key is not None and start_key > end_key:
+                raise ValueError(f'from_columns: item {position} ends before it starts')
+        if data is None and tags is None:
+            build = SimpleTimelineItem._build
+            return Timeline._bulk_timeline([build(start, end, start_key, end_key)
+                                            for (start, start_key), (end, end_key) in zip(starts, ends)])
+        data = data if data is not None else [None] * len(starts)
+        tags = [TimelineItem.intern_tags((tag,) if type(tag) is str else tag or ()) for tag in tags] \
+            if tags is not None else [TimelineItem.intern_tags(())] * len(starts)
+        build = TimelineItem._build
+        return Timeline._bulk_timeline([build(start, end, payload, tag, start_key, end_key)
+                                        for (start, start_key), (end, end_key), payload, tag
+                                        in zip(starts, ends, data, tags)])
+
+    @staticmethod
+    def from_numpy(columns: Dict[str, Any]):  # -> Timeline
+        """ create a timeline from arrays as written by `to_numpy` """
+        from timeline.columnar import ColumnarTimeline
+        return ColumnarTimeline.from_numpy(columns).to_timeline()
 
-    def __init__(self):
+    @staticmethod
+    def from_pandas(frame):  # -> Timeline
+        """ create a timeline from a DataFrame as written by `to_pandas` """
+        from timeline.columnar import ColumnarTimeline
+        return ColumnarTimeline.from_pandas(frame).to_timeline()
+
+    @staticmethod
+    def from_arrow(table, allow_pickle: bool = False):  # -> Timeline
+        """ create a timeline from an Arrow table as written by `to_arrow` (pickled data need allow_pickle) """
+        from timeline.columnar import ColumnarTimeline
+        return ColumnarTimeline.from_arrow(table, allow_pickle=allow_pickle).to_timeline()
+
+    def __init__(self, interval_index: bool = False):
+        """ Set up an empty timeline, optionally maintaining an interval index for overlap queries """
         self._timeline: [SimpleTimelineItem] = list()
+        self._interval_index: Union[IntervalIndex, None] = IntervalIndex() if interval_index else None
+        self._sorted: bool = True  # is _timeline known to be in ascending order of start?
+        self._tag_index: Union[TagIndex, None] = None  # built by the first tag_filter
+        self._stats: Union[TimelineStats, None] = None  # set by instrument
+        self._views: Dict[str, TimelineView] = dict()  # name -> view, see create_view
+        self._changes: Union[ItemChanges, None] = None  # the changes of the items, see _watched
+        self._ends: Union[list, None] = None  # the items in order of end, built by the first nearest
+        self._ends_sorted: bool = True  # False when items have been added to _ends since it was sorted
 
     def __getitem__(self, item: int) -> SimpleTimelineItem:
         """ get an item from index """
@@ -31,57 +232,544 @@ class Timeline:
 
     @property
     def timeline(self) -> [SimpleTimelineItem]:
+        """ the underlying list of items (changing it directly bypasses the sorted state and the indices) """
         return self._timeline
 
+    @property
+    def is_sorted(self) -> bool:
+        """ is the timeline known to be sorted ascending on start? """
+        return self._sorted
+
+    @property
+    def stats(self) -> Union[TimelineStats, None]:
+        """ the statistics of the operations if instrumented (see `instrument`) """
+        return self._stats
+
+    def instrument(self, hook: Union[Callable[[str, int, int, float], None], None] = None) -> TimelineStats:
+        """ start recording calls, items scanned and yielded and time per operation, optionally calling a hook
+
+            The hook is called as hook(operation, scanned, yielded, seconds). Calling instrument again keeps
+            the numbers and replaces the hook. Returns the statistics (also available as `stats`).
+        """
+        if self._stats is None:
+            self._stats = TimelineStats(hook)
+        else:
+            self._stats.hook = hook
+        return self._stats
+
+    def uninstrument(self):  # -> Timeline
+        """ stop recording and drop the statistics """
+        self._stats = None
+        return self
+
+    @staticmethod
+    def _start_key(item: SimpleTimelineItem) -> int:
+        """ sort key of an item """
+        return item._start_key
+
     def to_list(self) -> list:
         """ convert the timeline to a list """
-        self._timeline.sort()
-        return [item.to_dict() for item in self._timeline]
+        self._ascending()
+        started: float = perf_counter() if self._stats is not None else 0.0
+        result: list = [item.to_dict() for item in self._timeline]
+        if self._stats is not None:
+            self._stats.record('to_list', len(result), len(result), perf_counter() - started)
+        return result
+
+    def _columnar(self):  # -> ColumnarTimeline
+        from timeline.columnar import ColumnarTimeline  # numpy is optional, and columnar imports this module
+        return ColumnarTimeline.from_timeline(self)
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """ the items (in their current order) as NumPy arrays, see `ColumnarTimeline.to_numpy` (needs numpy) """
+        return self._columnar().to_numpy()
+
+    def to_pandas(self):  # -> pandas.DataFrame
+        """ the items as a DataFrame, see `ColumnarTimeline.to_pandas` (needs numpy and pandas) """
+        return self._columnar().to_pandas()
+
+    def to_arrow(self):  # -> pyarrow.Table
+        """ the items as an Arrow table, see `ColumnarTimeline.to_arrow` (needs numpy and pyarrow) """
+        return self._columnar().to_arrow()
 
     def append(self, stl: SimpleTimelineItem):
         """ Append timeline item """
+        started: float = perf_counter() if self._stats is not None else 0.0
+        if self._sorted and self._timeline and Timeline._start_key(stl) < Timeline._start_key(self._timeline[-1]):
+            self._sorted = False
         self._timeline.append(stl)
+        if self._interval_index is not None:
+            self._interval_index.add(stl)
+        if self._tag_index is not None:
+            self._tag_index.add(stl)
+        if self._changes is not None and isinstance(stl, TimelineItem):
+            stl._watch(self._changes)
+        if self._ends is not None:
+            self._ends.append(stl)
+            self._ends_sorted = False
+        if self._views:
+            for view in self._views.values():
+                view.add(stl)
+        if self._stats is not None:
+            self._stats.record('append', 1, 1, perf_counter() - started)
 
     def extend(self, ti):  # ti: Timeline
-        """ extend the timeline with timeline ti """
-        self._timeline.extend(ti.timeline)
+        """ extend the timeline with timeline ti
+
+            When both timelines are sorted the result is kept sorted: the items of ti are merged in (a linear
+            merge of the two runs) instead of concatenated. Otherwise they are added at the end.
+        """
+        started: float = perf_counter() if self._stats is not None else 0.0
+        items: [SimpleTimelineItem] = list(ti.timeline)  # a snapshot, ti may be this timeline
+        source_sorted: bool = getattr(ti, 'is_sorted', False)  # not all sources of items know their order
+        merge: bool = False
+        if self._sorted and items:
+            if self._timeline and Timeline._start_key(items[0]) < Timeline._start_key(self._timeline[-1]):
+                merge = source_sorted
+                self._sorted = merge
+            elif not source_sorted:
+                self._sorted = False
+        self._timeline.extend(items)
+        if merge:  # timsort finds the two sorted runs and merges them in O(n + m)
+            self._timeline.sort(key=attrgetter('_start_key'))
+            self._tag_index = None
+        if self._interval_index is not None:
+            self._interval_index.extend(items)
+        if self._tag_index is not None:
+            for item in items:
+                self._tag_index.add(item)
+        if self._changes is not None:
+            self._watch(items)
+        if self._ends is not None:
+            self._ends.extend(items)
+            self._ends_sorted = False
+        if self._views:
+            for view in self._views.values():
+                view.extend(items, merge)
+        if self._stats is not None:
+            self._stats.record('extend', len(items), len(items), perf_counter() - started)
+
+    @staticmethod
+    def merge_sorted(*timelines, dedupe: bool = False):  # -> Timeline
+        """ a new sorted timeline with the items of the timelines by a streaming heap merge in O(n log k)
+
+            Timelines that are not sorted are merged from a sorted copy. With dedupe the items with the same
+            start and end (`same()`) are folded into new items like `TimelineItem.merge()` along the way; the
+            items of the timelines are never changed.
+        """
+        runs: list = [timeline.timeline if timeline.is_sorted else
+                      sorted(timeline.timeline, key=attrgetter('_start_key')) for timeline in timelines]
+        merged: Iterable[SimpleTimelineItem] = heapq.merge(*runs, key=attrgetter('_start_key'))
+        result: Timeline = Timeline()
+        result._timeline = list(sweep.dedupe_sorted(merged) if dedupe else merged)
+        return result
+
+    def _commit(self, values: list):
+        """ add a batch of items and records (dicts as from to_dict, parsed in bulk) with one extend """
+        if any(isinstance(value, dict) for value in values):
+            parsed = iter(Timeline._iter_records([value for value in values if isinstance(value, dict)]))
+            values = [next(parsed) if isinstance(value, dict) else value for value in values]
+        self.extend(Timeline._bulk_timeline(values))
+
+    async def aextend(self, values, batch_size: int = 1000) -> int:
+        """ add the items or records (dicts as from to_dict) of an async iterable, batch_size at a time
+
+            Each batch is parsed in bulk and committed with one extend, so the sorted state and the indices are
+            updated once per batch and other coroutines never see part of a batch. Returns the number added.
+        """
+        batch: list = list()
+        count: int = 0
+        async for value in values:
+            batch.append(value)
+            if len(batch) >= batch_size:
+                self._commit(batch)
+                count += len(batch)
+                batch = list()
+        if batch:
+            self._commit(batch)
+            count += len(batch)
+        return count
+
+    def ingestor(self, batch_size: int = 1000, max_pending: int = 10000) -> AsyncIngestor:
+        """ an ingestion handle with a buffer of max_pending values committed in batches (see AsyncIngestor)
+
+            Create it inside a running event loop, e.g. `async with timeline.ingestor() as ingest:`.
+        """
+        return AsyncIngestor(self, batch_size=batch_size, max_pending=max_pending)
+
+    def add_tag(self, index: int, tag: str) -> TimelineItem:
+        """ add a tag to the item at index keeping the tag index up to date """
+        item: TimelineItem = self._timeline[index]
+        current: bool = self._tag_index is not None and not self._tag_index.stale
+        item.add_tag(tag)
+        if current:  # only this change is missing from the index
+            self._tag_index.add_tag(index % len(self._timeline), tag)
+            self._tag_index.mark_current()
+        for view in self._views.values():
+            if view.uses_tags:
+                view.invalidate()
+        return item
+
+    def index_intervals(self):  # -> Timeline
+        """ start maintaining an interval index (used by overlapping, active_at and contained_in) """
+        if self._interval_index is None:
+            self._interval_index = IntervalIndex(self._timeline)
+        return self
 
     def sort(self, reverse: bool = False):
-        """ sort the timeline """
-        self._timeline.sort(reverse=reverse)
+        """ sort the timeline
+
+            Always sorts, so changes made directly to `timeline` are picked up; on a sorted list timsort only
+            checks the order in O(n). Read methods that need the order use the sorted state instead.
+        """
+        started: float = perf_counter() if self._stats is not None else 0.0
+        self._timeline.sort(key=attrgetter('_start_key'), reverse=reverse)
+        self._sorted = not reverse or len(self._timeline) < 2
+        self._reordered()
+        if self._stats is not None:
+            self._stats.record('sort', len(self._timeline), len(self._timeline), perf_counter() - started)
         return self
 
+    def _ascending(self):  # -> Timeline
+        """ sort the timeline unless it is known to be sorted """
+        return self if self._sorted else self.sort()
+
+    def _replace(self, items: [SimpleTimelineItem]):
+        """ replace all the items, resetting the sorted state and the indices """
+        self._timeline = items
+        self._sorted = all(Timeline._start_key(items[i - 1]) <= Timeline._start_key(items[i])
+                           for i in range(1, len(items)))
+        if self._interval_index is not None:
+            self._interval_index = IntervalIndex(items)
+        if self._changes is not None:
+            self._watch(items)
+        self._ends = None
+        self._reordered()
+
+    def _watched(self) -> ItemChanges:
+        """ the counter of the changes made by add_tag and merge on the items, set up by the first call """
+        if self._changes is None:
+            self._changes = ItemChanges()
+            self._watch(self._timeline)
+        return self._changes
+
+    def _watch(self, items: Iterable[SimpleTimelineItem]):
+        """ have items report their changes to the counter of the timeline """
+        changes: ItemChanges = self._changes
+        for item in items:
+            if isinstance(item, TimelineItem):
+                item._watch(changes)
+
+    def coalesce(self, span: Union[str, None] = None, inplace: bool = False):  # -> Timeline
+        """ merge items with the same start and end, and with span='overlap' or 'adjacent' runs of items
+
+            Duplicates are found by hashing and folded like `TimelineItem.merge()` into new items. With a span,
+            runs of overlapping (or also adjacent) items become one item covering the run. Returns a new timeline
+            unless inplace, in which case this timeline is changed and returned. The items themselves are never
+            changed. O(n log n).
+        """
+        items: [SimpleTimelineItem] = sweep.coalesce(self._timeline, span=span)
+        if not inplace:
+            return Timeline._bulk_timeline(items)
+        self._replace(items)
+        return self
+
+    def _tagged(self, tags: Union[str, list, None]) -> Iterable[SimpleTimelineItem]:
+        """ all the items, or those having all the tags """
+        return self._timeline if tags is None else self.tag_filter(tags)
+
+    def union(self, adjacent: bool = False, tags: Union[str, list, None] = None):  # -> Timeline
+        """ a new timeline of SimpleTimelineItems covering the union of the items (optionally having the tags)
+
+            Overlapping items form one item (None is unbounded) and with adjacent so do items starting the day
+            after another ends (as `adjacent()`). One sorted sweep, O(n log n).
+        """
+        return Timeline._bulk_timeline(sweep.union(self._tagged(tags), adjacent=adjacent))
+
+    def find_chains(self, predicate: str = 'adjacent', min_length: int = 2,
+                    tags: Union[str, list, None] = None) -> [[SimpleTimelineItem]]:
+        """ the chains of at least min_length items (optionally having the tags) linked one to the next
+
+            With predicate='adjacent' each item is followed by the items starting the day after it ends (as
+            `adjacent()`), e.g. streaks of daily items; with 'overlap' by the items it overlaps. Every chain is
+            a list of the items in order of start. Found by hashing and one sort, O(n log n).
+        """
+        return sweep.chains(self._tagged(tags), predicate=predicate, min_length=min_length)
+
+    def find_sequences(self, tags: [str], within: Union[timedelta, None] = None) -> [[SimpleTimelineItem]]:
+        """ the items tagged tags[0] followed by an item tagged tags[1] (and so on) starting within a timedelta
+
+            Each match is a list with one item per tag, every next item being the first with its tag starting
+            at or after the end of the previous one and at most within later (any gap if None), e.g.
+            `find_sequences(['order', 'refund'], within=timedelta(days=30))`. O(n log n).
+        """
+        return sweep.sequences(self._timeline, tags, within)
+
+    def gaps(self, within=None, adjacent: bool = False, tags: Union[str, list, None] = None):  # -> Timeline
+        """ a new timeline of SimpleTimelineItems for the time no item (optionally having the tags) covers
+
+            Without within the gaps between the items, with within (an item or a (start, end) range) also the
+            gaps at its ends, e.g. `gaps(within=(first, last), tags='on call')` for when nobody was on call.
+            Gaps next to dates are whole days. O(n log n).
+        """
+        return Timeline._bulk_timeline(sweep.gaps(self._tagged(tags), within=within, adjacent=adjacent))
+
+    def coverage(self, within=None, adjacent: bool = False, tags: Union[str, list, None] = None,
+                 by_tag: bool = False) -> Union[timedelta, Dict[str, timedelta]]:
+        """ total time covered by the union of the items (optionally having the tags), clipped to within
+
+            Dates count as whole days as in `gaps`, so coverage and gaps within a range add up to the range.
+            With by_tag a dict from every tag to the coverage of the items having it. Raises ValueError if the
+            covered time is unbounded (an indefinite start or end without a bounded within). O(n log n).
+        """
+        if not by_tag:
+            return sweep.coverage(self._tagged(tags), within=within, adjacent=adjacent)
+        groups: Dict[str, list] = dict()
+        for item in self._tagged(tags):
+            for tag in getattr(item, 'tags', ()):
+                groups.setdefault(tag, []).append(item)
+        return {tag: sweep.coverage(items, within=within, adjacent=adjacent) for tag, items in sorted(groups.items())}
+
+    def occupancy(self, start: Union[date, datetime, str], end: Union[date, datetime, str],
+                  freq: Union[str, timedelta], by_tag: bool = False) -> Union[list, dict]:
+        """ (bucket start, number of active items) per bucket of freq ('hour', 'day', 'week' or a timedelta)
+
+            The buckets run from start through the bucket holding end. With by_tag a dict from tag to the
+            counts of the items having that tag. Open ends are clipped to the range. O(n + buckets).
+        """
+        return aggregate.occupancy(self._timeline, start, end, freq, by_tag=by_tag)
+
+    def transitions(self, start: Union[date, datetime, str], end: Union[date, datetime, str],
+                    freq: Union[str, timedelta]) -> list:
+        """ (bucket start, items starting, items ending) per bucket of freq (see `occupancy`) """
+        return aggregate.transitions(self._timeline, start, end, freq)
+
+    def covered_duration(self, start: Union[date, datetime, str], end: Union[date, datetime, str],
+                         freq: Union[str, timedelta], instant: timedelta = timedelta(0)) -> list:
+        """ (bucket start, timedelta the items cover in total) per bucket of freq (see `occupancy`)
+
+            A date covers its whole day, as in `coverage`; an instant covers the `instant` after it.
+        """
+        return aggregate.covered_duration(self._timeline, start, end, freq, instant=instant)
+
+    def _reordered(self):
+        """ drop the indices that refer to positions after the items have been reordered """
+        self._tag_index = None
+        for view in self._views.values():
+            view.invalidate()
+
+    def _bisect(self, key: int, right: bool = False) -> int:
+        """ position of a start key in the sorted timeline (as bisect_left, or bisect_right if right) """
+        timeline: [SimpleTimelineItem] = self._timeline
+        lo, hi = 0, len(timeline)
+        while lo < hi:
+            mid: int = (lo + hi) // 2
+            mid_key: int = Timeline._start_key(timeline[mid])
+            if mid_key < key or (right and mid_key == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def seek(self, point: Union[date, datetime, str, None] = None) -> Cursor:
+        """ a cursor at a point in time (at the start if None) for paging with `next(n)` and `prev(n)`
+
+            The cursor sits after the items that start before the point (as `before()`) and pages through
+            the timeline in order of start. A timeline that is not sorted is sorted in place first (as `sort()`,
+            which rebuilds the tag index and views when next used). O(log n) to seek, O(k) per page.
+        """
+        return Cursor(self._ascending()._timeline, point)
+
+    def nearest(self, point: Union[date, datetime, str], k: int = 1) -> [SimpleTimelineItem]:
+        """ the k items nearest to a point in time: the items active at it, then the closest by start or end
+
+            Backed by the sorted timeline (a timeline that is not sorted is sorted in place first, as in `seek`)
+            and an index of the items in order of end. The index is built by the first call; added items are
+            collected at its end and merged in by the next call. O(log n + k) apart from finding the items active
+            at the point.
+        """
+        if self._ends is None:
+            self._ends = sorted(self._timeline, key=attrgetter('_end_key'))
+            self._ends_sorted = True
+        elif not self._ends_sorted:  # timsort merges the sorted index with the items added since
+            self._ends.sort(key=attrgetter('_end_key'))
+            self._ends_sorted = True
+        return nearest(self._ascending()._timeline, self._ends, point, k)
+
     def filter(self, before: Union[None, date, datetime] = None, after: Union[None, date, datetime] = None) \
             -> Iterable[TimelineItem]:
-        """ Filter timeline based on date/datetime returning data as an iterable """
-        for item in self._timeline:
-            if before is not None:
-                if item.start > before:
-                    continue
-            if after is not None:
-                if item.start < after:
-                    continue
-            yield item
-
-    def tag_filter(self, tags: Union[str, list], one_of: bool = False) -> Iterable[TimelineItem]:
-        """ filter on the presence of tags returning data as an iterable """
-        item: TimelineItem
-        for item in self._timeline:
-            if item.has_tag(tags, one_of=one_of):
-                yield item
+        """ Filter timeline based on date/datetime returning data as an iterable
 
-    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]]) -> Iterable[TimelineItem]:
-        """ Filter on data by means of function returning data as an iterable """
+            Keeps the items that start at or before `before` and at or after `after`. An indefinite (None)
+            start is earlier than any date. A sorted timeline is sliced by binary search.
+        """
+        items: Iterable[SimpleTimelineItem] = self._filter(before, after)
+        if self._stats is None:
+            return items
+        return self._stats.track('filter', items, None if self._sorted else len(self._timeline))
+
+    def _filter(self, before: Union[None, date, datetime], after: Union[None, date, datetime]) \
+            -> Iterable[SimpleTimelineItem]:
+        before_key: int = MAX_KEY if before is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before))
+        after_key: int = MIN_KEY if after is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after))
+        if self._sorted:
+            lo: int = 0 if after is None else self._bisect(after_key)
+            hi: int = len(self._timeline) if before is None else self._bisect(before_key, right=True)
+            yield from self._timeline[lo:hi]
+            return
         for item in self._timeline:
-            if func(item):
+            key: int = Timeline._start_key(item)
+            if after_key <= key <= before_key:
                 yield item
 
+    def tag_filter(self, tags: Union[str, list, None], one_of: bool = False,
+                   exclude: Union[str, list, None] = None) -> Iterable[TimelineItem]:
+        """ filter on the presence (and absence) of tags returning data as an iterable
+
+            Answered from an inverted tag index that is built by the first call and then kept up to date by
+            append, extend and add_tag. Tags added directly on the items are not seen by the index.
+        """
+        items: Iterable[SimpleTimelineItem] = self._tag_filter(tags, one_of, exclude)
+        if self._stats is None:
+            return items
+        return self._stats.track('tag_filter', items, len(self._timeline) if self._tag_index is None else None)
+
+    def _tag_filter(self, tags: Union[str, list, None], one_of: bool, exclude: Union[str, list, None]) \
+            -> Iterable[SimpleTimelineItem]:
+        positions = self._tag_positions(tags, one_of=one_of, exclude=exclude)
+        if positions is None:
+            yield from self._timeline
+            return
+        timeline: [SimpleTimelineItem] = self._timeline
+        for position in sorted(positions):
+            yield timeline[position]
+
+    def _tag_positions(self, tags: Union[str, list, None], one_of: bool = False,
+                       exclude: Union[str, list, None] = None) -> Union[set, None]:
+        """ positions matching a tag query (None for all) from the tag index, building it if needed """
+        if self._tag_index is None or self._tag_index.stale:
+            self._tag_index = TagIndex(self._timeline, self._watched())
+        return self._tag_index.query(tags, one_of=one_of, exclude=exclude)
+
+    def create_view(self, name: str, before: Union[None, date, datetime, str] = None,
+                    after: Union[None, date, datetime, str] = None, tags: Union[str, list, None] = None,
+                    one_of: bool = False, exclude: Union[str, list, None] = None, cls: Union[type, None] = None,
+                    func: Union[Callable[[SimpleTimelineItem], bool], None] = None,
+                    within: Union[timedelta, None] = None) -> TimelineView:
+        """ register a named view of the items matching the criteria of filter, tag_filter, class_filter and
+            data_filter (and a rolling window `within` of the latest start), replacing a view of that name
+
+            append and extend keep the views up to date, so reading one costs O(size of the view). A view is
+            rebuilt by a scan after the timeline is reordered or, for views on tags or functions, after add_tag.
+        """
+        view: TimelineView = TimelineView(self, name, before=before, after=after, tags=tags, one_of=one_of,
+                                          exclude=exclude, cls=cls, func=func, within=within)
+        self._views[name] = view
+        return view
+
+    def view(self, name: str) -> TimelineView:
+        """ get a view registered by create_view (KeyError if there is none) """
+        return self._views[name]
+
+    def drop_view(self, name: str):
+        """ stop maintaining a view """
+        del self._views[name]
+
+    @property
+    def views(self) -> [str]:
+        """ the names of the views """
+        return list(self._views)
+
+    def query(self):  # -> Query
+        """ start a lazy query, e.g. timeline.query().between(a, b).tags(['x']).of_class(TimelineItem) """
+        return Query(self)
+
+    def data_filter(self, func: [Callable[[SimpleTimelineItem], bool]], workers: Union[int, None] = None,
+                    chunksize: Union[int, None] = None, threads: bool = False) -> Iterable[TimelineItem]:
+        """ Filter on data by means of function returning data as an iterable
+
+            With workers > 1 the timeline is split in chunks of chunksize items that are evaluated on a pool of
+            processes (func and the items must be picklable) or, with threads, on a thread pool for functions
+            that release the GIL. The items are returned in their original order as the chunks complete.
+        """
+        items: Iterable[SimpleTimelineItem] = self._data_filter(func, workers, chunksize, threads)
+        if self._stats is None:
+            return items
+        return self._stats.track('data_filter', items, len(self._timeline))
+
+    def _data_filter(self, func: [Callable[[SimpleTimelineItem], bool]], workers: Union[int, None],
+                     chunksize: Union[int, None], threads: bool) -> Iterable[SimpleTimelineItem]:
+        if not workers or workers <= 1:
+            for item in self._timeline:
+                if func(item):
+                    yield item
+            return
+        timeline: [SimpleTimelineItem] = self._timeline
+        if not chunksize:
+            chunksize = max(1, -(-len(timeline) // (workers * 4)))
+        chunks: list = [timeline[i:i + chunksize] for i in range(0, len(timeline), chunksize)]
+        pool = ThreadPoolExecutor(max_workers=workers) if threads else ProcessPoolExecutor(max_workers=workers)
+        with pool:
+            for chunk, positions in zip(chunks, pool.map(_filter_chunk, [func] * len(chunks), chunks)):
+                for position in positions:
+                    yield chunk[position]
+
     def class_filter(self, cls) -> Iterable[TimelineItem]:
         """ filter the timeline on the basis of the class returning data as an iterable """
         for item in self._timeline:
             if isinstance(item, cls):
                 yield item
 
+    def overlapping(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items overlapping an item or a (start, end) range returning data as an iterable """
+        if self._interval_index is not None:
+            return self._interval_index.overlapping(item_or_range)
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._scan(start, end, False)
+
+    def active_at(self, point: Union[date, datetime, str]) -> Iterable[SimpleTimelineItem]:
+        """ items active at a point in time returning data as an iterable """
+        if self._interval_index is not None:
+            return self._interval_index.active_at(point)
+        start, end = IntervalIndex.point_keys(point)
+        return self._scan(start, end, False)
+
+    def contained_in(self, item_or_range) -> Iterable[SimpleTimelineItem]:
+        """ items contained in an item or a (start, end) range returning data as an iterable """
+        if self._interval_index is not None:
+            return self._interval_index.contained_in(item_or_range)
+        start, end = IntervalIndex.range_keys(item_or_range)
+        return self._scan(start, end, True)
+
+    def overlap_join(self, other, predicate: Union[Callable[[SimpleTimelineItem, SimpleTimelineItem], bool], None]
+                     = None) -> Iterable[tuple]:
+        """ pairs (a, b) of an item a in this timeline overlapping an item b in the other timeline
+
+            A sort and sweep in O((n+m) log(n+m) + k); the optional predicate(a, b) filters the pairs further.
+        """
+        return sweep.overlap_join(self._timeline, other.timeline, predicate=predicate)
+
+    def contains_join(self, other) -> Iterable[tuple]:
+        """ pairs (a, b) of an item a in this timeline containing an item b in the other timeline """
+        return sweep.contains_join(self._timeline, other.timeline)
+
+    def adjacent_join(self, other) -> Iterable[tuple]:
+        """ pairs (a, b) where the item b in the other timeline starts the day after the item a in this ends """
+        return sweep.adjacent_join(self._timeline, other.timeline)
+
+    def _scan(self, start: int, end: int, contained: bool) -> Iterable[SimpleTimelineItem]:
+        """ linear fallback for the interval queries when no index is maintained """
+        for item in self._timeline:
+            item_start: int = item._start_key
+            item_end: int = item._end_key
+            if contained:
+                if start <= item_start and item_end <= end:
+                    yield item
+            elif item_start <= end and item_end >= start:
+                yield item
+
     # :class Timeline
 
 
@@ -1,7 +1,17 @@
 """ The TimelineItem class """
+import sys
+import weakref
 from copy import deepcopy
-from datetime import date, datetime, timedelta
-from typing import Union, Any
+from datetime import date, datetime, timedelta, timezone
+from typing import Union, Any, Dict
+
+MIN_KEY: int = -(1 << 62)  # key of an indefinite start, i.e. "before time"
+MAX_KEY: int = 1 << 62  # key of an indefinite end
+DATETIME_KIND: int = 1  # point_kind flag: the point is a datetime (not a date)
+UTC_KIND: int = 2  # point_kind flag: the point is an aware datetime (its key is in UTC)
+_TICKS_PER_DAY: int = 86400 * 1000000  # keys are measured in microseconds
+_DAY_KEYS: Dict[date, int] = dict()  # date -> key, so that items on the same day share one key object
+_DAY_KEYS_LIMIT: int = 1 << 16  # the table is emptied when it grows beyond this many days
 
 
 class SimpleTimelineItem:
@@ -10,8 +20,17 @@ class SimpleTimelineItem:
         The features here are meant to basic functions of an item in a timeline.
 
         It can be used on its own but the benefits are probably limited...
+
+        The attributes are slots to keep the per item memory down (subclasses without __slots__ get a __dict__).
+
+        Every item carries the keys (see `point_key`) of its start and end, computed once at construction. The
+        comparisons, sorting and range filters use these integers, so None and mixed date/datetime compare
+        without exceptions: a None start is before everything, a None end after everything and a date is at
+        midnight.
     """
 
+    __slots__ = ('_start', '_end', '_start_key', '_end_key')
+
     @staticmethod
     def from_dict(d: dict):
         """ create object from dict """
@@ -30,26 +49,97 @@ class SimpleTimelineItem:
         if isinstance(d, (date, datetime)) or not d:
             # d is already in the right format: either date, datetime or None
             return d
-        try:
-            return date.fromisoformat(d)
-        except ValueError:  # not a date iso format
-            pass
+        if len(d) <= 10:  # longer strings cannot be an iso date, so skip the attempt and its exception
+            try:
+                return date.fromisoformat(d)
+            except ValueError:  # not a date iso format
+                pass
         try:
             return datetime.fromisoformat(d)
         except ValueError:  # not a datetime iso format
             raise  # re-raise error as this is something to be handled by caller
 
+    @staticmethod
+    def point_key(d: Union[date, datetime, None], default: int = MIN_KEY) -> int:
+        """ Convert a date/datetime to a totally ordered integer key (microseconds since 0001-01-01)
+
+            A date is placed at midnight, an aware datetime is converted to UTC and None becomes `default`
+            (MIN_KEY for starts, MAX_KEY for ends) so that keys of any mix of types can be compared. The keys
+            of dates are shared: items on the same day hold the same int object.
+        """
+        if d is None:
+            return default
+        if not isinstance(d, datetime):
+            key: Union[int, None] = _DAY_KEYS.get(d)
+            if key is None:
+                if len(_DAY_KEYS) >= _DAY_KEYS_LIMIT:
+                    _DAY_KEYS.clear()
+                key = _DAY_KEYS[d] = d.toordinal() * _TICKS_PER_DAY
+            return key
+        offset = d.utcoffset()
+        if offset is not None:
+            d = d - offset
+        return d.toordinal() * _TICKS_PER_DAY + \
+            ((d.hour * 60 + d.minute) * 60 + d.second) * 1000000 + d.microsecond
+
+    @staticmethod
+    def point_kind(d: Union[date, datetime, None]) -> int:
+        """ Flags (DATETIME_KIND, UTC_KIND) needed besides the key to restore a date/datetime """
+        if not isinstance(d, datetime):
+            return 0
+        return DATETIME_KIND | UTC_KIND if d.utcoffset() is not None else DATETIME_KIND
+
+    @staticmethod
+    def key_point(key: int, kind: int = 0) -> Union[date, datetime]:
+        """ Convert a key and its point_kind back to a date/datetime (aware datetimes come back in UTC) """
+        days, ticks = divmod(key, _TICKS_PER_DAY)
+        if not kind & DATETIME_KIND:
+            return date.fromordinal(days)
+        result: datetime = datetime.fromordinal(days) + timedelta(microseconds=ticks)
+        return result.replace(tzinfo=timezone.utc) if kind & UTC_KIND else result
+
+    @classmethod
+    def _build(cls, start: Union[date, datetime, None], end: Union[date, datetime, None],
+               start_key: Union[int, None] = None, end_key: Union[int, None] = None):
+        """ create an item from already parsed and validated start and end (bypassing __init__) """
+        item = cls.__new__(cls)
+        item._start = start
+        item._end = end
+        # the keys of dates come from point_key, so they are shared even when they are given
+        item._start_key = start_key if start_key is not None and type(start) is not date else \
+            SimpleTimelineItem.point_key(start, MIN_KEY)
+        item._end_key = end_key if end_key is not None and type(end) is not date else \
+            SimpleTimelineItem.point_key(end, MAX_KEY)
+        return item
+
+    @staticmethod
+    def _loaded_class(module: str, name: str) -> type:
+        """ the item class (SimpleTimelineItem or a subclass already defined) with a module and qualified name
+
+            Used by the file formats instead of importing what a file names, so opening a file never runs the
+            code of modules that the program has not imported itself.
+        """
+        pending: list = [SimpleTimelineItem]
+        while pending:
+            cls: type = pending.pop()
+            if cls.__module__ == module and cls.__qualname__ == name:
+                return cls
+            pending.extend(cls.__subclasses__())
+        raise ValueError(f'{module}.{name} is not a timeline item class (import its module first)')
+
     def __init__(self, start: Union[date, datetime, str, None], end: Union[date, datetime, str, None]):
         """ Set up the simple timeline item with start and end """
         self._start = SimpleTimelineItem._type_formatter(start)
         self._end = SimpleTimelineItem._type_formatter(end)
-        if self._start is not None and self._end is not None and self._start > self._end:
+        self._start_key: int = SimpleTimelineItem.point_key(self._start, MIN_KEY)
+        self._end_key: int = SimpleTimelineItem.point_key(self._end, MAX_KEY)
+        if self._start_key > self._end_key:
             raise ValueError('Order of timeline is backwards: ends before it starts')
 
     def to_dict(self) -> dict:
         """ convert data to dictionary (serialise) """
-        result: dict = {'type': self.__class__.__name__}
-        result.update(self.__dict__)
+        result: dict = {'type': self.__class__.__name__, '_start': self._start, '_end': self._end}
+        result.update(getattr(self, '__dict__', {}))  # attributes of subclasses without __slots__
         return result
 
     @property
@@ -62,69 +152,54 @@ class SimpleTimelineItem:
         """ return end date/datetime/None """
         return self._end
 
+    @property
+    def start_key(self) -> int:
+        """ return the key of start (MIN_KEY if None) """
+        return self._start_key
+
+    @property
+    def end_key(self) -> int:
+        """ return the key of end (MAX_KEY if None) """
+        return self._end_key
+
     def __eq__(self, other):  # other: SimpleTimelineItem
-        return self.start == other.start
+        return self._start_key == other._start_key
 
     def __ne__(self, other):  # other: SimpleTimelineItem
-        return self.start != other.start
+        return self._start_key != other._start_key
 
     def __lt__(self, other):  # other: SimpleTimelineItem
-        try:
-            return self.start < other.start
-        except TypeError:  # handle comparison None and date/datetime
-            if self.start is None:
-                return True
-            return False
+        return self._start_key < other._start_key
 
     def __le__(self, other):  # other: SimpleTimelineItem
-        try:
-            return self.start <= other.start
-        except TypeError:  # handle comparison None and date/datetime
-            if self.start is None:
-                return True
-            return False
+        return self._start_key <= other._start_key
 
     def __gt__(self, other):  # other: SimpleTimelineItem
-        try:
-            return self.start > other.start
-        except TypeError:  # handle comparison None and date/datetime
-            if self.start is None:
-                return False
-            return True
+        return self._start_key > other._start_key
 
     def __ge__(self, other):  # other: SimpleTimelineItem
-        try:
-            return self.start >= other.start
-        except TypeError:  # handle comparison None and date/datetime
-            if self.start is None and other.start is None:
-                return True
-            if self.start is None:
-                return False
-            return True
+        return self._start_key >= other._start_key
+
+    @staticmethod
+    def _comparator_key(point: Union[date, datetime], item_point: Union[date, datetime], method: str) -> int:
+        """ key of point as compared by before/after: a datetime is compared to a date by its date only """
+        if type(point) is date:
+            return SimpleTimelineItem.point_key(point)
+        if type(point) is datetime:
+            return SimpleTimelineItem.point_key(point if type(item_point) is datetime else point.date())
+        raise ValueError(f'{method}: argument must be date or datetime')
 
     def before(self, other: Union[date, datetime]):
         """ does it start before some point in time? Use-case: filtering data on a timeline """
-        if self.start is None:
+        if self._start is None:
             return True
-        if type(other) is date:
-            comparator = other if type(self.start) is date else datetime.combine(other, datetime.min.time())
-        elif type(other) is datetime:
-            comparator = other if type(self.start) is datetime else other.date()
-        else:
-            raise ValueError('before: argument must be date or datetime')
-        return self.start < comparator
+        return self._start_key < SimpleTimelineItem._comparator_key(other, self._start, 'before')
 
     def after(self, other: Union[date, datetime]):
         """ does is end after some point in time? Use-case: filtering data on a timeline """
-        if self.end is None:
+        if self._end is None:
             return True
-        if type(other) is date:
-            comparator = other if type(self.end) is date else datetime.combine(other, datetime.min.time())
-        elif type(other) is datetime:
-            comparator = other if type(self.end) is datetime else other.date()
-        else:
-            raise ValueError('after: argument must be date or datetime')
-        return self.end > comparator
+        return self._end_key > SimpleTimelineItem._comparator_key(other, self._end, 'after')
 
     def __str__(self) -> str:
         """ to string method """
@@ -157,35 +232,8 @@ class SimpleTimelineItem:
         return self.end == other.end
 
     def overlap(self, other) -> bool:  # other: SimpleTimelineItem
-        """ does two items overlap? """
-        if self.endless or other.endless:
-            return True
-        try:
-            return self.start <= other.start <= self.end or self.start <= other.end <= self.end \
-                   or other.start <= self.start <= other.end or other.start <= self.end <= other.end
-        except TypeError:
-            pass
-        try:
-            if self.start is None:
-                return other.start <= self.end
-        except TypeError:
-            pass
-        try:
-            if self.end is None:
-                return self.start <= other.end
-        except TypeError:
-            pass
-        try:
-            if other.start is None:
-                return self.start <= other.end <= self.end
-        except TypeError:
-            pass
-        try:
-            if other.end is None:
-                return self.start <= other.start <= self.end
-        except TypeError:
-            pass
-        return False
+        """ does two items overlap? (None is indefinite, so an endless item overlaps everything) """
+        return self._start_key <= other._end_key and other._start_key <= self._end_key
 
     def distinct(self, other) -> bool:  # other: SimpleTimelineItem
         """ are two items distinct (not overlapping) """
@@ -193,14 +241,7 @@ class SimpleTimelineItem:
 
     def contains(self, other) -> bool:  # other: SimpleTimelineItem
         """ does this contain the other? """
-        if self.endless:
-            return True
-        # check self.start <= other.start
-        if self.start is not None and (other.start is None or self.start > other.start):
-            return False
-        if self.end is not None and (other.end is None or self.end < other.end):
-            return False
-        return True
+        return self._start_key <= other._start_key and other._end_key <= self._end_key
 
     def adjacent(self, other) -> bool:  # other: SimpleTimelineItem
         """ is the other the day after this? (checking for patterns) """
@@ -226,15 +267,56 @@ class SimpleTimelineItem:
     # class SimpleTimeline
 
 
+class ItemChanges:
+    """ Counter of the changes `TimelineItem.add_tag` and `merge` make on the items that report to it
+
+        A timeline with a tag index or views owns one and has its items report to it (see `TimelineItem._watch`),
+        so it can tell when they are out of date. The items hold it weakly: it goes with its timeline.
+    """
+
+    __slots__ = ('count', 'watchers', '__weakref__')
+
+    def __init__(self):
+        self.count: int = 0
+        self.watchers: tuple = (weakref.ref(self),)  # shared by all the items reporting only to this counter
+
+    # :class ItemChanges
+
+
 class TimelineItem(SimpleTimelineItem):
-    """ A timeline item with user defined data and a user defined tag (only one tag per item) """
+    """ A timeline item with user defined data and a user defined tag (only one tag per item)
+
+        The tags are a frozenset shared by all items with the same tags (see `intern_tags`), so adding a tag
+        replaces the set rather than changing it. `add_tag` and `merge` count their changes in the `ItemChanges`
+        of the timelines watching the item, so that their tag indices and views can tell they are out of date.
+    """
+
+    __slots__ = ('data', 'tags', '_watchers')
+
+    _no_tags: frozenset = frozenset()  # the shared empty set, always alive
+    _tag_sets: Dict[frozenset, frozenset] = weakref.WeakValueDictionary({frozenset(): _no_tags})  # shared sets
+
+    @staticmethod
+    def intern_tags(tags) -> frozenset:
+        """ get the shared frozenset of tags (tag strings are interned)
+
+            The table of shared sets holds them weakly: a set no longer used by any item is dropped.
+        """
+        tags = frozenset(tags)
+        shared: Union[frozenset, None] = TimelineItem._tag_sets.get(tags)
+        if shared is None:
+            shared = frozenset(sys.intern(tag) if type(tag) is str else tag for tag in tags)
+            TimelineItem._tag_sets[tags] = shared  # the key must not be the value, or it would be kept alive
+        return shared
 
     @staticmethod
     def from_dict(d: dict):  # -> TimelineItem
         """ Deserialise / get from dictionary """
         if 'type' not in d and d['type'] != TimelineItem.__name__:
             raise TypeError('from_dict: Not a TimelineItem dict')
-        return TimelineItem(d['start'], d['end'], d['data'], d['tags'])
+        start: str = 'start' if 'start' in d else '_start'
+        end: str = 'end' if 'end' in d else '_end'
+        return TimelineItem(d[start], d[end], d['data'], d['tags'])
 
     @staticmethod
     def event(start: Union[date, datetime, str, None],
@@ -245,33 +327,74 @@ class TimelineItem(SimpleTimelineItem):
                              '')
         return TimelineItem(start, start, data, tags)
 
+    @classmethod
+    def _build(cls, start: Union[date, datetime, None], end: Union[date, datetime, None],
+               data: Any = None, tags: frozenset = frozenset(),
+               start_key: Union[int, None] = None, end_key: Union[int, None] = None):  # -> TimelineItem
+        """ create an item from already parsed and validated start and end and interned tags """
+        item = super()._build(start, end, start_key, end_key)
+        item.data = data
+        item.tags = tags
+        return item
+
     def __init__(self, start: Union[date, datetime, str, None], end: Union[date, datetime, str, None],
-                 data: Any, tags: Union[str, set, list, None] = None):
+                 data: Any, tags: Union[str, set, frozenset, list, None] = None):
         """ Initialiser for a TimelineItem with start, end and some data"""
         super().__init__(start, end)
         self.data: Any = data
-        self.tags: set = set()
-        if type(tags) is str:
-            self.tags.add(tags)
-        elif type(tags) is list or type(tags) is set:
-            self.tags.update(tags)
+        if not tags:
+            self.tags: frozenset = TimelineItem._no_tags
+        elif type(tags) is str:
+            self.tags = TimelineItem.intern_tags((tags,))
+        else:
+            self.tags = TimelineItem.intern_tags(tags)
+
+    def to_dict(self) -> dict:
+        """ convert data to dictionary (serialise) """
+        result: dict = super().to_dict()
+        result['data'] = self.data
+        result['tags'] = set(self.tags)
+        return result
+
+    def __getstate__(self) -> tuple:
+        """ the state to pickle and copy: the slots without the watchers, which stay with the original """
+        slots: dict = dict()
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in ('_watchers', '__weakref__', '__dict__') and hasattr(self, name):
+                    slots[name] = getattr(self, name)
+        return getattr(self, '__dict__', None), slots
+
+    def _watch(self, changes: ItemChanges):
+        """ report the changes made by add_tag and merge to a counter from now on """
+        watchers: Union[tuple, None] = getattr(self, '_watchers', None)
+        if watchers is None or watchers is changes.watchers:
+            self._watchers = changes.watchers
+        elif all(ref() is not changes for ref in watchers):
+            live: tuple = tuple(ref for ref in watchers if ref() is not None)  # drop the counters that have gone
+            self._watchers = live + changes.watchers if live else changes.watchers
+
+    def _changed(self):
+        """ count a change of the tags or data in the counters watching the item """
+        for ref in getattr(self, '_watchers', None) or ():
+            changes: Union[ItemChanges, None] = ref()
+            if changes is not None:
+                changes.count += 1
 
     def add_tag(self, tag: str):  # -> TimelineItem
         """ Adding a tag to set """
-        self.tags.add(tag)
+        if tag not in self.tags:
+            self.tags = TimelineItem.intern_tags(self.tags | {tag})
+            self._changed()
         return self
 
     def has_tag(self, tag: Union[str, list], one_of: bool = False) -> bool:
         """ Does the item have a specific tag """
         if isinstance(tag, str):
             return tag in self.tags
-        result: bool = not one_of
-        for t in tag:
-            if one_of:
-                result |= t in self.tags
-            else:
-                result &= t in self.tags
-        return result
+        if one_of:
+            return not self.tags.isdisjoint(tag)
+        return self.tags.issuperset(tag)
 
     def shares_tag(self, other) -> bool:  # other: TimelineItem
         """ Do two items share tag """
@@ -284,14 +407,21 @@ class TimelineItem(SimpleTimelineItem):
         """ merge if they have the same dates """
         if not self.same(other):
             raise ValueError("Items do not have the same timeline")
-        self.tags.update(other.tags)
+        changed: bool = not self.tags.issuperset(other.tags)
+        if changed:
+            self.tags = TimelineItem.intern_tags(self.tags | other.tags)
         if type(self.data) is list:
             if type(other.data) is list:
+                changed = changed or bool(other.data)
                 self.data.extend(other.data)
             else:
+                changed = True
                 self.data.append(other.data)
         else:
+            changed = True
             self.data = [self.data, other.data]
+        if changed:
+            self._changed()
         return self
 
     # :class TimelineItem
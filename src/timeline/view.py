@@ -0,0 +1,136 @@
+""" The TimelineView class - a named, incrementally maintained filter over a Timeline """
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+from typing import Union, Callable, Iterable, List
+
+from timeline.timeline_item import SimpleTimelineItem, MIN_KEY, MAX_KEY
+
+
+class TimelineView:
+    """ The items of a timeline matching standing criteria, kept up to date as items are added
+
+        The criteria are those of `Timeline.filter` (before, after), `tag_filter` (tags, one_of, exclude),
+        `class_filter` (cls) and `data_filter` (func), all of which must hold. `within` (a timedelta) makes a
+        rolling window of the items starting no earlier than `within` before the latest start in the timeline.
+
+        The timeline offers every appended item to its views, so reading a view costs O(size of the view).
+        Changes a view cannot follow - reordering the timeline, or `add_tag` and `merge` on its items for views
+        on tags or functions - mark it stale and it is rebuilt by a scan when read next. Items are in timeline
+        order.
+    """
+
+    def __init__(self, timeline, name: str, before: Union[None, date, datetime, str] = None,
+                 after: Union[None, date, datetime, str] = None, tags: Union[str, list, None] = None,
+                 one_of: bool = False, exclude: Union[str, list, None] = None, cls: Union[type, None] = None,
+                 func: Union[Callable[[SimpleTimelineItem], bool], None] = None,
+                 within: Union[timedelta, None] = None):
+        self._source = timeline  # Timeline
+        self.name: str = name
+        self._before: int = MAX_KEY if before is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(before))
+        self._after: int = MIN_KEY if after is None else \
+            SimpleTimelineItem.point_key(SimpleTimelineItem._type_formatter(after))
+        self._tags: Union[List[str], None] = [tags] if isinstance(tags, str) else tags
+        self._one_of: bool = one_of
+        self._exclude: List[str] = [exclude] if isinstance(exclude, str) else list(exclude or ())
+        self._cls: Union[type, None] = cls
+        self._func: Union[Callable[[SimpleTimelineItem], bool], None] = func
+        self._within: Union[int, None] = None if within is None else within // timedelta(microseconds=1)
+        self._latest: int = MIN_KEY  # the latest start key in the timeline (for within)
+        self._items: List[SimpleTimelineItem] = list()
+        self._stale: bool = True
+        self._seen: int = 0  # the changes of the items (see `Timeline._watched`) seen by the last rebuild
+
+    @property
+    def uses_tags(self) -> bool:
+        """ can the view change when tags are added to existing items? """
+        return self._tags is not None or bool(self._exclude) or self._func is not None
+
+    @property
+    def stale(self) -> bool:
+        """ will the view be rebuilt when read? """
+        return self._stale or (self.uses_tags and self._seen != self._source._watched().count)
+
+    def invalidate(self):
+        """ rebuild the view from the timeline when it is read next """
+        self._stale = True
+        self._items = list()
+
+    def matches(self, item: SimpleTimelineItem) -> bool:
+        """ does an item meet the criteria (except the rolling window)? """
+        if not self._after <= item._start_key <= self._before:
+            return False
+        if self._cls is not None and not isinstance(item, self._cls):
+            return False
+        if self._tags is not None or self._exclude:
+            tags: frozenset = getattr(item, 'tags', frozenset())
+            if self._tags is not None:
+                if self._one_of and tags.isdisjoint(self._tags):
+                    return False
+                if not self._one_of and not tags.issuperset(self._tags):
+                    return False
+            if not tags.isdisjoint(self._exclude):
+                return False
+        return self._func is None or bool(self._func(item))
+
+    def add(self, item: SimpleTimelineItem):
+        """ offer an item appended to the timeline """
+        if self._stale:
+            return
+        if self._within is not None:
+            if item._start is not None and item._start_key > self._latest:
+                self._latest = item._start_key
+            if item._start_key < self._latest - self._within:
+                return
+        if self.matches(item):
+            self._items.append(item)
+
+    def extend(self, items: List[SimpleTimelineItem], merge: bool = False):
+        """ offer items added to the timeline; with merge they were merged into the sorted timeline """
+        if self._stale:
+            return
+        if not merge:
+            for item in items:
+                self.add(item)
+            return
+        count: int = len(self._items)
+        for item in items:
+            self.add(item)
+        if len(self._items) > count:  # keep timeline order: merge the two sorted runs
+            self._items.sort(key=attrgetter('_start_key'))
+
+    def _rebuild(self):
+        """ scan the timeline """
+        self._stale = False
+        if self.uses_tags:
+            self._seen = self._source._watched().count
+        self._items = list()
+        self._latest = MIN_KEY
+        items: List[SimpleTimelineItem] = self._source.timeline
+        if self._within is not None:
+            self._latest = max((item._start_key for item in items if item._start is not None), default=MIN_KEY)
+        for item in items:
+            if self.matches(item):
+                self._items.append(item)
+
+    @property
+    def items(self) -> List[SimpleTimelineItem]:
+        """ the items of the view (do not modify the list) """
+        if self.stale:
+            self._rebuild()
+        if self._within is not None:  # drop the items that have left the window
+            earliest: int = self._latest - self._within
+            if any(item._start_key < earliest for item in self._items):
+                self._items = [item for item in self._items if item._start_key >= earliest]
+        return self._items
+
+    def __iter__(self) -> Iterable[SimpleTimelineItem]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    # :class TimelineView
+
+
+# EOF